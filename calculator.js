@@ -18,6 +18,7 @@ let dignitaetenMap = {}; // For mapping dignity codes to text
 // Zusätzliche Pauschalen-Infos
 let selectedPauschaleDetails = null;
 let evaluatedPauschalenList = [];
+let lastPauschalePruefKontext = null; // Kontext der Pauschalenprüfung für nachgeladene Bedingungs-HTML
 let lastBackendResponse = null; // Speichert die letzte Serverantwort für Feedback
 let lastUserInput = "";
 
@@ -954,6 +955,14 @@ document.addEventListener("DOMContentLoaded", () => {
             const code = (pLink.dataset.code || '').trim();
             // Find the pauschale in evaluatedPauschalenList and show its bedingungs_pruef_html in the detail modal
             const pauschaleEntry = evaluatedPauschalenList.find(p => String(p.code).toUpperCase() === code.toUpperCase() || String(p.details?.Pauschale).toUpperCase() === code.toUpperCase());
+            if (pauschaleEntry && !pauschaleEntry.bedingungs_pruef_html && lastPauschalePruefKontext) {
+                // Bedingungs-HTML wird nur für die gewählte Pauschale mitgeliefert, andere bei Bedarf nachladen
+                // Bei einem Fehler bleibt der Eintrag leer, damit der nächste Klick erneut lädt
+                loadPauschaleConditions(pauschaleEntry).then(ok => {
+                    if (ok) pLink.click();
+                });
+                return;
+            }
             if (pauschaleEntry && pauschaleEntry.bedingungs_pruef_html) {
                 let headerHtml = `<h2>${tDyn('condDetails')} (${escapeHtml(code)})</h2>`;
                 // Add overall logic status to the header of the detail modal
@@ -970,6 +979,26 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 });
 
+async function loadPauschaleConditions(pauschaleEntry) {
+    try {
+        const res = await fetch("/api/pauschale-conditions", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({ code: pauschaleEntry.code, context: lastPauschalePruefKontext, lang: currentLang })
+        });
+        if (!res.ok) { throw new Error(`Server antwortete mit ${res.status}`); }
+        const data = await res.json();
+        pauschaleEntry.bedingungs_pruef_html = data.bedingungs_pruef_html || `<p><i>-</i></p>`;
+        return true;
+    } catch (err) {
+        console.error("[loadPauschaleConditions] Fehler:", err);
+        // Fehler nur im Modal anzeigen, nicht am Eintrag speichern (sonst kein erneuter Versuch)
+        const headerHtml = `<h2>${tDyn('condDetails')} (${escapeHtml(pauschaleEntry.code)})</h2>`;
+        showModal('infoModalDetailOverlay', headerHtml + `<p class='error'>${escapeHtml(err.message)}</p>`);
+        return false;
+    }
+}
+
 // ─── 3 · Hauptlogik (Button‑Click) ────────────────────────────────────────
 async function getBillingAnalysis() {
     console.log("[getBillingAnalysis] Funktion gestartet.");
@@ -1023,6 +1052,7 @@ async function getBillingAnalysis() {
         if (!res.ok) { throw new Error(`Server antwortete mit ${res.status}`); }
         backendResponse = JSON.parse(rawResponseText);
         lastBackendResponse = backendResponse; // Für spätere Feedback-Übermittlung
+        lastPauschalePruefKontext = backendResponse.pauschale_pruef_kontext || null;
         lastUserInput = userInput;
         console.log("[getBillingAnalysis] Backend-Antwort geparst.");
         console.log("[getBillingAnalysis] Empfangene Backend-Daten (Ausschnitt):", {
@@ -0,0 +1,23 @@
+"""Erzeugt den binären Snapshot der Tarifdaten für einen schnellen Serverstart.
+
+Aufruf (z.B. als Build-Schritt vor dem Deployment)::
+
+    python compile_data_snapshot.py
+
+Die Daten werden dabei immer aus den JSON-Dateien geladen und anschliessend
+nach ``DATA_SNAPSHOT_PATH`` geschrieben.
+"""
+import os
+import sys
+
+if __name__ == "__main__":
+    # Beim Import von server.py nicht den (evtl. veralteten) Snapshot verwenden
+    os.environ["DATA_SNAPSHOT"] = "0"
+    import server
+
+    if not server.daten_geladen:
+        print("FEHLER: Daten konnten nicht geladen werden, kein Snapshot erzeugt.")
+        sys.exit(1)
+    if not server.write_data_snapshot():
+        sys.exit(1)
+    print(f"Snapshot geschrieben: {server.DATA_SNAPSHOT_PATH}")
@@ -0,0 +1,106 @@
+# data_snapshot.py
+"""
+Binärer Snapshot der geladenen und abgeleiteten Tarifdaten.
+
+``server.load_data()`` parst beim Start mehrere MB JSON und baut daraus Indizes
+und Dokumentfrequenzen auf. Der Snapshot speichert das Ergebnis als Pickle und
+ist über einen Hash der Quelldateien (plus relevanter Einstellungen und eines
+Fingerabdrucks des Codes, der die abgeleiteten Strukturen baut, siehe
+:func:`compute_code_fingerprint`) an deren Inhalt gebunden. Ändert sich eines
+davon oder :data:`SNAPSHOT_VERSION`, gilt der Snapshot als veraltet und es wird
+wieder aus JSON geladen.
+
+Die Datei enthält zwei Pickles: zuerst einen Kopf mit Version und Hash, danach
+die Daten. Passt der Kopf nicht, werden die Daten nicht entpickelt (keine
+Fehler durch geänderte Klassen wie ``CatalogTokenIndex``).
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Änderungen am Code, der den Payload baut (server.py, selector.py, utils.py,
+# data_snapshot.py), invalidieren den Snapshot über den Code-Fingerabdruck
+# (server.SNAPSHOT_CODE_FILES). Erhöhen nur noch nötig, wenn Payload-Code in
+# ein weiteres, nicht erfasstes Modul wandert oder sich das Dateiformat ändert.
+SNAPSHOT_VERSION = 4
+
+
+def compute_source_hash(paths: Iterable[Path], extra: str = "") -> str:
+    """Return a SHA-256 over name and content of ``paths`` (plus ``extra``).
+
+    Fehlende Dateien fliessen mit einer Markierung ein, damit ihr späteres
+    Auftauchen den Snapshot ebenfalls invalidiert.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{SNAPSHOT_VERSION}|{extra}".encode("utf-8"))
+    for path in paths:
+        digest.update(b"\0" + Path(path).name.encode("utf-8") + b"\0")
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            digest.update(b"<fehlt>")
+    return digest.hexdigest()
+
+
+def compute_code_fingerprint(paths: Iterable[Path]) -> str:
+    """Kurzer SHA-256 über den Inhalt der Module, die Snapshot-Daten erzeugen.
+
+    Wird als Teil von ``extra`` an :func:`compute_source_hash` übergeben, damit
+    Änderungen an Klassen oder Ableitungslogik den Snapshot invalidieren.
+    """
+    return compute_source_hash(paths)[:16]
+
+
+def write_snapshot(path: Path, source_hash: str, payload: Dict[str, Any]) -> bool:
+    """Write ``payload`` atomically to ``path``. Returns ``True`` on success."""
+    path = Path(path)
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "source_hash": source_hash,
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_name = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=path.parent, delete=False, suffix=".tmp") as tmp:
+            tmp_name = tmp.name
+            pickle.dump(header, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, path)
+        logger.info("  ✓ Daten-Snapshot geschrieben: %s", path)
+        return True
+    except Exception as e:
+        logger.warning("  WARNUNG: Daten-Snapshot konnte nicht geschrieben werden (%s): %s", path, e)
+        if tmp_name and os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        return False
+
+
+def load_snapshot(path: Path, source_hash: str) -> Dict[str, Any] | None:
+    """Return the snapshot payload if it exists and matches ``source_hash``."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if not isinstance(header, dict) or header.get("version") != SNAPSHOT_VERSION:
+                logger.info("  Daten-Snapshot %s hat eine andere Version, wird ignoriert.", path)
+                return None
+            if header.get("source_hash") != source_hash:
+                logger.info("  Daten-Snapshot %s ist veraltet (Quelldateien oder Code geändert).", path)
+                return None
+            payload = pickle.load(f)
+    except Exception as e:
+        logger.warning("  WARNUNG: Daten-Snapshot %s nicht lesbar: %s", path, e)
+        return None
+    return payload if isinstance(payload, dict) else None
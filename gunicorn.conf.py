@@ -0,0 +1,72 @@
+# gunicorn.conf.py
+"""
+Gunicorn-Konfiguration für den Arzttarif-Assistenten.
+
+Die Tarifdaten werden mit ``preload_app`` genau einmal im Master-Prozess
+geladen (``server.create_app()`` beim Import). Die Worker entstehen per
+``fork()`` und teilen sich die Speicherseiten copy-on-write. Damit der
+zyklische Garbage Collector diese Seiten nicht durch Schreibzugriffe auf die
+Objekt-Header wieder "entteilt", werden alle beim Start vorhandenen Objekte
+vor dem ersten Fork mit ``gc.freeze()`` in die permanente Generation verschoben.
+
+Anzahl Worker über ``WEB_CONCURRENCY`` (Standard 1), Threads pro Worker über
+``GUNICORN_THREADS`` (Standard 4, gthread-Worker).
+"""
+import gc
+import logging
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def _memory_usage_kb() -> dict:
+    """Liest RSS/PSS/Shared des aktuellen Prozesses aus /proc (nur Linux)."""
+    usage = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    usage[key] = int(rest.split()[0])
+    except (OSError, ValueError):
+        try:
+            with open("/proc/self/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        usage["Rss"] = int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+    return usage
+
+
+def _log_memory(label: str, pid: int) -> None:
+    usage = _memory_usage_kb()
+    if not usage:
+        logger.info("%s (pid %s): Speicherverbrauch nicht ermittelbar.", label, pid)
+        return
+    shared = usage.get("Shared_Clean", 0) + usage.get("Shared_Dirty", 0)
+    logger.info(
+        "%s (pid %s): RSS %.1f MB, PSS %.1f MB, geteilt %.1f MB",
+        label,
+        pid,
+        usage.get("Rss", 0) / 1024,
+        usage.get("Pss", 0) / 1024,
+        shared / 1024,
+    )
+
+
+def when_ready(server):
+    # Läuft im Master nach dem Preload und vor dem ersten Fork.
+    gc.collect()
+    gc.freeze()
+    logger.info("Master: %s Objekte per gc.freeze() eingefroren.", gc.get_freeze_count())
+    _log_memory("Master", os.getpid())
+
+
+def post_worker_init(worker):
+    _log_memory("Worker gestartet", worker.pid)
@@ -0,0 +1,145 @@
+# llm_cache.py
+"""
+Persistenter Cache für Gemini-Antworten (SQLite).
+
+Schlüssel ist ein Hash aus Modell, LLM-Stufe, Sprache sowie Prompt und
+Generierungs-Konfiguration (also dem gesamten Request-Payload). Gespeichert
+wird die geparste JSON-Antwort von Gemini; bei einem Treffer entfällt der
+Netzwerkaufruf, die nachgelagerte Auswertung bleibt unverändert.
+
+Einträge verfallen nach ``ttl_seconds``; bei mehr als ``max_entries``
+Einträgen werden die am längsten nicht genutzten entfernt (LRU).
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model: str, stage: str, lang: str, payload: Dict[str, Any]) -> str:
+    """Return the cache key for a Gemini request."""
+    payload_json = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    payload_hash = hashlib.sha256(payload_json.encode("utf-8")).hexdigest()
+    return f"{model}|{stage}|{lang}|{payload_hash}"
+
+
+class LLMResponseCache:
+    """SQLite-basierter Antwort-Cache mit TTL, LRU-Begrenzung und Kennzahlen."""
+
+    def __init__(self, path: Path | str, ttl_seconds: float, max_entries: int) -> None:
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._conn_pid: int | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Eigene Verbindung pro Prozess (Gunicorn-Worker entstehen per fork)
+        if self._conn is None or self._conn_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError:
+                pass
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, stage TEXT, value TEXT NOT NULL,"
+                " created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+            conn.commit()
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return ``(True, value)`` on a hit, otherwise ``(False, None)``."""
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return False, None
+                value_json, created = row
+                if self.ttl_seconds and now - created > self.ttl_seconds:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    self.expired += 1
+                    self.misses += 1
+                    return False, None
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+                return True, json.loads(value_json)
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning("WARNUNG: LLM-Cache Lesefehler: %s", e)
+                self.misses += 1
+                return False, None
+
+    def set(self, key: str, value: Any, stage: str = "") -> None:
+        now = time.time()
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, stage, value, created, last_access)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, stage, json.dumps(value, ensure_ascii=False), now, now),
+                )
+                (count,) = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+                overflow = count - self.max_entries
+                if self.max_entries > 0 and overflow > 0:
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN ("
+                        " SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.evictions += overflow
+                conn.commit()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning("WARNUNG: LLM-Cache Schreibfehler: %s", e)
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute("DELETE FROM llm_cache")
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("WARNUNG: LLM-Cache konnte nicht geleert werden: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = None
+            try:
+                (entries,) = self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            except sqlite3.Error:
+                pass
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
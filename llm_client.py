@@ -0,0 +1,265 @@
+# llm_client.py
+"""
+Gemeinsamer HTTP-Client für alle Gemini-Aufrufe.
+
+Alle LLM-Stufen teilen sich eine ``requests.Session`` mit Connection-Pool und
+Keep-Alive, sodass nicht für jeden Aufruf ein neuer TCP/TLS-Handshake mit
+generativelanguage.googleapis.com nötig ist. Timeout und Retry-Verhalten sind
+pro Stufe in :data:`STAGE_POLICIES` festgelegt (per Umgebungsvariable
+anpassbar). :func:`get_stats` liefert Zähler für geöffnete und
+wiederverwendete Verbindungen.
+
+:func:`generate_json` legt zusätzlich den persistenten Antwort-Cache
+(:mod:`llm_cache`) vor den Netzwerkaufruf.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from llm_cache import LLMResponseCache, make_cache_key
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ModuleNotFoundError:  # pragma: no cover - nur in Minimalumgebungen
+    requests = None  # type: ignore[assignment]
+    HTTPAdapter = None  # type: ignore[assignment,misc]
+
+logger = logging.getLogger(__name__)
+
+# Anzahl gepoolter Verbindungen pro Host (relevant bei parallelen Requests)
+POOL_MAXSIZE = int(os.getenv("GEMINI_POOL_MAXSIZE", "10"))
+
+# retry_on: "network" = jeder RequestException erneut versuchen,
+#           "rate_limit" = nur bei HTTP 429 erneut versuchen.
+STAGE_POLICIES: Dict[str, Dict[str, Any]] = {
+    "stage1": {
+        "label": "Stufe 1",
+        "timeout": float(os.getenv("GEMINI_TIMEOUT_STAGE1", "90")),
+        "retry_on": "network",
+    },
+    "stage2_mapping": {
+        "label": "Stufe 2 (Mapping)",
+        "timeout": float(os.getenv("GEMINI_TIMEOUT_MAPPING", "60")),
+        "retry_on": "rate_limit",
+    },
+    "stage2_ranking": {
+        "label": "Stufe 2 (Ranking)",
+        "timeout": float(os.getenv("GEMINI_TIMEOUT_RANKING", "45")),
+        "retry_on": "rate_limit",
+    },
+}
+
+# Persistenter Antwort-Cache
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("data", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+_session: Any = None
+_cache: LLMResponseCache | None = None
+# Letzter Cache-Treffer pro Thread, damit cache_response ihn nicht erneut schreibt
+_last_hit = threading.local()
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_calls_per_stage: Dict[str, int] = {}
+
+
+def get_session() -> Any:
+    """Return the shared session (lazy, damit sie erst im Worker nach dem Fork entsteht)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                if requests is None:
+                    raise RuntimeError("requests module not available")
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def reset_session() -> None:
+    """Schliesst die Session und setzt die Zähler zurück (z.B. für Tests)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+    with _stats_lock:
+        _calls_per_stage.clear()
+
+
+def _is_retryable(policy: Dict[str, Any], error: Exception) -> bool:
+    if policy["retry_on"] == "network":
+        return True
+    response = getattr(error, "response", None)
+    return (
+        isinstance(error, requests.exceptions.HTTPError)
+        and response is not None
+        and response.status_code == 429
+    )
+
+
+def post_gemini(
+    stage: str,
+    url: str,
+    payload: Dict[str, Any],
+    max_retries: int = 3,
+    backoff_seconds: float = 1.0,
+) -> Any:
+    """POST ``payload`` an Gemini mit der Timeout-/Retry-Policy von ``stage``.
+
+    Gibt die erfolgreiche Response zurück. Nach ausgeschöpften Versuchen oder
+    bei nicht wiederholbaren Fehlern wird die ``RequestException`` weitergereicht.
+    Die Wartezeit zwischen Versuchen beträgt ``backoff_seconds * 2**Versuch``.
+    """
+    policy = STAGE_POLICIES[stage]
+    label = policy["label"]
+    session = get_session()
+    with _stats_lock:
+        _calls_per_stage[stage] = _calls_per_stage.get(stage, 0) + 1
+    for attempt in range(max_retries):
+        try:
+            response = session.post(url, json=payload, timeout=policy["timeout"])
+            logger.info("Gemini %s Antwort Status Code: %s", label, response.status_code)
+            if response.status_code == 429:
+                raise requests.exceptions.HTTPError(response=response)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            if not _is_retryable(policy, e):
+                raise
+            if attempt < max_retries - 1:
+                wait_time = backoff_seconds * (2 ** attempt)
+                logger.warning(
+                    "Gemini %s Fehler: %s. Neuer Versuch in %s Sekunden.",
+                    label,
+                    e,
+                    wait_time,
+                )
+                time.sleep(wait_time)
+                continue
+            logger.error("Fehler bei Gemini %s nach %s Versuchen: %s", label, max_retries, e)
+            raise
+    raise RuntimeError("post_gemini ohne Versuch aufgerufen (max_retries < 1)")
+
+
+def get_cache() -> LLMResponseCache | None:
+    """Return the shared response cache or ``None`` if caching is disabled."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _session_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def is_cacheable_response(data: Any) -> bool:
+    """True, wenn der erste Kandidat regulär beendet wurde (``STOP``) und Text enthält.
+
+    Blockierte, abgeschnittene (``MAX_TOKENS``) oder leere Antworten werden
+    nicht gecacht, damit ein erneuter Aufruf gelingen kann.
+    """
+    if not isinstance(data, dict):
+        return False
+    candidates = data.get("candidates")
+    if not isinstance(candidates, list) or not candidates or not isinstance(candidates[0], dict):
+        return False
+    candidate = candidates[0]
+    if candidate.get("finishReason") != "STOP":
+        return False
+    content = candidate.get("content")
+    parts = content.get("parts") if isinstance(content, dict) else None
+    if not isinstance(parts, list) or not parts or not isinstance(parts[0], dict):
+        return False
+    text = parts[0].get("text")
+    return isinstance(text, str) and bool(text.strip())
+
+
+def cache_response(stage: str, payload: Dict[str, Any], model: str, lang: str, data: Any) -> bool:
+    """Speichert eine erfolgreich verarbeitete Antwort im Cache.
+
+    Für Aufrufer von :func:`generate_json` mit ``cache_write=False``, die erst
+    nach dem Parsen und Validieren der Antwort cachen. Gibt zurück, ob
+    gespeichert wurde.
+    """
+    cache = get_cache()
+    if cache is None or getattr(_last_hit, "data", None) is data or not is_cacheable_response(data):
+        return False
+    cache.set(make_cache_key(model, stage, lang, payload), data, stage)
+    return True
+
+
+def generate_json(
+    stage: str,
+    url: str,
+    payload: Dict[str, Any],
+    model: str,
+    lang: str,
+    max_retries: int = 3,
+    backoff_seconds: float = 1.0,
+    cache_write: bool = True,
+) -> Any:
+    """Wie :func:`post_gemini`, liefert aber die geparste JSON-Antwort.
+
+    Treffer im Antwort-Cache werden ohne Netzwerkaufruf zurückgegeben.
+    Mit ``cache_write=True`` werden nur Antworten gespeichert, die
+    :func:`is_cacheable_response` erfüllen. Mit ``cache_write=False`` schreibt
+    der Aufrufer selbst über :func:`cache_response`, sobald er die Antwort
+    erfolgreich verarbeitet hat.
+    """
+    cache = get_cache()
+    key = make_cache_key(model, stage, lang, payload) if cache is not None else ""
+    if cache is not None:
+        hit, cached = cache.get(key)
+        if hit:
+            logger.info("Gemini %s: Antwort aus LLM-Cache.", STAGE_POLICIES[stage]["label"])
+            _last_hit.data = cached
+            return cached
+    _last_hit.data = None
+    response = post_gemini(stage, url, payload, max_retries, backoff_seconds)
+    data = response.json()
+    if cache_write and cache is not None and is_cacheable_response(data):
+        cache.set(key, data, stage)
+    return data
+
+
+def get_stats() -> Dict[str, Any]:
+    """Zähler für Aufrufe sowie geöffnete und wiederverwendete Verbindungen.
+
+    Die Verbindungszahlen stammen aus den urllib3-Pools der Session
+    (``num_connections`` = neu geöffnet, ``num_requests`` = gesendete Requests).
+    """
+    opened = 0
+    sent = 0
+    session = _session
+    if session is not None:
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                opened += pool.num_connections
+                sent += pool.num_requests
+    with _stats_lock:
+        calls = dict(_calls_per_stage)
+    return {
+        "calls_per_stage": calls,
+        "http_requests": sent,
+        "connections_opened": opened,
+        "connections_reused": max(sent - opened, 0),
+        "pool_maxsize": POOL_MAXSIZE,
+        "cache": _cache.stats() if _cache is not None else {"enabled": LLM_CACHE_ENABLED},
+    }
@@ -352,6 +352,69 @@ Gib NUR eine kommagetrennte Liste der passenden LKN-Codes zurück (z.B. PZ.01.00
 Wenn absolut kein Kandidat passt, gib exakt NONE zurück.
 Keine Erklärungen, kein zusätzlicher text.
 Priorisierte Liste (nur Liste oder NONE):"""
+def get_stage2_mapping_batch_prompt(tardoc_leistungen_text: str, candidates_text: str, lang: str) -> str:
+    """Return the batched Stage 2 mapping prompt (several LKNs, one shared candidate list)."""
+    if lang == "fr":
+        return f"""Tâche : Vous êtes un expert des systèmes de facturation médicale en Suisse (TARDOC et Pauschalen). Pour CHACUNE des prestations TARDOC indiquées (type E/EZ), trouvez la prestation fonctionnellement équivalente dans la « liste des candidats ». Cette liste contient des LKN (souvent P/PZ) utilisés comme conditions dans les Pauschalen potentielles et vaut pour toutes les prestations.
+Prestations TARDOC données (type E/EZ):
+--- Leistungen Start ---
+{tardoc_leistungen_text}
+--- Leistungen Ende ---
+Équivalents possibles (liste des candidats - LKN pour les conditions des Pauschalen) :
+--- Kandidaten Start ---
+{candidates_text}
+--- Kandidaten Ende ---
+Analyse et décision (pour chaque prestation séparément) :
+Comprenez la fonction médicale principale de la prestation TARDOC.
+Identifiez les LKN candidates correspondant le mieux à cette fonction et classez-les par pertinence.
+Réponse :
+Renvoyez UNIQUEMENT un objet JSON avec chaque LKN TARDOC donnée comme clé et la liste priorisée des LKN candidates comme valeur.
+Si aucun candidat ne convient pour une prestation, utilisez une liste vide.
+Exemple : {{"AA.00.0010": ["PZ.01.0010", "PZ.01.0020"], "AA.00.0020": []}}
+Aucune autre sortie, pas d'explications.
+Objet JSON :"""
+    elif lang == "it":
+        return f"""Compito: Sei un esperto dei sistemi di fatturazione medica in Svizzera (TARDOC e Pauschalen). Per OGNUNA delle prestazioni TARDOC indicate (tipo E/EZ), individua la prestazione funzionalmente equivalente nella "lista dei candidati". Questa lista contiene LKN (spesso P/PZ) utilizzati come condizioni nelle Pauschalen potenzialmente rilevanti e vale per tutte le prestazioni.
+Prestazioni TARDOC fornite (tipo E/EZ):
+--- Leistungen Start ---
+{tardoc_leistungen_text}
+--- Leistungen Ende ---
+Possibili equivalenti (lista dei candidati - LKN per le condizioni delle Pauschalen):
+--- Kandidaten Start ---
+{candidates_text}
+--- Kandidaten Ende ---
+Analisi e decisione (per ogni prestazione separatamente):
+Comprendi la funzione medica principale della prestazione TARDOC.
+Individua i candidati che rappresentano meglio tale funzione e ordinali per pertinenza.
+Risposta:
+Restituisci SOLO un oggetto JSON con ogni LKN TARDOC fornita come chiave e l'elenco prioritario delle LKN candidate come valore.
+Se nessun candidato è adatto per una prestazione, usa un elenco vuoto.
+Esempio: {{"AA.00.0010": ["PZ.01.0010", "PZ.01.0020"], "AA.00.0020": []}}
+Nessun altro testo o spiegazione.
+Oggetto JSON:"""
+    else: # DE (German)
+        return f"""Rolle: Experte für TARDOC/Pauschalen-Mapping.
+Aufgabe: Finde für JEDE der gegebenen "TARDOC-Leistungen" die LKN aus der "Kandidatenliste", die funktional identisch ist. Die Kandidatenliste gilt für alle Leistungen.
+Gegebene TARDOC-Leistungen (Typ E/EZ):
+--- Leistungen Start ---
+{tardoc_leistungen_text}
+--- Leistungen Ende ---
+Kandidatenliste (LKNs für Pauschalen-Bedingungen):
+--- Kandidaten Start ---
+{candidates_text}
+--- Kandidaten Ende ---
+Analyse & Entscheidung (für jede Leistung einzeln):
+Kernfunktion verstehen: Was ist die medizinische Haupttätigkeit der TARDOC-Leistung? (z.B. "Entfernung einer Hautläsion", "Reposition einer Fraktur").
+Abgleichen: Vergleiche diese Kernfunktion mit der Beschreibung JEDES Kandidaten.
+Auswählen: Wähle den/die Kandidaten mit der höchsten Übereinstimmung, priorisiert.
+Antwort-Format:
+Gib NUR ein JSON-Objekt zurück: Schlüssel = gegebene TARDOC-LKN, Wert = priorisierte Liste der passenden Kandidaten-LKNs.
+Wenn für eine Leistung kein Kandidat passt, gib eine leere Liste zurück.
+Beispiel: {{"AA.00.0010": ["PZ.01.0010", "PZ.01.0020"], "AA.00.0020": []}}
+Keine Erklärungen, kein zusätzlicher Text.
+JSON-Objekt:"""
+
+
 def get_stage2_ranking_prompt(user_input: str, potential_pauschalen_text: str, lang: str) -> str:
     """Return the Stage 2 ranking prompt in the requested language."""
     if lang == "fr":
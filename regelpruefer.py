@@ -6,8 +6,10 @@ und der Bedingungen für Pauschalen.
 """
 import json
 import logging
+import operator
+import traceback
 import re  # Importiere Regex für Mengenanpassung
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from utils import get_lang_field
 
 logger = logging.getLogger(__name__)
@@ -65,7 +67,7 @@ def lade_regelwerk(path: str) -> dict:
         return {}
 
 # --- Hauptfunktion zur Regelprüfung für LKNs ---
-def pruefe_abrechnungsfaehigkeit(fall: dict, regelwerk: dict) -> dict:
+def pruefe_abrechnungsfaehigkeit(fall: dict, regelwerk: dict, kompiliertes_regelwerk: Optional[dict] = None) -> dict:
     """
     Prüft, ob eine gegebene Leistungsposition abrechnungsfähig ist.
 
@@ -73,11 +75,21 @@ def pruefe_abrechnungsfaehigkeit(fall: dict, regelwerk: dict) -> dict:
         fall: Dict mit Kontext zur Leistung (LKN, Menge, ICD, Begleit-LKNs, Pauschalen,
               optional Alter, Geschlecht, GTIN).
         regelwerk: Mapping von LKN zu Regel-Definitionen aus lade_regelwerk.
+        kompiliertes_regelwerk: Optional Ergebnis von kompiliere_regelwerk. LKNs
+              daraus werden mit den kompilierten Prüfungen geprüft, alle übrigen
+              mit dem Interpreter.
     Returns:
         Dict mit Schlüsseln:
           - abrechnungsfaehig (bool): True, wenn alle Regeln erfüllt sind.
           - fehler (list): Liste der Regelverstöße (Fehlermeldungen).
     """
+    if kompiliertes_regelwerk is not None and fall.get("LKN") in kompiliertes_regelwerk:
+        return pruefe_kompiliert(fall, kompiliertes_regelwerk[fall.get("LKN")])
+    return _pruefe_interpretiert(fall, regelwerk)
+
+
+def _pruefe_interpretiert(fall: dict, regelwerk: dict) -> dict:
+    """Interpretiert die Regel-Dicts der LKN bei jedem Aufruf (Referenzimplementierung)."""
     lkn = fall.get("LKN")
     menge = fall.get("Menge", 0) or 0
     begleit = fall.get("Begleit_LKNs") or []
@@ -205,6 +217,317 @@ def pruefe_abrechnungsfaehigkeit(fall: dict, regelwerk: dict) -> dict:
     return {"abrechnungsfaehig": allowed, "fehler": errors}
 
 
+# --- Kompiliertes Regelwerk ---
+class BegleitLKNs:
+    """Begleit-LKNs eines Falls ohne die geprüfte LKN selbst.
+
+    Mitgliedschaft über ein einmal pro Fall gebildetes frozenset; die
+    Iteration liefert die Codes in Originalreihenfolge (für Meldungen).
+    """
+    __slots__ = ("codes", "vorhanden", "ohne")
+    _KEINE = object()
+
+    def __init__(self, codes: list, vorhanden: Optional[frozenset] = None, ohne: Any = _KEINE) -> None:
+        self.codes = codes
+        self.vorhanden = frozenset(codes) if vorhanden is None else vorhanden
+        self.ohne = ohne
+
+    def __contains__(self, code: Any) -> bool:
+        return code != self.ohne and code in self.vorhanden
+
+    def __iter__(self):
+        return (code for code in self.codes if code != self.ohne)
+
+    def isdisjoint(self, other: Any) -> bool:
+        return not any(code in self for code in other)
+
+
+# Eine Prüfung erhält (fall, menge, begleit) und liefert die Fehlermeldung bei
+# einem Verstoss, sonst None. Jede Regel des Interpreters erzeugt höchstens
+# eine Meldung und ist genau dann verletzt.
+RegelPruefung = Callable[[dict, Any, BegleitLKNs], Optional[str]]
+
+
+def _as_list(value: Any) -> list:
+    return [value] if isinstance(value, str) else value
+
+
+def _kompiliere_menge(rule: dict) -> Optional[RegelPruefung]:
+    max_menge = rule.get("MaxMenge")
+    if not isinstance(max_menge, (int, float)):
+        return None
+
+    def pruefe_menge(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+        if menge > max_menge:
+            return f"Mengenbeschränkung überschritten (max. {max_menge}, angefragt {menge})"
+        return None
+    return pruefe_menge
+
+
+def _kompiliere_zuschlag(rule: dict) -> Optional[RegelPruefung]:
+    parent = rule.get("LKN")
+    if not parent:
+        return None
+    hash(parent)  # TypeError -> Interpreter-Fallback
+    meldung = f"Nur als Zuschlag zu {parent} zulässig (Basis fehlt)"
+
+    def pruefe_zuschlag(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+        return None if parent in begleit else meldung
+    return pruefe_zuschlag
+
+
+def _kompiliere_nicht_kumulierbar(rule: dict) -> Optional[RegelPruefung]:
+    not_with = frozenset(_as_list(rule.get("LKNs") or rule.get("LKN") or []))
+    if not not_with:
+        return None
+
+    def pruefe_kumulation(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+        if begleit.isdisjoint(not_with):
+            return None
+        return f"Nicht kumulierbar mit: {', '.join(code for code in begleit if code in not_with)}"
+    return pruefe_kumulation
+
+
+def _kompiliere_patientenbedingung(rule: dict) -> Optional[RegelPruefung]:
+    field = rule.get("Feld")
+    wert_regel = rule.get("Wert")
+    bedingung_text = f"Patientenbedingung ({field})"
+    fehlt = f"{bedingung_text} nicht erfüllt: Kontextwert fehlt"
+
+    if field == "Alter":
+        grenzen = [
+            (int(grenze), vergleich, f"{label} {grenze}")
+            for grenze, vergleich, label in (
+                (rule.get("MinWert"), operator.lt, "min."),
+                (rule.get("MaxWert"), operator.gt, "max."),
+                (wert_regel, operator.ne, "exakt"),
+            )
+            if grenze is not None
+        ]
+
+        def pruefe(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+            wert_fall = fall.get(field)
+            if wert_fall is None:
+                return fehlt
+            try:
+                alter_patient = int(wert_fall)
+            except (ValueError, TypeError):
+                return f"{bedingung_text}: Ungültiger Alterswert im Fall ({wert_fall})"
+            range_parts = [text for grenze, vergleich, text in grenzen if vergleich(alter_patient, grenze)]
+            if range_parts:
+                return f"{bedingung_text} ({' '.join(range_parts)}) nicht erfüllt (Patient: {alter_patient})"
+            return None
+    elif field == "Geschlecht":
+        regel_lower = wert_regel.lower() if isinstance(wert_regel, str) else None
+
+        def pruefe(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+            wert_fall = fall.get(field)
+            if wert_fall is None:
+                return fehlt
+            if regel_lower is None or not isinstance(wert_fall, str):
+                return f"{bedingung_text}: Ungültige Werte für Geschlechtsprüfung"
+            if wert_fall.lower() != regel_lower:
+                return f"{bedingung_text}: erwartet '{wert_regel}', gefunden '{wert_fall}'"
+            return None
+    elif field == "GTIN":
+        required_gtins = [str(wert_regel)] if isinstance(wert_regel, (str, int)) else [str(w) for w in (wert_regel or [])]
+        meldung = f"{bedingung_text}: Erwartet einen von {required_gtins}, nicht gefunden"
+
+        def pruefe(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+            if fall.get(field) is None:
+                return fehlt
+            provided = {str(g) for g in _as_list(fall.get("GTIN") or [])}
+            return None if any(req in provided for req in required_gtins) else meldung
+    else:
+        logger.warning("WARNUNG: Unbekanntes Feld '%s' für Patientenbedingung ignoriert.", field)
+
+        def pruefe(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+            return fehlt if fall.get(field) is None else None
+    return pruefe
+
+
+def _kompiliere_diagnose(rule: dict) -> Optional[RegelPruefung]:
+    required_icds = _as_list(rule.get("ICD") or rule.get("ICDs", []))
+    if not required_icds:
+        return None
+    required_upper = [icd.upper() for icd in required_icds]
+    meldung = f"Erforderliche Diagnose(n) nicht vorhanden (Benötigt: {', '.join(required_icds)})"
+
+    def pruefe_diagnose(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+        provided_upper = {p_icd.upper() for p_icd in _as_list(fall.get("ICD", []))}
+        return None if any(req in provided_upper for req in required_upper) else meldung
+    return pruefe_diagnose
+
+
+def _kompiliere_pauschalausschluss(rule: dict) -> Optional[RegelPruefung]:
+    verbotene_pauschalen = _as_list(rule.get("Pauschale") or rule.get("Pauschalen", []))
+    verboten = frozenset(verbotene_pauschalen)
+    if not verboten:
+        return None
+    meldung = f"Leistung nicht zulässig bei gleichzeitiger Abrechnung der Pauschale(n): {', '.join(verbotene_pauschalen)}"
+
+    def pruefe_ausschluss(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+        abgerechnete = _as_list(fall.get("Pauschalen", []))
+        return meldung if any(p in verboten for p in abgerechnete) else None
+    return pruefe_ausschluss
+
+
+_REGEL_COMPILER: Dict[str, Callable[[dict], Optional[RegelPruefung]]] = {
+    REGEL_MENGE: _kompiliere_menge,
+    REGEL_ZUSCHLAG_ZU: _kompiliere_zuschlag,
+    REGEL_NICHT_KUMULIERBAR: _kompiliere_nicht_kumulierbar,
+    REGEL_PAT_BEDINGUNG: _kompiliere_patientenbedingung,
+    REGEL_DIAGNOSE: _kompiliere_diagnose,
+    REGEL_PAUSCHAL_AUSSCHLUSS: _kompiliere_pauschalausschluss,
+}
+
+
+def _interpreter_pruefung(lkn: str, rule: dict) -> RegelPruefung:
+    """Fallback für Regeln, deren Werte sich nicht vorab aufbereiten lassen."""
+    regelwerk = {lkn: [rule]}
+
+    def pruefe_interpretiert(fall: dict, menge: Any, begleit: "BegleitLKNs") -> Optional[str]:
+        fehler = _pruefe_interpretiert({**fall, "Begleit_LKNs": list(begleit)}, regelwerk)["fehler"]
+        return fehler[0] if fehler else None
+    return pruefe_interpretiert
+
+
+def kompiliere_regelwerk(regelwerk: dict) -> Dict[str, Tuple[RegelPruefung, ...]]:
+    """
+    Übersetzt das Regelwerk einmal beim Laden in Prüfungen pro LKN.
+
+    Ausschlusslisten werden zu frozensets, Mengen- und Altersgrenzen vorab
+    geparst und pro Regeltyp eine Closure erzeugt. Regeln mit ungültigen
+    Werten (z.B. nicht numerische Altersgrenzen) werden zur Laufzeit vom
+    Interpreter geprüft, unbekannte Regeltypen wie dort ignoriert.
+
+    Args:
+        regelwerk: Mapping von LKN zu Regel-Definitionen aus lade_regelwerk.
+    Returns:
+        Dict[str, tuple]: LKN -> Prüfungen für pruefe_kompiliert.
+    """
+    kompiliert: Dict[str, Tuple[RegelPruefung, ...]] = {}
+    for lkn, rules in regelwerk.items():
+        pruefungen: List[RegelPruefung] = []
+        for rule in rules or []:
+            typ = rule.get("Typ")
+            if not typ:
+                continue
+            compiler = _REGEL_COMPILER.get(typ)
+            if compiler is None:
+                logger.warning("WARNUNG: Unbekannter Regeltyp '%s' für LKN %s ignoriert.", typ, lkn)
+                continue
+            try:
+                pruefung = compiler(rule)
+            except (ValueError, TypeError, AttributeError):
+                pruefung = _interpreter_pruefung(lkn, rule)
+            if pruefung is not None:
+                pruefungen.append(pruefung)
+        kompiliert[lkn] = tuple(pruefungen)
+    return kompiliert
+
+
+def pruefe_kompiliert(fall: dict, pruefungen: Tuple[RegelPruefung, ...]) -> dict:
+    """Wertet die kompilierten Prüfungen einer LKN aus (gleicher Vertrag wie pruefe_abrechnungsfaehigkeit)."""
+    if not pruefungen:
+        return {"abrechnungsfaehig": True, "fehler": []}
+    return _werte_pruefungen_aus(fall, pruefungen, BegleitLKNs(fall.get("Begleit_LKNs") or []))
+
+
+def _werte_pruefungen_aus(fall: dict, pruefungen: Tuple[RegelPruefung, ...], begleit: BegleitLKNs) -> dict:
+    menge = fall.get("Menge", 0) or 0
+    errors = []
+    for pruefung in pruefungen:
+        meldung = pruefung(fall, menge, begleit)
+        if meldung is not None:
+            errors.append(meldung)
+    return {"abrechnungsfaehig": not errors, "fehler": errors}
+
+
+def _ueberschrittene_max_menge(rules: list, menge: Any) -> Optional[int]:
+    """Erste verletzte Mengenbeschränkung als ganze Zahl (None, falls keine)."""
+    for rule in rules or []:
+        if rule.get("Typ") != REGEL_MENGE:
+            continue
+        max_menge = rule.get("MaxMenge")
+        if isinstance(max_menge, (int, float)) and menge > max_menge:
+            return int(max_menge) if max_menge >= 0 else None
+    return None
+
+
+def pruefe_fall(
+    leistungen: List[dict],
+    kontext: dict,
+    regelwerk: dict,
+    kompiliertes_regelwerk: Optional[dict] = None,
+) -> List[dict]:
+    """
+    Prüft alle Leistungen eines Falls in einem Durchgang.
+
+    Die Begleit-LKNs werden einmal als Menge gebildet (jede LKN sieht alle
+    übrigen Leistungen des Falls). Eine überschrittene Mengenbeschränkung
+    reduziert die Menge auf das Maximum und wird strukturiert zurückgegeben.
+
+    Args:
+        leistungen: Leistungen mit ``lkn`` und ``menge`` (Standard 1).
+        kontext: Falldaten für alle LKNs (ICD, Geschlecht, Alter, Pauschalen, GTIN).
+        regelwerk: Mapping von LKN zu Regel-Definitionen aus lade_regelwerk.
+        kompiliertes_regelwerk: Optional Ergebnis von kompiliere_regelwerk; sonst
+              werden die Regeln der vorkommenden LKNs hier kompiliert.
+    Returns:
+        Liste (Reihenfolge wie ``leistungen``, nur LKNs als String) von Dicts mit
+          - lkn, initiale_menge
+          - regelpruefung (dict): abrechnungsfaehig, fehler
+          - finale_menge (int): abrechenbare Menge nach den Regeln
+          - max_menge (int | None): Maximum, auf das die Menge reduziert wurde
+    """
+    alle_lkns = [str(l.get("lkn")) for l in leistungen if l.get("lkn")]
+    vorhanden = frozenset(alle_lkns)
+    if kompiliertes_regelwerk is None:
+        kompiliertes_regelwerk = kompiliere_regelwerk({lkn: regelwerk[lkn] for lkn in vorhanden if lkn in regelwerk})
+
+    ergebnisse: List[dict] = []
+    for leistung in leistungen:
+        lkn = leistung.get("lkn")
+        if not isinstance(lkn, str):
+            continue
+        menge = leistung.get("menge", 1)
+        fall = {**kontext, "LKN": lkn, "Menge": menge}
+        finale_menge = 0
+        max_menge = None
+        try:
+            pruefungen = kompiliertes_regelwerk.get(lkn)
+            if pruefungen is None:
+                fall["Begleit_LKNs"] = [code for code in alle_lkns if code != lkn]
+                regelpruefung = _pruefe_interpretiert(fall, regelwerk)
+            elif pruefungen:
+                regelpruefung = _werte_pruefungen_aus(fall, pruefungen, BegleitLKNs(alle_lkns, vorhanden, lkn))
+            else:
+                regelpruefung = {"abrechnungsfaehig": True, "fehler": []}
+            if regelpruefung["abrechnungsfaehig"]:
+                finale_menge = menge
+            else:
+                max_menge = _ueberschrittene_max_menge(regelwerk.get(lkn), fall.get("Menge", 0) or 0)
+                if max_menge is not None:
+                    finale_menge = max_menge
+                    regelpruefung["abrechnungsfaehig"] = True
+                    regelpruefung["fehler"].append(f"Menge auf {max_menge} reduziert (Mengenbeschränkung)")
+        except Exception as e_rule:
+            logger.error("Fehler bei Regelprüfung für LKN %s: %s", lkn, e_rule)
+            traceback.print_exc()
+            regelpruefung = {"abrechnungsfaehig": False, "fehler": [f"Interner Fehler bei Regelprüfung: {e_rule}"]}
+            finale_menge = 0
+            max_menge = None
+        ergebnisse.append({
+            "lkn": lkn,
+            "initiale_menge": menge,
+            "regelpruefung": regelpruefung,
+            "finale_menge": finale_menge,
+            "max_menge": max_menge,
+        })
+    return ergebnisse
+
+
 def prepare_tardoc_abrechnung(
     regel_ergebnisse_liste: list[dict], leistungskatalog_dict: dict, lang: str = 'de'
 ) -> dict:
@@ -2,9 +2,13 @@
 import traceback
 import json
 import logging
-from typing import Dict, List, Any, Set
-from utils import escape, get_table_content, get_lang_field, translate, translate_condition_type, create_html_info_link
+from typing import Callable, Dict, Iterator, List, Any, Set, Tuple, Union
+from utils import ICD_HAUPTKATALOG, ICD_INDEX_LANGS, escape, build_code_table_index, get_icd_text_index, find_pauschalen_for_lkns, get_table_codes, get_table_content, get_tables_for_code, get_lang_field, translate, translate_condition_type, create_html_info_link
 import re, html
+import operator
+import os
+import threading
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
@@ -13,11 +17,27 @@ __all__ = [
     "get_simplified_conditions",
     "render_condition_results_html",
     "generate_condition_detail_html",
+    "clear_fragment_cache",
+    "build_potential_icds_index",
     "determine_applicable_pauschale",
     "evaluate_pauschale_logic_orchestrator", # Added
     "check_single_condition",               # Added
     "DEFAULT_GROUP_OPERATOR",               # Added
     "get_group_operator_for_pauschale",     # Added
+    "CompiledPauschale",
+    "compile_pauschale_program",
+    "compile_pauschale_programs",
+    "evaluate_compiled_pauschale",
+    "evaluate_pauschale_program",
+    "evaluate_all_pauschalen",
+    "render_pauschale_conditions",
+    "build_simplified_signatures",
+    "build_stem_diffs",
+    "get_pauschale_stamm",
+    "DETAIL_LEVELS",
+    "PauschaleBedingungen",
+    "EvaluationContext",
+    "get_conditions_for_pauschale",
     # _evaluate_boolean_tokens and evaluate_single_condition_group are internal
 ]
 
@@ -25,14 +45,151 @@ __all__ = [
 # "UND" ist der konservative Default und kann zentral angepasst werden.
 DEFAULT_GROUP_OPERATOR = "UND"
 
+# Umfang des Bedingungs-HTML in determine_applicable_pauschale
+DETAIL_LEVELS = ("selected", "full")
+
+# LRU-Cache für generate_condition_detail_html; Schlüssel enthält die
+# Stammdaten-Dicts, Werte prüfen deren Identität (siehe utils.get_table_content)
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "2048"))
+_fragment_cache: "OrderedDict[Any, Tuple[Dict, Dict, str]]" = OrderedDict()
+_fragment_cache_lock = threading.Lock()
+
+# Bedingungen entweder als Index {Pauschale: [Bedingungen]} (siehe
+# ``pauschale_bedingungen_indexed`` in server.py) oder als flache Liste aller
+# Zeilen aus PAUSCHALEN_Bedingungen.json (Kompatibilität).
+PauschaleBedingungen = Union[Dict[str, List[Dict]], List[Dict]]
+
+
+def get_conditions_for_pauschale(pauschale_code: str, pauschale_bedingungen: PauschaleBedingungen) -> List[Dict]:
+    """Bedingungen einer Pauschale: Direktzugriff im Index, sonst Filter über die Liste."""
+    if isinstance(pauschale_bedingungen, dict):
+        return pauschale_bedingungen.get(pauschale_code, [])
+    return [cond for cond in pauschale_bedingungen if cond.get("Pauschale") == pauschale_code]
+
+
+def _iter_all_conditions(pauschale_bedingungen: PauschaleBedingungen) -> Iterator[Dict]:
+    """Alle Bedingungszeilen, unabhängig von der Darstellung."""
+    if isinstance(pauschale_bedingungen, dict):
+        for conditions in pauschale_bedingungen.values():
+            yield from conditions
+    else:
+        yield from pauschale_bedingungen
+
+class EvaluationContext:
+    """Einmal pro Anfrage normalisierter Prüfkontext.
+
+    Enthält die Kontextwerte so, wie :func:`check_single_condition` sie
+    vergleicht (ICD/LKN upper-case, Geschlecht/Seitigkeit lower-case, Mengen als
+    ``frozenset``). ``get`` greift auf das ursprüngliche Dict zu, sodass
+    bestehender Code, der den Kontext wie ein Dict liest, weiter funktioniert.
+
+    ``leaf_results`` ist die Memo-Tabelle der Anfrage: gleiche Bedingungszeilen
+    (siehe :func:`_condition_memo_key`) werden über alle Kandidaten hinweg nur
+    einmal geprüft.
+    """
+
+    __slots__ = (
+        "use_icd", "icds", "gtins", "lkns", "alter", "geschlecht", "seitigkeit", "anzahl", "alter_bei_eintritt", "raw",
+        "leaf_results", "memo_hits", "memo_misses",
+    )
+
+    def __init__(self, context: Dict) -> None:
+        self.use_icd = bool(context.get("useIcd", True))
+        self.icds = frozenset(p_icd.upper() for p_icd in context.get("ICD", []) if p_icd)
+        self.gtins = frozenset(context.get("GTIN", []))
+        self.lkns = frozenset(p_lkn.upper() for p_lkn in context.get("LKN", []) if p_lkn)
+        self.alter = context.get("Alter")
+        self.geschlecht = str(context.get("Geschlecht", "unbekannt")).lower() # Default 'unbekannt' und lower
+        self.seitigkeit = str(context.get("Seitigkeit", "unbekannt")).lower()
+        self.anzahl = context.get("Anzahl")
+        self.alter_bei_eintritt = context.get("AlterBeiEintritt")
+        self.raw = context
+        self.leaf_results: Dict[Any, bool] = {}
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    @classmethod
+    def of(cls, context: "Dict | EvaluationContext") -> "EvaluationContext":
+        """Gibt ``context`` unverändert zurück, wenn er bereits normalisiert ist."""
+        return context if isinstance(context, cls) else cls(context)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.raw.get(key, default)
+
+    def memo_stats(self) -> Dict[str, Any]:
+        """Treffer/Fehlversuche der Memo-Tabelle (für Debug-Ausgaben)."""
+        total = self.memo_hits + self.memo_misses
+        return {
+            "hits": self.memo_hits,
+            "misses": self.memo_misses,
+            "entries": len(self.leaf_results),
+            "hit_rate": self.memo_hits / total if total else 0.0,
+        }
+
+    def __getitem__(self, key: str) -> Any:
+        return self.raw[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.raw
+
+
+# Kontext als Dict (Kompatibilität) oder bereits normalisiert
+PruefKontext = Union[Dict, EvaluationContext]
+
+
+def _condition_key(condition: Dict) -> Tuple[Any, ...]:
+    return (
+        str(condition.get('Bedingungstyp', "")).upper(),
+        condition.get('Werte'),
+        condition.get('Vergleichsoperator'),
+        condition.get('Feld'),
+        condition.get('MinWert'),
+        condition.get('MaxWert'),
+    )
+
+
+def _condition_memo_key(condition: Dict, tabellen_dict_by_table: Dict[str, List[Dict]]) -> Any:
+    """Schlüssel für gleichwertige Bedingungen (``None`` bei nicht hashbaren Werten)."""
+    key = (_condition_key(condition), id(tabellen_dict_by_table))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
 # === FUNKTION ZUR PRÜFUNG EINER EINZELNEN BEDINGUNG ===
 def check_single_condition(
     condition: Dict,
-    context: Dict,
+    context: PruefKontext,
+    tabellen_dict_by_table: Dict[str, List[Dict]]
+) -> bool:
+    """Prüft eine einzelne Bedingungszeile und gibt True/False zurück.
+
+    Ergebnisse werden in der Memo-Tabelle des :class:`EvaluationContext`
+    abgelegt, sodass gleiche Bedingungen anderer Pauschalen nicht erneut
+    geprüft werden.
+    """
+    ctx = EvaluationContext.of(context)
+    key = _condition_memo_key(condition, tabellen_dict_by_table)
+    if key is None:
+        return _check_single_condition_uncached(condition, ctx, tabellen_dict_by_table)
+    result = ctx.leaf_results.get(key)
+    if result is not None:
+        ctx.memo_hits += 1
+        return result
+    ctx.memo_misses += 1
+    result = _check_single_condition_uncached(condition, ctx, tabellen_dict_by_table)
+    ctx.leaf_results[key] = result
+    return result
+
+
+def _check_single_condition_uncached(
+    condition: Dict,
+    ctx: EvaluationContext,
     tabellen_dict_by_table: Dict[str, List[Dict]]
 ) -> bool:
-    """Prüft eine einzelne Bedingungszeile und gibt True/False zurück."""
-    check_icd_conditions_at_all = context.get("useIcd", True)
+    check_icd_conditions_at_all = ctx.use_icd
     pauschale_code_for_debug = condition.get('Pauschale', 'N/A_PAUSCHALE') # Für besseres Debugging
     gruppe_for_debug = condition.get('Gruppe', 'N/A_GRUPPE') # Für besseres Debugging
 
@@ -43,14 +200,14 @@ def check_single_condition(
     feld_ref = condition.get(BED_FELD_KEY); min_val_regel = condition.get(BED_MIN_KEY) # Umbenannt für Klarheit
     max_val_regel = condition.get(BED_MAX_KEY); wert_regel_explizit = condition.get(BED_WERTE_KEY) # Umbenannt für Klarheit
 
-    # Kontextwerte holen
-    provided_icds_upper = {p_icd.upper() for p_icd in context.get("ICD", []) if p_icd}
-    provided_gtins = set(context.get("GTIN", []))
-    provided_lkns_upper = {p_lkn.upper() for p_lkn in context.get("LKN", []) if p_lkn}
-    provided_alter = context.get("Alter")
-    provided_geschlecht_str = str(context.get("Geschlecht", "unbekannt")).lower() # Default 'unbekannt' und lower
-    provided_anzahl = context.get("Anzahl") # Aus dem Kontext für "ANZAHL" Typ
-    provided_seitigkeit_str = str(context.get("Seitigkeit", "unbekannt")).lower() # Default 'unbekannt' und lower
+    # Kontextwerte (einmal pro Anfrage in EvaluationContext normalisiert)
+    provided_icds_upper = ctx.icds
+    provided_gtins = ctx.gtins
+    provided_lkns_upper = ctx.lkns
+    provided_alter = ctx.alter
+    provided_geschlecht_str = ctx.geschlecht
+    provided_anzahl = ctx.anzahl # Aus dem Kontext für "ANZAHL" Typ
+    provided_seitigkeit_str = ctx.seitigkeit
 
     # print(f"--- DEBUG check_single --- P: {pauschale_code_for_debug} G: {gruppe_for_debug} Typ: {bedingungstyp}, Regel-Werte: '{werte_str}', Kontext: {context.get('Seitigkeit', 'N/A')}/{context.get('Anzahl', 'N/A')}")
 
@@ -59,15 +216,15 @@ def check_single_condition(
             if not check_icd_conditions_at_all: return True
             required_icds_in_rule_list = {w.strip().upper() for w in str(werte_str).split(',') if w.strip()}
             if not required_icds_in_rule_list: return True # Leere Regel-Liste ist immer erfüllt
-            return any(req_icd in provided_icds_upper for req_icd in required_icds_in_rule_list)
+            return not provided_icds_upper.isdisjoint(required_icds_in_rule_list)
 
         elif bedingungstyp == "HAUPTDIAGNOSE IN TABELLE": # ICD IN TABELLE
             if not check_icd_conditions_at_all: return True
             table_ref = werte_str
-            icd_codes_in_rule_table = {entry['Code'].upper() for entry in get_table_content(table_ref, "icd", tabellen_dict_by_table) if entry.get('Code')}
+            icd_codes_in_rule_table = get_table_codes(table_ref, "icd", tabellen_dict_by_table)
             if not icd_codes_in_rule_table: # Wenn Tabelle leer oder nicht gefunden
                  return False if provided_icds_upper else True # Nur erfüllt, wenn auch keine ICDs im Kontext sind
-            return any(provided_icd in icd_codes_in_rule_table for provided_icd in provided_icds_upper)
+            return not provided_icds_upper.isdisjoint(icd_codes_in_rule_table)
 
         elif bedingungstyp == "GTIN" or bedingungstyp == "MEDIKAMENTE IN LISTE":
             werte_list_gtin = [w.strip() for w in str(werte_str).split(',') if w.strip()]
@@ -87,9 +244,9 @@ def check_single_condition(
 
         elif bedingungstyp == "LEISTUNGSPOSITIONEN IN TABELLE" or bedingungstyp == "TARIFPOSITIONEN IN TABELLE":
             table_ref = werte_str
-            lkn_codes_in_rule_table = {entry['Code'].upper() for entry in get_table_content(table_ref, "service_catalog", tabellen_dict_by_table) if entry.get('Code')}
+            lkn_codes_in_rule_table = get_table_codes(table_ref, "service_catalog", tabellen_dict_by_table)
             if not lkn_codes_in_rule_table: return False # Leere Tabelle kann nicht erfüllt werden, wenn LKNs im Kontext sind (implizit)
-            return any(provided_lkn in lkn_codes_in_rule_table for provided_lkn in provided_lkns_upper)
+            return not provided_lkns_upper.isdisjoint(lkn_codes_in_rule_table)
 
         elif bedingungstyp == "PATIENTENBEDINGUNG": # Für Alter, Geschlecht (spezifisch)
             # feld_ref ist hier z.B. "Alter" oder "Geschlecht"
@@ -119,7 +276,7 @@ def check_single_condition(
                 return True # Oder False, je nach gewünschtem Verhalten
 
         elif bedingungstyp == "ALTER IN JAHREN BEI EINTRITT":
-            alter_eintritt = context.get("AlterBeiEintritt")
+            alter_eintritt = ctx.alter_bei_eintritt
             if alter_eintritt is None:
                 return False
             try:
@@ -271,32 +428,30 @@ def get_beschreibung_fuer_icd_im_backend(
     spezifische_icd_tabelle: str | None = None,
     lang: str = 'de'
 ) -> str:
-    """Liefert die Beschreibung eines ICD-Codes in der gewünschten Sprache."""
+    """Liefert die Beschreibung eines ICD-Codes in der gewünschten Sprache.
+
+    Nachschlagen über die Indizes aus :func:`utils.get_icd_text_index` (O(1)).
+    """
+    code_upper = icd_code.upper()
     # Wenn eine spezifische Tabelle bekannt ist (z.B. aus der Bedingung), diese zuerst prüfen
     if spezifische_icd_tabelle:
-        icd_entries_specific = get_table_content(spezifische_icd_tabelle, "icd", tabellen_dict_by_table, lang)
-        for entry in icd_entries_specific:
-            if entry.get('Code', '').upper() == icd_code.upper():
-                return entry.get('Code_Text', icd_code)
-
-    # Fallback: Suche in einer generellen Haupt-ICD-Tabelle, falls vorhanden und definiert
-    # Du müsstest den Namen deiner Haupt-ICD-Tabelle hier eintragen, z.B. "icd10gm_codes"
-    haupt_icd_tabelle_name = "icd_hauptkatalog" # Beispielname, anpassen!
-    # print(f"DEBUG: Suche ICD {icd_code} in Haupttabelle {haupt_icd_tabelle_name}")
-    icd_entries_main = get_table_content(haupt_icd_tabelle_name, "icd", tabellen_dict_by_table, lang)
-    for entry in icd_entries_main:
-        if entry.get('Code', '').upper() == icd_code.upper():
-            return entry.get('Code_Text', icd_code)
-            
-    # print(f"DEBUG: ICD {icd_code} nicht in spezifischer oder Haupttabelle gefunden.")
+        text = get_icd_text_index(spezifische_icd_tabelle, tabellen_dict_by_table, lang).get(code_upper)
+        if text is not None:
+            return text
+
+    # Fallback: globaler Index der Haupt-ICD-Tabelle
+    text = get_icd_text_index(ICD_HAUPTKATALOG, tabellen_dict_by_table, lang).get(code_upper)
+    if text is not None:
+        return text
     return icd_code # Wenn nirgends gefunden, Code selbst zurückgeben
 
 def get_group_operator_for_pauschale(
-    pauschale_code: str, bedingungen_data: List[Dict], default: str = DEFAULT_GROUP_OPERATOR
+    pauschale_code: str, bedingungen_data: PauschaleBedingungen, default: str = DEFAULT_GROUP_OPERATOR
 ) -> str:
     """Liefert den Gruppenoperator (UND/ODER) fuer eine Pauschale."""
-    for cond in bedingungen_data:
-        if cond.get("Pauschale") == pauschale_code and "GruppenOperator" in cond:
+    conditions = get_conditions_for_pauschale(pauschale_code, bedingungen_data)
+    for cond in conditions:
+        if "GruppenOperator" in cond:
             op = str(cond.get("GruppenOperator", "")).strip().upper()
             if op in ("UND", "ODER"):
                 return op
@@ -307,9 +462,7 @@ def get_group_operator_for_pauschale(
     first_group_id = None
     groups_seen: List[Any] = []
     first_group_has_oder = False
-    for cond in bedingungen_data:
-        if cond.get("Pauschale") != pauschale_code:
-            continue
+    for cond in conditions:
         grp = cond.get("Gruppe")
         if first_group_id is None:
             first_group_id = grp
@@ -422,7 +575,7 @@ def _evaluate_boolean_tokens(tokens: List[Any]) -> bool:
 # === FUNKTION ZUR AUSWERTUNG EINER EINZELNEN BEDINGUNGSGRUPPE ===
 def evaluate_single_condition_group(
     conditions_in_group: List[Dict],
-    context: Dict,
+    context: PruefKontext,
     tabellen_dict_by_table: Dict[str, List[Dict]],
     pauschale_code_for_debug: str = "N/A_PAUSCHALE", # For logging
     group_id_for_debug: Any = "N/A_GRUPPE",      # For logging
@@ -547,8 +700,8 @@ def evaluate_single_condition_group(
 # This function is now the new orchestrator for pauschale logic evaluation.
 def evaluate_pauschale_logic_orchestrator(
     pauschale_code: str,
-    context: Dict,
-    all_pauschale_bedingungen_data: List[Dict], # All conditions for all pauschalen
+    context: PruefKontext,
+    all_pauschale_bedingungen_data: PauschaleBedingungen, # Index {Pauschale: [...]} oder flache Liste
     tabellen_dict_by_table: Dict[str, List[Dict]],
     debug: bool = False
 ) -> bool:
@@ -561,10 +714,11 @@ def evaluate_pauschale_logic_orchestrator(
     an AST operator, they are connected based on the 'Operator' field of the last
     condition of the preceding group (UND if 'UND', otherwise ODER).
     """
+    context = EvaluationContext.of(context) # Einmal normalisieren, alle Gruppen teilen ihn
     # Filter conditions for the current pauschale and sort them by BedingungsID
     # This sorting is crucial for correct sequential processing of defined logic.
     conditions_for_pauschale = sorted(
-        [cond for cond in all_pauschale_bedingungen_data if cond.get("Pauschale") == pauschale_code],
+        get_conditions_for_pauschale(pauschale_code, all_pauschale_bedingungen_data),
         key=lambda x: x.get("BedingungsID", 0)
     )
     
@@ -693,11 +847,448 @@ def evaluate_pauschale_logic_orchestrator(
 
     return final_result
 
+# === KOMPILIERTE BEDINGUNGSPROGRAMME ===
+# Die Bedingungszeilen jeder Pauschale werden einmal (beim Laden der Daten) in
+# einen Ausdrucksbaum übersetzt: Werte-Listen sind zerlegt und normalisiert,
+# Tabellenreferenzen als Code-Mengen aufgelöst, Operatoren auf AND/OR
+# abgebildet und die AST-Blockstruktur vorberechnet. Die Auswertung ist ein
+# Baumdurchlauf mit Kurzschlusslogik. Referenz bleiben
+# evaluate_pauschale_logic_orchestrator und check_single_condition; Typen ohne
+# eigene Übersetzung (z.B. PATIENTENBEDINGUNG) rufen check_single_condition auf.
+
+_COMPARISON_OPERATORS: Dict[str, Callable[[int, int], bool]] = {
+    ">=": operator.ge, "<=": operator.le, ">": operator.gt,
+    "<": operator.lt, "=": operator.eq, "!=": operator.ne,
+}
+_SEITIGKEIT_EINSEITIG = frozenset(('einseitig', 'links', 'rechts'))
+
+
+class _Leaf:
+    """Eine kompilierte Bedingungszeile; ``key`` identifiziert gleichwertige Zeilen."""
+
+    __slots__ = ("key", "fn")
+
+    def __init__(self, key: Any, fn: Callable[[EvaluationContext], bool]) -> None:
+        self.key = key
+        self.fn = fn
+
+
+def _compile_condition(condition: Dict, tabellen_dict_by_table: Dict[str, List[Dict]]) -> Callable[[EvaluationContext], bool]:
+    """Übersetzt eine Bedingungszeile in eine Funktion ``ctx -> bool``."""
+    def reference(ctx: EvaluationContext) -> bool:
+        return _check_single_condition_uncached(condition, ctx, tabellen_dict_by_table)
+
+    bedingungstyp = condition.get('Bedingungstyp', "")
+    if not isinstance(bedingungstyp, str):
+        return reference
+    bedingungstyp = bedingungstyp.upper()
+    werte = condition.get('Werte', "")
+
+    if bedingungstyp in ("ICD", "LKN", "LEISTUNGSPOSITIONEN IN LISTE"):
+        required = frozenset(w.strip().upper() for w in str(werte).split(',') if w.strip())
+        if not required:
+            return lambda ctx: True
+        if bedingungstyp == "ICD":
+            return lambda ctx: not ctx.use_icd or not required.isdisjoint(ctx.icds)
+        return lambda ctx: not required.isdisjoint(ctx.lkns)
+
+    if bedingungstyp in ("GTIN", "MEDIKAMENTE IN LISTE"):
+        required = frozenset(w.strip() for w in str(werte).split(',') if w.strip())
+        if not required:
+            return lambda ctx: True
+        return lambda ctx: not required.isdisjoint(ctx.gtins)
+
+    if bedingungstyp == "GESCHLECHT IN LISTE":
+        if not werte:
+            return lambda ctx: True
+        geschlechter = frozenset(g.strip().lower() for g in str(werte).split(',') if g.strip())
+        return lambda ctx: ctx.geschlecht in geschlechter
+
+    if bedingungstyp == "HAUPTDIAGNOSE IN TABELLE" and isinstance(werte, str):
+        icd_codes = get_table_codes(werte, "icd", tabellen_dict_by_table)
+        if not icd_codes:
+            return lambda ctx: not ctx.use_icd or not ctx.icds
+        return lambda ctx: not ctx.use_icd or not icd_codes.isdisjoint(ctx.icds)
+
+    if bedingungstyp in ("LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE") and isinstance(werte, str):
+        lkn_codes = get_table_codes(werte, "service_catalog", tabellen_dict_by_table)
+        if not lkn_codes:
+            return lambda ctx: False
+        return lambda ctx: not lkn_codes.isdisjoint(ctx.lkns)
+
+    if bedingungstyp in ("ANZAHL", "ALTER IN JAHREN BEI EINTRITT"):
+        compare = _COMPARISON_OPERATORS.get(condition.get('Vergleichsoperator'))  # type: ignore[arg-type]
+        try:
+            regel_wert = int(werte)
+        except (ValueError, TypeError):
+            return reference  # Fehlerfall inkl. Logging wie bisher
+        if compare is None:
+            return reference
+        attr = "anzahl" if bedingungstyp == "ANZAHL" else "alter_bei_eintritt"
+
+        def compare_number(ctx: EvaluationContext) -> bool:
+            kontext_wert = getattr(ctx, attr)
+            if kontext_wert is None:
+                return False
+            try:
+                return compare(int(kontext_wert), regel_wert)
+            except (ValueError, TypeError):
+                return False
+        return compare_number
+
+    if bedingungstyp == "SEITIGKEIT" and isinstance(werte, str):
+        vergleichsoperator = condition.get('Vergleichsoperator')
+        if vergleichsoperator not in ("=", "!="):
+            return reference
+        regel_wert = werte.strip().replace("'", "").lower()
+        if regel_wert == 'e':
+            def match(seitigkeit: str) -> bool:
+                return seitigkeit in _SEITIGKEIT_EINSEITIG
+        else:
+            erwartet = {'b': 'beidseits', 'l': 'links', 'r': 'rechts'}.get(regel_wert, regel_wert)
+
+            def match(seitigkeit: str) -> bool:
+                return seitigkeit == erwartet
+        if vergleichsoperator == "=":
+            return lambda ctx: match(ctx.seitigkeit)
+        return lambda ctx: not match(ctx.seitigkeit)
+
+    return reference
+
+
+def _compile_group(
+    conditions_in_group: List[Dict], leaf_for: Callable[[Dict], _Leaf], pauschale_code: str, group_id: Any
+) -> Any:
+    """Baut den Ausdrucksbaum einer Gruppe (gleiche Token-Logik wie evaluate_single_condition_group).
+
+    Knoten sind entweder ein :class:`_Leaf` oder ``("AND"|"OR", [Kinder])``.
+    """
+    baseline_level = 1
+    first_level = conditions_in_group[0].get('Ebene', 1)
+    if first_level < baseline_level:
+        first_level = baseline_level
+    tokens: List[Any] = ["("] * (first_level - baseline_level)
+    tokens.append(leaf_for(conditions_in_group[0]))
+    prev_level = first_level
+    for i in range(1, len(conditions_in_group)):
+        cond = conditions_in_group[i]
+        cur_level = cond.get('Ebene', baseline_level)
+        if cur_level < baseline_level:
+            cur_level = baseline_level
+        linking_operator = str(conditions_in_group[i - 1].get('Operator', "UND")).strip().upper()
+        english_operator = {"UND": "AND", "ODER": "OR", "AND": "AND", "OR": "OR"}.get(linking_operator)
+        if english_operator is None:
+            logger.warning(
+                "Unexpected linking_operator '%s' in Pauschale %s, Gruppe %s. Defaulting to AND.",
+                linking_operator, pauschale_code, group_id,
+            )
+            english_operator = "AND"
+        if cur_level < prev_level:
+            tokens.extend([")"] * (prev_level - cur_level))
+        tokens.append(english_operator)
+        if cur_level > prev_level:
+            tokens.extend(["("] * (cur_level - prev_level))
+        tokens.append(leaf_for(cond))
+        prev_level = cur_level
+    tokens.extend([")"] * (prev_level - baseline_level))
+
+    # Shunting-Yard wie _evaluate_boolean_tokens, aber mit Blättern statt Booleans
+    precedence = {"AND": 2, "OR": 1}
+    output: List[Any] = []
+    op_stack: List[str] = []
+    for tok in tokens:
+        if isinstance(tok, _Leaf):
+            output.append(tok)
+        elif tok in precedence:
+            while op_stack and op_stack[-1] in precedence and precedence[op_stack[-1]] >= precedence[tok]:
+                output.append(op_stack.pop())
+            op_stack.append(tok)
+        elif tok == "(":
+            op_stack.append(tok)
+        else:
+            while op_stack and op_stack[-1] != "(":
+                output.append(op_stack.pop())
+            if not op_stack:
+                raise ValueError("Unmatched closing parenthesis")
+            op_stack.pop()
+    while op_stack:
+        op = op_stack.pop()
+        if op == "(":
+            raise ValueError("Unmatched opening parenthesis")
+        output.append(op)
+
+    stack: List[Any] = []
+    for tok in output:
+        if isinstance(tok, _Leaf):
+            stack.append(tok)
+            continue
+        right = stack.pop(); left = stack.pop()
+        children: List[Any] = []
+        for node in (left, right):
+            # Gleiche Operatoren zusammenfassen: (a AND b) AND c -> AND(a, b, c)
+            if isinstance(node, tuple) and node[0] == tok:
+                children.extend(node[1])
+            else:
+                children.append(node)
+        stack.append((tok, children))
+    if len(stack) != 1:
+        raise ValueError("Invalid boolean expression")
+    return stack[0]
+
+
+class CompiledPauschale:
+    """Kompiliertes Bedingungsprogramm einer Pauschale.
+
+    ``blocks`` enthält pro AST-Makroblock die Gruppenbäume und die impliziten
+    Operatoren zwischen den Gruppen; ``block_operators`` die
+    AST-Verbindungsoperatoren zwischen den Blöcken. ``groups`` listet alle
+    Gruppen als ``(Gruppe, Baum)`` in Auswertungsreihenfolge.
+    """
+
+    __slots__ = ("code", "has_conditions", "blocks", "block_operators", "groups")
+
+    def __init__(self, code: str, has_conditions: bool) -> None:
+        self.code = code
+        self.has_conditions = has_conditions
+        self.blocks: List[Tuple[List[Any], List[str]]] = []
+        self.block_operators: List[str] = []
+        self.groups: List[Tuple[Any, Any]] = []
+
+
+def compile_pauschale_program(
+    pauschale_code: str,
+    conditions: List[Dict],
+    tabellen_dict_by_table: Dict[str, List[Dict]],
+    leaf_cache: Dict[Any, _Leaf] | None = None,
+) -> CompiledPauschale:
+    """Kompiliert die (unsortierten) Bedingungszeilen einer Pauschale.
+
+    Die Blockbildung entspricht :func:`evaluate_pauschale_logic_orchestrator`.
+    Gleichwertige Bedingungszeilen teilen sich über ``leaf_cache`` ein Blatt.
+    """
+    if leaf_cache is None:
+        leaf_cache = {}
+
+    def leaf_for(condition: Dict) -> _Leaf:
+        key = _condition_memo_key(condition, tabellen_dict_by_table)
+        if key is None:  # nicht hashbare Werte: kein Sharing
+            return _Leaf(None, _compile_condition(condition, tabellen_dict_by_table))
+        leaf = leaf_cache.get(key)
+        if leaf is None:
+            leaf = _Leaf(key, _compile_condition(condition, tabellen_dict_by_table))
+            leaf_cache[key] = leaf
+        return leaf
+
+    conditions_sorted = sorted(conditions, key=lambda x: x.get("BedingungsID", 0))
+    program = CompiledPauschale(pauschale_code, bool(conditions_sorted))
+
+    group_nodes: List[Any] = []
+    group_operators: List[str] = []
+    current_group: List[Dict] = []
+
+    def flush_group() -> None:
+        gruppe = current_group[0].get("Gruppe")
+        node = _compile_group(current_group, leaf_for, pauschale_code, gruppe)
+        group_nodes.append(node)
+        program.groups.append((gruppe, node))
+
+    def flush_block() -> None:
+        nonlocal group_nodes, group_operators
+        if group_nodes:
+            program.blocks.append((group_nodes, group_operators))
+            group_nodes, group_operators = [], []
+
+    for cond in conditions_sorted:
+        if str(cond.get("Bedingungstyp", "")).upper() == "AST VERBINDUNGSOPERATOR":
+            if current_group:
+                flush_group()
+                current_group = []
+            flush_block()
+            ast_op = str(cond.get("Werte", "ODER")).strip().upper()
+            ast_op_eng = {"UND": "AND", "ODER": "OR", "AND": "AND", "OR": "OR"}.get(ast_op)
+            if ast_op_eng is None:
+                logger.warning(f"Invalid AST operator value '{ast_op}' for Pauschale {pauschale_code}. Defaulting to OR.")
+                ast_op_eng = "OR"
+            program.block_operators.append(ast_op_eng)
+        elif current_group and cond.get("Gruppe") != current_group[0].get("Gruppe"):
+            flush_group()
+            implicit_op = str(current_group[-1].get('Operator', "ODER")).strip().upper()
+            group_operators.append("AND" if implicit_op == "UND" else "OR")
+            current_group = [cond]
+        else:
+            current_group.append(cond)
+    if current_group:
+        flush_group()
+    flush_block()
+    return program
+
+
+def compile_pauschale_programs(
+    pauschale_bedingungen_data: PauschaleBedingungen,
+    tabellen_dict_by_table: Dict[str, List[Dict]],
+    pauschale_codes: Any = (),
+) -> Dict[str, CompiledPauschale]:
+    """Kompiliert die Bedingungsprogramme aller Pauschalen.
+
+    ``pauschale_codes`` (z.B. die Schlüssel von ``pauschalen_dict``) erhalten
+    ein leeres Programm, falls sie keine Bedingungen haben. Pauschalen, deren
+    Bedingungen sich nicht kompilieren lassen, fehlen im Ergebnis und werden
+    von :func:`evaluate_pauschale_program` mit der Referenzimplementierung
+    ausgewertet.
+    """
+    rows_by_code: Dict[Any, List[Dict]] = {code: [] for code in pauschale_codes}
+    for cond in _iter_all_conditions(pauschale_bedingungen_data):
+        code = cond.get("Pauschale")
+        if code:
+            rows_by_code.setdefault(code, []).append(cond)
+
+    leaf_cache: Dict[Any, _Leaf] = {}
+    programs: Dict[str, CompiledPauschale] = {}
+    for code, rows in rows_by_code.items():
+        try:
+            programs[code] = compile_pauschale_program(code, rows, tabellen_dict_by_table, leaf_cache)
+        except Exception as e_compile:
+            logger.warning(
+                "WARNUNG: Bedingungen der Pauschale %s konnten nicht kompiliert werden (%s); nutze Referenzauswertung.",
+                code,
+                e_compile,
+            )
+    return programs
+
+
+def _evaluate_node(node: Any, ctx: EvaluationContext) -> bool:
+    if isinstance(node, _Leaf):
+        if node.key is None:
+            return bool(node.fn(ctx))
+        result = ctx.leaf_results.get(node.key)
+        if result is None:
+            ctx.memo_misses += 1
+            result = ctx.leaf_results[node.key] = bool(node.fn(ctx))
+        else:
+            ctx.memo_hits += 1
+        return result
+    op, children = node
+    if op == "AND":
+        for child in children:
+            if not _evaluate_node(child, ctx):
+                return False
+        return True
+    for child in children:
+        if _evaluate_node(child, ctx):
+            return True
+    return False
+
+
+def _evaluate_block(block: Tuple[List[Any], List[str]], ctx: EvaluationContext) -> bool:
+    group_nodes, group_operators = block
+    result = _evaluate_node(group_nodes[0], ctx)
+    for op, node in zip(group_operators, group_nodes[1:]):
+        if op == "AND" and result:
+            result = _evaluate_node(node, ctx)
+        elif op == "OR" and not result:
+            result = _evaluate_node(node, ctx)
+    return result
+
+
+def evaluate_compiled_pauschale(program: CompiledPauschale, context: PruefKontext) -> bool:
+    """Wertet ein kompiliertes Programm aus (gleiches Ergebnis wie der Orchestrator)."""
+    ctx = EvaluationContext.of(context)
+    if not program.has_conditions:
+        return True
+    if not program.blocks:
+        return False
+    result = _evaluate_block(program.blocks[0], ctx)
+    for i, op in enumerate(program.block_operators):
+        if i + 1 >= len(program.blocks):
+            break
+        if op == "AND" and result:
+            result = _evaluate_block(program.blocks[i + 1], ctx)
+        elif op == "OR" and not result:
+            result = _evaluate_block(program.blocks[i + 1], ctx)
+    return result
+
+
+def evaluate_pauschale_program(
+    pauschale_code: str,
+    context: PruefKontext,
+    programs: Dict[str, CompiledPauschale] | None,
+    all_pauschale_bedingungen_data: PauschaleBedingungen,
+    tabellen_dict_by_table: Dict[str, List[Dict]],
+    debug: bool = False,
+) -> bool:
+    """Kompiliertes Programm auswerten, sonst Fallback auf den Orchestrator."""
+    program = programs.get(pauschale_code) if programs else None
+    if program is None:
+        return evaluate_pauschale_logic_orchestrator(
+            pauschale_code=pauschale_code,
+            context=context,
+            all_pauschale_bedingungen_data=all_pauschale_bedingungen_data,
+            tabellen_dict_by_table=tabellen_dict_by_table,
+            debug=debug,
+        )
+    result = evaluate_compiled_pauschale(program, context)
+    if debug:
+        logger.debug("DEBUG Programm Pauschale %s: Ergebnis %s", pauschale_code, result)
+    return result
+
+
+def evaluate_all_pauschalen(
+    context: PruefKontext,
+    programs: Dict[str, CompiledPauschale],
+    pauschale_codes: Any = None,
+    all_pauschale_bedingungen_data: PauschaleBedingungen | None = None,
+    tabellen_dict_by_table: Dict[str, List[Dict]] | None = None,
+) -> Dict[str, Any]:
+    """Wertet alle (bzw. die angegebenen) Pauschalen gegen einen Kontext aus.
+
+    Alle Programme teilen sich die Memo-Tabelle des :class:`EvaluationContext`,
+    gemeinsame Bedingungen werden also nur einmal geprüft. Gedacht für Audits
+    und die Ansicht "warum nicht diese Pauschale", nicht für die Auswahl.
+
+    Returns
+    -------
+    dict
+        ``codes``: sortierte Pauschalencodes; ``bitmap``: Bit ``i`` ist gesetzt,
+        wenn ``codes[i]`` gültig ist; ``valid_codes``: die gültigen Codes;
+        ``failing_groups``: pro ungültiger Pauschale die Gruppen, deren
+        Bedingungen nicht erfüllt sind (leer, falls ohne Programm über den
+        Orchestrator ausgewertet); ``memo``: :meth:`EvaluationContext.memo_stats`.
+    """
+    ctx = EvaluationContext.of(context)
+    candidate_codes = programs.keys() if pauschale_codes is None else pauschale_codes
+    codes: List[str] = []
+    bitmap = 0
+    failing_groups: Dict[str, List[Any]] = {}
+    for code in sorted(candidate_codes):
+        program = programs.get(code)
+        if program is not None:
+            is_valid = evaluate_compiled_pauschale(program, ctx)
+            failed = [] if is_valid else [gruppe for gruppe, node in program.groups if not _evaluate_node(node, ctx)]
+        elif all_pauschale_bedingungen_data is not None and tabellen_dict_by_table is not None:
+            is_valid = evaluate_pauschale_logic_orchestrator(code, ctx, all_pauschale_bedingungen_data, tabellen_dict_by_table)
+            failed = []
+        else:
+            logger.debug("DEBUG: Kein Bedingungsprogramm für Pauschale %s, übersprungen.", code)
+            continue
+        if is_valid:
+            bitmap |= 1 << len(codes)
+        else:
+            failing_groups[code] = failed
+        codes.append(code)
+    return {
+        "codes": codes,
+        "bitmap": bitmap,
+        "valid_codes": [code for i, code in enumerate(codes) if bitmap >> i & 1],
+        "failing_groups": failing_groups,
+        "memo": ctx.memo_stats(),
+    }
+
+
 # === PRUEFUNG DER BEDINGUNGEN (STRUKTURIERTES RESULTAT) ===
 def check_pauschale_conditions(
     pauschale_code: str,
-    context: dict,
-    pauschale_bedingungen_data: list[dict],
+    context: PruefKontext,
+    pauschale_bedingungen_data: PauschaleBedingungen,
     tabellen_dict_by_table: Dict[str, List[Dict]],
     leistungskatalog_dict: Dict[str, Dict[str, Any]],
     lang: str = "de"
@@ -717,8 +1308,9 @@ def check_pauschale_conditions(
     BED_MAX_KEY = "MaxWert"
     BED_VERGLEICHSOP_KEY = "Vergleichsoperator"
 
+    context = EvaluationContext.of(context)
     all_conditions_for_pauschale_sorted_by_id = sorted(
-        [c for c in pauschale_bedingungen_data if c.get(PAUSCHALE_KEY) == pauschale_code],
+        get_conditions_for_pauschale(pauschale_code, pauschale_bedingungen_data),
         key=lambda x: x.get(BED_ID_KEY, 0)
     )
 
@@ -926,14 +1518,13 @@ def check_pauschale_conditions(
                 match_details_parts = []
                 # Check for ICD matches (List or Table)
                 if active_condition_type_for_display in ["ICD", "HAUPTDIAGNOSE IN LISTE", "ICD IN LISTE", "HAUPTDIAGNOSE IN TABELLE", "ICD IN TABELLE"]:
-                    provided_icds_upper = {p_icd.upper() for p_icd in context.get("ICD", []) if p_icd}
+                    provided_icds_upper = context.icds
                     
                     required_codes_in_rule = set()
                     if "TABELLE" in active_condition_type_for_display:
                         table_ref_icd = cond_data.get(BED_WERTE_KEY)
                         if table_ref_icd and isinstance(table_ref_icd, str): # Check if table_ref_icd is a string and not None
-                            for entry in get_table_content(table_ref_icd, "icd", tabellen_dict_by_table, lang): # lang for potential text in table
-                                 if entry.get('Code'): required_codes_in_rule.add(entry['Code'].upper())
+                            required_codes_in_rule = set(get_table_codes(table_ref_icd, "icd", tabellen_dict_by_table))
                         # If table_ref_icd is None or not a string, required_codes_in_rule remains empty for table part
                     else: # LIST type
                         required_codes_in_rule = {w.strip().upper() for w in str(cond_data.get(BED_WERTE_KEY, "")).split(',') if w.strip()}
@@ -950,14 +1541,13 @@ def check_pauschale_conditions(
 
                 # Check for LKN matches (List or Table)
                 elif active_condition_type_for_display in ["LEISTUNGSPOSITIONEN IN LISTE", "LKN", "LKN IN LISTE", "LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE", "LKN IN TABELLE"]:
-                    provided_lkns_upper = {p_lkn.upper() for p_lkn in context.get("LKN", []) if p_lkn}
+                    provided_lkns_upper = context.lkns
                     
                     required_lkn_codes_in_rule = set()
                     if "TABELLE" in active_condition_type_for_display:
                         table_ref_lkn = cond_data.get(BED_WERTE_KEY)
                         if table_ref_lkn and isinstance(table_ref_lkn, str): # Check if table_ref_lkn is a string and not None
-                            for entry in get_table_content(table_ref_lkn, "service_catalog", tabellen_dict_by_table, lang): # lang for potential text
-                                if entry.get('Code'): required_lkn_codes_in_rule.add(entry['Code'].upper())
+                            required_lkn_codes_in_rule = set(get_table_codes(table_ref_lkn, "service_catalog", tabellen_dict_by_table))
                         # If table_ref_lkn is None or not a string, required_lkn_codes_in_rule remains empty for table part
                     else: # LIST type
                         required_lkn_codes_in_rule = {w.strip().upper() for w in str(cond_data.get(BED_WERTE_KEY, "")).split(',') if w.strip()}
@@ -1014,7 +1604,7 @@ def check_pauschale_conditions(
 
     # Get ALL conditions for the pauschale, sorted by BedingungsID for sequential processing
     all_conditions_for_pauschale_sorted = sorted(
-        [c for c in pauschale_bedingungen_data if c.get(PAUSCHALE_KEY) == pauschale_code],
+        get_conditions_for_pauschale(pauschale_code, pauschale_bedingungen_data),
         key=lambda x: x.get(BED_ID_KEY, 0)
     )
 
@@ -1267,18 +1857,56 @@ def render_condition_results_html(
     return "".join(html_parts)
 
 
+def render_pauschale_conditions(
+    pauschale_code: str,
+    context: PruefKontext,
+    pauschale_bedingungen_data: PauschaleBedingungen,
+    tabellen_dict_by_table: Dict[str, List[Dict]],
+    leistungskatalog_dict: Dict[str, Dict[str, Any]],
+    lang: str = "de",
+    condition_programs: Dict[str, CompiledPauschale] | None = None,
+) -> Dict[str, Any]:
+    """Bedingungs-HTML einer einzelnen Pauschale nachträglich erzeugen.
+
+    Gegenstück zu ``detail_level="selected"`` in
+    :func:`determine_applicable_pauschale`: Der Client lädt das HTML für weitere
+    Kandidaten erst bei Bedarf. Das Ergebnis hat dieselben Schlüssel wie ein
+    Eintrag in ``evaluated_pauschalen``.
+    """
+    context = EvaluationContext.of(context)
+    is_valid = evaluate_pauschale_program(
+        pauschale_code, context, condition_programs, pauschale_bedingungen_data, tabellen_dict_by_table
+    )
+    check_res = check_pauschale_conditions(
+        pauschale_code, context, pauschale_bedingungen_data, tabellen_dict_by_table, leistungskatalog_dict, lang
+    )
+    return {
+        "code": pauschale_code,
+        "is_valid_structured": is_valid,
+        "bedingungs_pruef_html": check_res.get("html", ""),
+        "bedingungs_fehler": check_res.get("errors", []),
+    }
+
+
 # --- Ausgelagerte Pauschalen-Ermittlung ---
 def determine_applicable_pauschale(
     user_input: str, # Bleibt für potenzielles LLM-Ranking, aktuell nicht primär genutzt
     rule_checked_leistungen: list[dict], # Für die initiale Findung potenzieller Pauschalen
-    context: dict, # Enthält LKN, ICD, Alter, Geschlecht, Seitigkeit, Anzahl, useIcd
+    context: PruefKontext, # Enthält LKN, ICD, Alter, Geschlecht, Seitigkeit, Anzahl, useIcd
     pauschale_lp_data: List[Dict],
-    pauschale_bedingungen_data: List[Dict],
+    pauschale_bedingungen_data: PauschaleBedingungen, # Index {Pauschale: [...]} oder flache Liste
     pauschalen_dict: Dict[str, Dict], # Dict aller Pauschalen {code: details}
     leistungskatalog_dict: Dict[str, Dict], # Für LKN-Beschreibungen etc.
     tabellen_dict_by_table: Dict[str, List[Dict]], # Für Tabellen-Lookups
     potential_pauschale_codes_input: Set[str] | None = None, # Optional vorabgefilterte Codes
-    lang: str = 'de'
+    lang: str = 'de',
+    lkn_pauschalen_index: Dict[str, Set[str]] | None = None, # Optional: Reverse-Index LKN -> Pauschalen
+    code_table_index: Dict[Tuple[str, str], Set[str]] | None = None, # Optional: Reverse-Index Code -> Tabellen
+    condition_programs: Dict[str, "CompiledPauschale"] | None = None, # Optional: kompilierte Bedingungsprogramme
+    detail_level: str = "selected", # "selected": HTML nur für die gewählte Pauschale, "full": für alle Kandidaten
+    simplified_signatures: Dict[str, frozenset] | None = None, # Optional: build_simplified_signatures
+    stem_diffs: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], Tuple[Any, ...]]] | None = None, # Optional: build_stem_diffs
+    potential_icds_index: Dict[Tuple[str, str], Tuple[Dict, ...]] | None = None, # Optional: build_potential_icds_index
     ) -> dict:
     """Finde die bestmögliche Pauschale anhand der Regeln.
 
@@ -1288,12 +1916,16 @@ def determine_applicable_pauschale(
         Ursprüngliche Benutzereingabe (nur zu Loggingzwecken).
     rule_checked_leistungen : list[dict]
         Bereits regelgeprüfte Leistungen.
-    context : dict
-        Kontextdaten wie LKN, ICD, Alter oder Seitigkeit.
+    context : dict | EvaluationContext
+        Kontextdaten wie LKN, ICD, Alter oder Seitigkeit. Ein Dict wird einmal
+        in einen :class:`EvaluationContext` umgewandelt, der für alle
+        Kandidaten und Bedingungen wiederverwendet wird.
     pauschale_lp_data : list[dict]
         Zuordnung von LKN zu Pauschalen.
-    pauschale_bedingungen_data : list[dict]
-        Detaillierte Bedingungsdefinitionen.
+    pauschale_bedingungen_data : dict[str, list[dict]] | list[dict]
+        Detaillierte Bedingungsdefinitionen, bevorzugt als Index pro
+        Pauschale (``pauschale_bedingungen_indexed``). Die flache Liste wird
+        aus Kompatibilitätsgründen weiter akzeptiert.
     pauschalen_dict : dict
         Stammdaten aller Pauschalen.
     leistungskatalog_dict : dict
@@ -1305,6 +1937,32 @@ def determine_applicable_pauschale(
         Funktion mögliche Codes aus den Kontext-LKN.
     lang : str, optional
         Sprache der Ausgaben, Standard ``"de"``.
+    lkn_pauschalen_index : dict, optional
+        Vorberechneter Index aus :func:`utils.build_lkn_pauschalen_index`.
+        Ersetzt die Suche über alle Leistungspositionen und Bedingungen, wenn
+        keine Kandidaten übergeben werden.
+    code_table_index : dict, optional
+        Vorberechneter Index aus :func:`utils.build_code_table_index`; wird
+        sonst bei Bedarf einmal pro Aufruf erstellt.
+    condition_programs : dict, optional
+        Ergebnis von :func:`compile_pauschale_programs`. Pauschalen mit
+        Programm werden damit ausgewertet, alle anderen mit
+        :func:`evaluate_pauschale_logic_orchestrator`.
+    detail_level : str, optional
+        ``"selected"`` (Standard) erzeugt das Bedingungs-HTML nur für die
+        ausgewählte Pauschale; die übrigen Kandidaten erhalten ein leeres
+        ``bedingungs_pruef_html`` und können über
+        :func:`render_pauschale_conditions` nachgeladen werden. ``"full"``
+        erzeugt es für alle Kandidaten.
+    simplified_signatures, stem_diffs : dict, optional
+        Beim Laden vorberechnete Ergebnisse von
+        :func:`build_simplified_signatures` und :func:`build_stem_diffs` für
+        den Vergleich mit Pauschalen desselben Stamms. Fehlende Einträge werden
+        bei Bedarf berechnet.
+    potential_icds_index : dict, optional
+        Ergebnis von :func:`build_potential_icds_index` (``(Pauschale, lang)``
+        -> sortierte ICD-Liste). Ohne Eintrag werden die ICD-Tabellen der
+        ausgewählten Pauschale wie bisher expandiert.
 
     Returns
     -------
@@ -1315,8 +1973,9 @@ def determine_applicable_pauschale(
     Notes
     -----
     Zunächst werden anhand der LKN sowie der Bedingungsdefinitionen mögliche
-    Kandidaten gesammelt. Für jeden Code wird
-    :func:`evaluate_structured_conditions` aufgerufen. Aus den gültigen
+    Kandidaten gesammelt. Für jeden Code wird das kompilierte
+    Bedingungsprogramm bzw. :func:`evaluate_pauschale_logic_orchestrator`
+    ausgewertet. Aus den gültigen
     Pauschalen wird der Kandidat mit dem höchsten Score (Taxpunkte) und dem
     niedrigsten Buchstabensuffix gewählt.
 
@@ -1336,6 +1995,7 @@ def determine_applicable_pauschale(
     'Pauschale'
     """
     logger.info("INFO: Starte Pauschalenermittlung mit strukturierter Bedingungsprüfung...")
+    context = EvaluationContext.of(context)
     PAUSCHALE_ERKLAERUNG_KEY = 'pauschale_erklaerung_html'; POTENTIAL_ICDS_KEY = 'potential_icds'
     LKN_KEY_IN_RULE_CHECKED = 'lkn'; PAUSCHALE_KEY_IN_PAUSCHALEN = 'Pauschale' # In PAUSCHALEN_Pauschalen
     PAUSCHALE_TEXT_KEY_IN_PAUSCHALEN = 'Pauschale_Text'
@@ -1350,6 +2010,12 @@ def determine_applicable_pauschale(
             "DEBUG: Verwende übergebene potenzielle Pauschalen: %s",
             potential_pauschale_codes,
         )
+    elif lkn_pauschalen_index is not None:
+        potential_pauschale_codes = find_pauschalen_for_lkns(context.get("LKN", []), lkn_pauschalen_index)
+        logger.info(
+            "DEBUG: Potenzielle Pauschalen aus Reverse-Index: %s",
+            potential_pauschale_codes,
+        )
     else:
         logger.info("DEBUG: Suche potenzielle Pauschalen (da nicht übergeben)...")
         # LKNs aus dem Kontext (regelkonform + gemappt) für die Suche verwenden
@@ -1365,10 +2031,14 @@ def determine_applicable_pauschale(
         # print(f"  Potenzielle Pauschalen nach Methode a: {potential_pauschale_codes}")
 
         # Methode b & c: LKNs in Bedingungen (Liste oder Tabelle)
-        # Cache für Tabellenzugehörigkeit von Kontext-LKNs
-        context_lkns_in_tables_cache: Dict[str, Set[str]] = {}
-
-        for cond in pauschale_bedingungen_data:
+        if code_table_index is None:
+            code_table_index = build_code_table_index(tabellen_dict_by_table)
+        context_lkns_in_tables = {
+            lkn_ctx: get_tables_for_code(lkn_ctx, "service_catalog", code_table_index)
+            for lkn_ctx in context_lkns_for_search
+        }
+
+        for cond in _iter_all_conditions(pauschale_bedingungen_data):
             pc = cond.get(BED_PAUSCHALE_KEY)
             if not (pc and pc in pauschalen_dict): continue # Nur für existierende Pauschalen
 
@@ -1383,16 +2053,7 @@ def determine_applicable_pauschale(
             elif bedingungstyp_cond == "LEISTUNGSPOSITIONEN IN TABELLE" or bedingungstyp_cond == "TARIFPOSITIONEN IN TABELLE":
                 table_refs_cond = {t.strip().lower() for t in str(werte_cond).split(',') if t.strip()}
                 for lkn_ctx in context_lkns_for_search:
-                    if lkn_ctx not in context_lkns_in_tables_cache:
-                        tables_for_lkn_ctx = set()
-                        for table_name_key_norm, table_entries in tabellen_dict_by_table.items():
-                            for entry in table_entries:
-                                if entry.get('Code', '').upper() == lkn_ctx and \
-                                   entry.get('Tabelle_Typ', '').lower() == "service_catalog":
-                                    tables_for_lkn_ctx.add(table_name_key_norm) # Bereits normalisiert (lower)
-                        context_lkns_in_tables_cache[lkn_ctx] = tables_for_lkn_ctx
-                    
-                    if not table_refs_cond.isdisjoint(context_lkns_in_tables_cache[lkn_ctx]):
+                    if not table_refs_cond.isdisjoint(context_lkns_in_tables[lkn_ctx]):
                         potential_pauschale_codes.add(pc)
                         break # Ein Treffer für diese Bedingung reicht
         logger.info(
@@ -1417,22 +2078,24 @@ def determine_applicable_pauschale(
         try:
             # grp_op = get_group_operator_for_pauschale(code, pauschale_bedingungen_data, default=DEFAULT_GROUP_OPERATOR) # Removed
             # evaluate_structured_conditions is now the orchestrator and handles group logic internally
-            is_pauschale_valid_structured = evaluate_pauschale_logic_orchestrator( # Renamed for clarity, was evaluate_structured_conditions
+            is_pauschale_valid_structured = evaluate_pauschale_program(
                 pauschale_code=code,
                 context=context,
+                programs=condition_programs,
                 all_pauschale_bedingungen_data=pauschale_bedingungen_data,
                 tabellen_dict_by_table=tabellen_dict_by_table,
                 debug=logger.isEnabledFor(logging.DEBUG) # Pass appropriate debug flag
             )
-            check_res = check_pauschale_conditions(
-                code,
-                context,
-                pauschale_bedingungen_data,
-                tabellen_dict_by_table,
-                leistungskatalog_dict,
-                lang,
-            )
-            bedingungs_html = check_res.get("html", "")
+            if detail_level == "full":
+                check_res = check_pauschale_conditions(
+                    code,
+                    context,
+                    pauschale_bedingungen_data,
+                    tabellen_dict_by_table,
+                    leistungskatalog_dict,
+                    lang,
+                )
+                bedingungs_html = check_res.get("html", "")
         except Exception as e_eval:
             logger.error(
                 "FEHLER bei evaluate_structured_conditions für Pauschale %s: %s",
@@ -1455,6 +2118,17 @@ def determine_applicable_pauschale(
             "taxpunkte": tp_val,
         })
 
+    if logger.isEnabledFor(logging.DEBUG):
+        memo = context.memo_stats()
+        logger.debug(
+            "DEBUG: Bedingungs-Memo für %s Kandidaten: %s Treffer, %s Prüfungen, %s Einträge (Trefferquote %.0f%%)",
+            len(evaluated_candidates),
+            memo["hits"],
+            memo["misses"],
+            memo["entries"],
+            memo["hit_rate"] * 100,
+        )
+
     valid_candidates = [cand for cand in evaluated_candidates if cand["is_valid_structured"]]
     logger.info(
         "DEBUG: Struktur-gültige Kandidaten nach Prüfung: %s",
@@ -1554,6 +2228,7 @@ def determine_applicable_pauschale(
             f"<p class='error'>Schwerwiegender Fehler bei HTML-Generierung der Bedingungen: {escape(str(e_html_gen))}</p>"
         )
         condition_errors_html_gen = [f"Fehler HTML-Generierung: {e_html_gen}"]
+    selected_candidate_info["bedingungs_pruef_html"] = bedingungs_pruef_html_result
 
     # Erstelle die Erklärung für die Pauschalenauswahl
     # Kontext-LKNs für die Erklärung (aus dem `context` Dictionary)
@@ -1618,8 +2293,7 @@ def determine_applicable_pauschale(
         )
 
     # Vergleich mit anderen Pauschalen der gleichen Gruppe (Stamm)
-    match_stamm = re.match(r"([A-Z0-9.]+)([A-Z])$", str(best_pauschale_code))
-    pauschalen_stamm_code = match_stamm.group(1) if match_stamm else None
+    pauschalen_stamm_code = get_pauschale_stamm(best_pauschale_code)
     
     if pauschalen_stamm_code:
         # Finde andere *potenzielle* Pauschalen (aus evaluated_candidates) in derselben Gruppe
@@ -1634,7 +2308,10 @@ def determine_applicable_pauschale(
                 pauschale_erklaerung_html += f"<hr><p><b>Confronto con altri forfait del gruppo '{escape(pauschalen_stamm_code)}':</b></p>"
             else:
                 pauschale_erklaerung_html += f"<hr><p><b>Vergleich mit anderen Pauschalen der Gruppe '{escape(pauschalen_stamm_code)}':</b></p>"
-            selected_conditions_repr_set = get_simplified_conditions(best_pauschale_code, pauschale_bedingungen_data)
+            def signature_for(code_for_signature: str) -> frozenset:
+                if simplified_signatures is not None and code_for_signature in simplified_signatures:
+                    return simplified_signatures[code_for_signature]
+                return frozenset(get_simplified_conditions(code_for_signature, pauschale_bedingungen_data))
 
             for other_cand in sorted(other_evaluated_codes_in_group, key=lambda x: x['code']):
                 other_code_str = str(other_cand['code'])
@@ -1647,9 +2324,10 @@ def determine_applicable_pauschale(
                     status = translate('conditions_not_met', lang)
                     validity_info_html = f"<span style=\"color:red;\">{status}</span>"
 
-                other_conditions_repr_set = get_simplified_conditions(other_code_str, pauschale_bedingungen_data)
-                additional_conditions_for_other = other_conditions_repr_set - selected_conditions_repr_set
-                missing_conditions_in_other = selected_conditions_repr_set - other_conditions_repr_set
+                stem_diff = stem_diffs.get((best_pauschale_code, other_code_str)) if stem_diffs is not None else None
+                if stem_diff is None:
+                    stem_diff = _signature_diff(signature_for(best_pauschale_code), signature_for(other_code_str))
+                additional_conditions_for_other, missing_conditions_in_other = stem_diff
 
                 diff_label = translate('diff_to', lang)
                 pauschale_erklaerung_html += (
@@ -1664,7 +2342,7 @@ def determine_applicable_pauschale(
                         pauschale_erklaerung_html += f"<p>Requisiti supplementari / altri per {escape(other_code_str)}:</p><ul>"
                     else:
                         pauschale_erklaerung_html += f"<p>Zusätzliche/Andere Anforderungen für {escape(other_code_str)}:</p><ul>"
-                    for cond_tuple_item in sorted(list(additional_conditions_for_other)):
+                    for cond_tuple_item in additional_conditions_for_other:
                         condition_html_detail_item = generate_condition_detail_html(cond_tuple_item, leistungskatalog_dict, tabellen_dict_by_table, lang)
                         pauschale_erklaerung_html += condition_html_detail_item
                     pauschale_erklaerung_html += "</ul>"
@@ -1676,7 +2354,7 @@ def determine_applicable_pauschale(
                         pauschale_erklaerung_html += f"<p>I seguenti requisiti di {escape(best_pauschale_code)} mancano in {escape(other_code_str)}:</p><ul>"
                     else:
                         pauschale_erklaerung_html += f"<p>Folgende Anforderungen von {escape(best_pauschale_code)} fehlen bei {escape(other_code_str)}:</p><ul>"
-                    for cond_tuple_item in sorted(list(missing_conditions_in_other)):
+                    for cond_tuple_item in missing_conditions_in_other:
                         condition_html_detail_item = generate_condition_detail_html(cond_tuple_item, leistungskatalog_dict, tabellen_dict_by_table, lang)
                         pauschale_erklaerung_html += condition_html_detail_item
                     pauschale_erklaerung_html += "</ul>"
@@ -1692,22 +2370,13 @@ def determine_applicable_pauschale(
     
     best_pauschale_details[PAUSCHALE_ERKLAERUNG_KEY] = pauschale_erklaerung_html
 
-    # Potenzielle ICDs für die ausgewählte Pauschale sammeln
-    potential_icds_list = []
-    pauschale_conditions_for_selected = [
-        cond for cond in pauschale_bedingungen_data if cond.get(BED_PAUSCHALE_KEY) == best_pauschale_code
-    ]
-    for cond_item_icd in pauschale_conditions_for_selected:
-        if cond_item_icd.get(BED_TYP_KEY, "").upper() == "HAUPTDIAGNOSE IN TABELLE":
-            tabelle_ref_icd = cond_item_icd.get(BED_WERTE_KEY)
-            if tabelle_ref_icd:
-                icd_entries_list = get_table_content(tabelle_ref_icd, "icd", tabellen_dict_by_table, lang)
-                for entry_icd in icd_entries_list:
-                    code_icd = entry_icd.get('Code'); text_icd = entry_icd.get('Code_Text')
-                    if code_icd: potential_icds_list.append({"Code": code_icd, "Code_Text": text_icd or "N/A"})
-    
-    unique_icds_dict_result = {icd_item['Code']: icd_item for icd_item in potential_icds_list if icd_item.get('Code')}
-    best_pauschale_details[POTENTIAL_ICDS_KEY] = sorted(unique_icds_dict_result.values(), key=lambda x: x['Code'])
+    # Potenzielle ICDs für die ausgewählte Pauschale (vorberechnet oder bei Bedarf gesammelt)
+    precomputed_icds = potential_icds_index.get((best_pauschale_code, lang)) if potential_icds_index else None
+    if precomputed_icds is None:
+        precomputed_icds = _collect_potential_icds(
+            get_conditions_for_pauschale(best_pauschale_code, pauschale_bedingungen_data), tabellen_dict_by_table, lang
+        )
+    best_pauschale_details[POTENTIAL_ICDS_KEY] = list(precomputed_icds)
 
     final_result_dict = {
         "type": "Pauschale",
@@ -1721,7 +2390,7 @@ def determine_applicable_pauschale(
 
 
 # --- HILFSFUNKTIONEN (auf Modulebene) ---
-def get_simplified_conditions(pauschale_code: str, bedingungen_data: list[dict]) -> set:
+def get_simplified_conditions(pauschale_code: str, bedingungen_data: PauschaleBedingungen) -> set:
     """
     Wandelt Bedingungen in eine vereinfachte, vergleichbare Darstellung (Set von Tupeln) um.
     Dies dient dazu, Unterschiede zwischen Pauschalen auf einer höheren Ebene zu identifizieren.
@@ -1729,79 +2398,190 @@ def get_simplified_conditions(pauschale_code: str, bedingungen_data: list[dict])
     sondern eher die Art und den Hauptwert der Bedingung.
     """
     simplified_set = set()
-    PAUSCHALE_KEY = 'Pauschale'; BED_TYP_KEY = 'Bedingungstyp'; BED_WERTE_KEY = 'Werte'
+    for cond in get_conditions_for_pauschale(pauschale_code, bedingungen_data):
+        condition_tuple = _simplify_condition(cond)
+        if condition_tuple:
+            simplified_set.add(condition_tuple)
+    return simplified_set
+
+
+def _simplify_condition(cond: Dict) -> Tuple[Any, ...] | None:
+    """Vereinfachte Darstellung einer Bedingungszeile (siehe :func:`get_simplified_conditions`)."""
+    BED_TYP_KEY = 'Bedingungstyp'; BED_WERTE_KEY = 'Werte'
     BED_FELD_KEY = 'Feld'; BED_MIN_KEY = 'MinWert'; BED_MAX_KEY = 'MaxWert'
     BED_VERGLEICHSOP_KEY = 'Vergleichsoperator' # Hinzugefügt
+
+    typ_original = cond.get(BED_TYP_KEY, "").upper()
+    wert = str(cond.get(BED_WERTE_KEY, "")).strip() # String und strip
+    feld = str(cond.get(BED_FELD_KEY, "")).strip()
+    vergleichsop = str(cond.get(BED_VERGLEICHSOP_KEY, "=")).strip() # Default '='
+    
+    condition_tuple = None
+    # Normalisiere Typen für den Vergleich
+    # Ziel ist es, semantisch ähnliche Bedingungen gleich zu behandeln
     
-    pauschale_conditions = [cond for cond in bedingungen_data if cond.get(PAUSCHALE_KEY) == pauschale_code]
+    final_cond_type_for_comparison = typ_original # Default
+
+    if typ_original in ["LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE", "LKN IN TABELLE"]:
+        final_cond_type_for_comparison = 'LKN_TABLE'
+        condition_tuple = (final_cond_type_for_comparison, tuple(sorted([t.strip().lower() for t in wert.split(',') if t.strip()]))) # Tabellennamen als sortiertes Tuple
+    elif typ_original in ["HAUPTDIAGNOSE IN TABELLE", "ICD IN TABELLE"]:
+        final_cond_type_for_comparison = 'ICD_TABLE'
+        condition_tuple = (final_cond_type_for_comparison, tuple(sorted([t.strip().lower() for t in wert.split(',') if t.strip()])))
+    elif typ_original in ["LEISTUNGSPOSITIONEN IN LISTE", "LKN"]:
+        final_cond_type_for_comparison = 'LKN_LIST'
+        condition_tuple = (final_cond_type_for_comparison, tuple(sorted([lkn.strip().upper() for lkn in wert.split(',') if lkn.strip()]))) # LKNs als sortiertes Tuple
+    elif typ_original in ["HAUPTDIAGNOSE IN LISTE", "ICD"]:
+         final_cond_type_for_comparison = 'ICD_LIST'
+         condition_tuple = (final_cond_type_for_comparison, tuple(sorted([icd.strip().upper() for icd in wert.split(',') if icd.strip()])))
+    elif typ_original in ["MEDIKAMENTE IN LISTE", "GTIN"]:
+        final_cond_type_for_comparison = 'GTIN_LIST'
+        condition_tuple = (final_cond_type_for_comparison, tuple(sorted([gtin.strip() for gtin in wert.split(',') if gtin.strip()])))
+    elif typ_original == "PATIENTENBEDINGUNG" and feld:
+        final_cond_type_for_comparison = f'PATIENT_{feld.upper()}' # z.B. PATIENT_ALTER
+        # Für Alter mit Min/Max eine normalisierte Darstellung
+        if feld.lower() == "alter":
+            min_w = cond.get(BED_MIN_KEY)
+            max_w = cond.get(BED_MAX_KEY)
+            if min_w is not None or max_w is not None:
+                wert_repr = f"min:{min_w or '-'}_max:{max_w or '-'}"
+            else:
+                wert_repr = f"exact:{wert}"
+            condition_tuple = (final_cond_type_for_comparison, wert_repr)
+        else: # Für andere Patientenbedingungen (z.B. Geschlecht)
+            condition_tuple = (final_cond_type_for_comparison, wert.lower())
+    elif typ_original == "ALTER IN JAHREN BEI EINTRITT":
+        final_cond_type_for_comparison = 'PATIENT_ALTER_EINTRITT'
+        condition_tuple = (final_cond_type_for_comparison, f"{vergleichsop}{wert}")
+    elif typ_original == "ANZAHL":
+        final_cond_type_for_comparison = 'ANZAHL_CHECK'
+        condition_tuple = (final_cond_type_for_comparison, f"{vergleichsop}{wert}")
+    elif typ_original == "SEITIGKEIT":
+        final_cond_type_for_comparison = 'SEITIGKEIT_CHECK'
+        # Normalisiere den Regelwert für den Vergleich (z.B. 'B' -> 'beidseits')
+        norm_regel_wert = wert.strip().replace("'", "").lower()
+        if norm_regel_wert == 'b': norm_regel_wert = 'beidseits'
+        elif norm_regel_wert == 'e': norm_regel_wert = 'einseitig' # Vereinfachung für Vergleich
+        condition_tuple = (final_cond_type_for_comparison, f"{vergleichsop}{norm_regel_wert}")
+    elif typ_original == "GESCHLECHT IN LISTE": # Bereits oben durch PATIENT_GESCHLECHT abgedeckt, wenn Feld gesetzt ist
+        final_cond_type_for_comparison = 'GESCHLECHT_LIST_CHECK'
+        condition_tuple = (final_cond_type_for_comparison, tuple(sorted([g.strip().lower() for g in wert.split(',') if g.strip()])))
+    else:
+        # Fallback für unbekannte oder nicht spezifisch behandelte Typen
+        # print(f"  WARNUNG: get_simplified_conditions: Unbehandelter Typ '{typ_original}'. Verwende Originaltyp und Wert.")
+        condition_tuple = (typ_original, wert) # Als Fallback
+    return condition_tuple
 
-    for cond in pauschale_conditions:
-        typ_original = cond.get(BED_TYP_KEY, "").upper()
-        wert = str(cond.get(BED_WERTE_KEY, "")).strip() # String und strip
-        feld = str(cond.get(BED_FELD_KEY, "")).strip()
-        vergleichsop = str(cond.get(BED_VERGLEICHSOP_KEY, "=")).strip() # Default '='
-        
-        condition_tuple = None
-        # Normalisiere Typen für den Vergleich
-        # Ziel ist es, semantisch ähnliche Bedingungen gleich zu behandeln
-        
-        final_cond_type_for_comparison = typ_original # Default
-
-        if typ_original in ["LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE", "LKN IN TABELLE"]:
-            final_cond_type_for_comparison = 'LKN_TABLE'
-            condition_tuple = (final_cond_type_for_comparison, tuple(sorted([t.strip().lower() for t in wert.split(',') if t.strip()]))) # Tabellennamen als sortiertes Tuple
-        elif typ_original in ["HAUPTDIAGNOSE IN TABELLE", "ICD IN TABELLE"]:
-            final_cond_type_for_comparison = 'ICD_TABLE'
-            condition_tuple = (final_cond_type_for_comparison, tuple(sorted([t.strip().lower() for t in wert.split(',') if t.strip()])))
-        elif typ_original in ["LEISTUNGSPOSITIONEN IN LISTE", "LKN"]:
-            final_cond_type_for_comparison = 'LKN_LIST'
-            condition_tuple = (final_cond_type_for_comparison, tuple(sorted([lkn.strip().upper() for lkn in wert.split(',') if lkn.strip()]))) # LKNs als sortiertes Tuple
-        elif typ_original in ["HAUPTDIAGNOSE IN LISTE", "ICD"]:
-             final_cond_type_for_comparison = 'ICD_LIST'
-             condition_tuple = (final_cond_type_for_comparison, tuple(sorted([icd.strip().upper() for icd in wert.split(',') if icd.strip()])))
-        elif typ_original in ["MEDIKAMENTE IN LISTE", "GTIN"]:
-            final_cond_type_for_comparison = 'GTIN_LIST'
-            condition_tuple = (final_cond_type_for_comparison, tuple(sorted([gtin.strip() for gtin in wert.split(',') if gtin.strip()])))
-        elif typ_original == "PATIENTENBEDINGUNG" and feld:
-            final_cond_type_for_comparison = f'PATIENT_{feld.upper()}' # z.B. PATIENT_ALTER
-            # Für Alter mit Min/Max eine normalisierte Darstellung
-            if feld.lower() == "alter":
-                min_w = cond.get(BED_MIN_KEY)
-                max_w = cond.get(BED_MAX_KEY)
-                if min_w is not None or max_w is not None:
-                    wert_repr = f"min:{min_w or '-'}_max:{max_w or '-'}"
-                else:
-                    wert_repr = f"exact:{wert}"
-                condition_tuple = (final_cond_type_for_comparison, wert_repr)
-            else: # Für andere Patientenbedingungen (z.B. Geschlecht)
-                condition_tuple = (final_cond_type_for_comparison, wert.lower())
-        elif typ_original == "ALTER IN JAHREN BEI EINTRITT":
-            final_cond_type_for_comparison = 'PATIENT_ALTER_EINTRITT'
-            condition_tuple = (final_cond_type_for_comparison, f"{vergleichsop}{wert}")
-        elif typ_original == "ANZAHL":
-            final_cond_type_for_comparison = 'ANZAHL_CHECK'
-            condition_tuple = (final_cond_type_for_comparison, f"{vergleichsop}{wert}")
-        elif typ_original == "SEITIGKEIT":
-            final_cond_type_for_comparison = 'SEITIGKEIT_CHECK'
-            # Normalisiere den Regelwert für den Vergleich (z.B. 'B' -> 'beidseits')
-            norm_regel_wert = wert.strip().replace("'", "").lower()
-            if norm_regel_wert == 'b': norm_regel_wert = 'beidseits'
-            elif norm_regel_wert == 'e': norm_regel_wert = 'einseitig' # Vereinfachung für Vergleich
-            condition_tuple = (final_cond_type_for_comparison, f"{vergleichsop}{norm_regel_wert}")
-        elif typ_original == "GESCHLECHT IN LISTE": # Bereits oben durch PATIENT_GESCHLECHT abgedeckt, wenn Feld gesetzt ist
-            final_cond_type_for_comparison = 'GESCHLECHT_LIST_CHECK'
-            condition_tuple = (final_cond_type_for_comparison, tuple(sorted([g.strip().lower() for g in wert.split(',') if g.strip()])))
-        else:
-            # Fallback für unbekannte oder nicht spezifisch behandelte Typen
-            # print(f"  WARNUNG: get_simplified_conditions: Unbehandelter Typ '{typ_original}' für Pauschale {pauschale_code}. Verwende Originaltyp und Wert.")
-            condition_tuple = (typ_original, wert) # Als Fallback
-            
+
+def build_simplified_signatures(
+    pauschale_bedingungen_data: PauschaleBedingungen,
+    pauschale_codes: Any = (),
+) -> Dict[str, frozenset]:
+    """Vereinfachte Signaturen aller Pauschalen, einmal beim Laden berechnet.
+
+    Entspricht ``frozenset(get_simplified_conditions(code, ...))`` für jede
+    Pauschale; ``pauschale_codes`` ohne Bedingungen erhalten eine leere Signatur.
+    """
+    rows: Dict[str, set] = {code: set() for code in pauschale_codes}
+    for cond in _iter_all_conditions(pauschale_bedingungen_data):
+        code = cond.get("Pauschale")
+        if not code:
+            continue
+        condition_tuple = _simplify_condition(cond)
+        entry = rows.setdefault(code, set())
         if condition_tuple:
-            simplified_set.add(condition_tuple)
-        # else:
-            # print(f"  WARNUNG: get_simplified_conditions konnte für Pauschale {pauschale_code} Typ '{typ_original}' mit Wert '{wert}' kein Tupel erzeugen.")
-            
-    return simplified_set
+            entry.add(condition_tuple)
+    return {code: frozenset(entry) for code, entry in rows.items()}
+
+
+def get_pauschale_stamm(pauschale_code: str) -> str | None:
+    """Stamm einer Pauschale, z.B. ``C04.51`` für ``C04.51B`` (None ohne Suffix-Buchstaben)."""
+    match_stamm = re.match(r"([A-Z0-9.]+)([A-Z])$", str(pauschale_code))
+    return match_stamm.group(1) if match_stamm else None
+
+
+def _signature_diff(selected: frozenset, other: frozenset) -> Tuple[Tuple[Any, ...], Tuple[Any, ...]]:
+    """(zusätzliche Bedingungen von ``other``, bei ``other`` fehlende Bedingungen), sortiert."""
+    return tuple(sorted(other - selected)), tuple(sorted(selected - other))
+
+
+def build_stem_diffs(
+    signatures: Dict[str, frozenset],
+) -> Dict[Tuple[str, str], Tuple[Tuple[Any, ...], Tuple[Any, ...]]]:
+    """Vorberechnete Unterschiede zwischen Pauschalen mit gleichem Stamm.
+
+    Schlüssel ist ``(ausgewählte, andere)``, der Wert das Ergebnis von
+    :func:`_signature_diff`. Genutzt für den Gruppenvergleich in
+    :func:`determine_applicable_pauschale`.
+    """
+    codes_by_stamm: Dict[str, List[str]] = {}
+    for code in signatures:
+        stamm = get_pauschale_stamm(code)
+        if stamm:
+            codes_by_stamm.setdefault(stamm, []).append(code)
+    diffs: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], Tuple[Any, ...]]] = {}
+    for codes in codes_by_stamm.values():
+        for selected in codes:
+            for other in codes:
+                if selected == other:
+                    continue
+                try:
+                    diffs[(selected, other)] = _signature_diff(signatures[selected], signatures[other])
+                except TypeError:  # nicht vergleichbare Tupel: zur Laufzeit berechnen
+                    continue
+    return diffs
+
+
+def _collect_potential_icds(conditions: List[Dict], tabellen_dict_by_table: Dict, lang: str) -> Tuple[Dict, ...]:
+    """ICDs aller ``HAUPTDIAGNOSE IN TABELLE``-Bedingungen, eindeutig und nach Code sortiert."""
+    unique_icds: Dict[str, Dict] = {}
+    for cond in conditions:
+        if str(cond.get("Bedingungstyp", "")).upper() != "HAUPTDIAGNOSE IN TABELLE":
+            continue
+        tabelle_ref = cond.get("Werte")
+        if not tabelle_ref:
+            continue
+        for entry in get_table_content(tabelle_ref, "icd", tabellen_dict_by_table, lang):
+            if entry.get("Code"):
+                unique_icds[entry["Code"]] = entry
+    return tuple(sorted(unique_icds.values(), key=lambda x: x["Code"]))
+
+
+def build_potential_icds_index(
+    pauschale_bedingungen_data: PauschaleBedingungen,
+    tabellen_dict_by_table: Dict,
+    langs: Tuple[str, ...] = ICD_INDEX_LANGS,
+) -> Dict[Tuple[str, str], Tuple[Dict, ...]]:
+    """Sortierte ICD-Listen pro ``(Pauschale, Sprache)``, einmal beim Laden berechnet.
+
+    Pauschalen mit denselben ICD-Tabellen teilen sich dasselbe Tupel; die
+    Einträge sind die unveränderlichen Objekte aus :func:`get_table_content`.
+    """
+    conditions_by_code: Dict[str, List[Dict]] = {}
+    for cond in _iter_all_conditions(pauschale_bedingungen_data):
+        code = cond.get("Pauschale")
+        if code:
+            conditions_by_code.setdefault(code, []).append(cond)
+    shared: Dict[Tuple[Tuple[str, ...], str], Tuple[Dict, ...]] = {}
+    index: Dict[Tuple[str, str], Tuple[Dict, ...]] = {}
+    for code, conditions in conditions_by_code.items():
+        icd_conditions = [
+            cond for cond in conditions
+            if str(cond.get("Bedingungstyp", "")).upper() == "HAUPTDIAGNOSE IN TABELLE" and cond.get("Werte")
+        ]
+        table_refs = tuple(str(cond.get("Werte")) for cond in icd_conditions)
+        for lang in langs:
+            shared_key = (table_refs, lang)
+            if shared_key not in shared:
+                shared[shared_key] = _collect_potential_icds(icd_conditions, tabellen_dict_by_table, lang)
+            index[(code, lang)] = shared[shared_key]
+    return index
+
+
+def clear_fragment_cache() -> None:
+    """Leert den Cache von :func:`generate_condition_detail_html` (z.B. nach einem Daten-Reload)."""
+    with _fragment_cache_lock:
+        _fragment_cache.clear()
 
 
 def generate_condition_detail_html(
@@ -1813,7 +2593,37 @@ def generate_condition_detail_html(
     """
     Generiert HTML für eine einzelne vereinfachte Bedingung (aus get_simplified_conditions)
     im Vergleichsabschnitt der Pauschalenerklärung.
+
+    Das Fragment hängt nur von ``(condition_tuple, lang)`` und den Stammdaten ab
+    und wird in einem LRU-Cache (``FRAGMENT_CACHE_MAX_ENTRIES``) gehalten.
     """
+    try:
+        key: Any = (condition_tuple, lang, id(leistungskatalog_dict), id(tabellen_dict_by_table))
+        hash(key)
+    except TypeError:
+        return _build_condition_detail_html(condition_tuple, leistungskatalog_dict, tabellen_dict_by_table, lang)[0]
+    with _fragment_cache_lock:
+        cached = _fragment_cache.get(key)
+        if cached is not None and cached[0] is leistungskatalog_dict and cached[1] is tabellen_dict_by_table:
+            _fragment_cache.move_to_end(key)
+            return cached[2]
+    condition_html, failed = _build_condition_detail_html(condition_tuple, leistungskatalog_dict, tabellen_dict_by_table, lang)
+    if not failed:
+        with _fragment_cache_lock:
+            _fragment_cache[key] = (leistungskatalog_dict, tabellen_dict_by_table, condition_html)
+            if len(_fragment_cache) > FRAGMENT_CACHE_MAX_ENTRIES:
+                _fragment_cache.popitem(last=False)
+    return condition_html
+
+
+def _build_condition_detail_html(
+    condition_tuple: tuple,
+    leistungskatalog_dict: Dict,
+    tabellen_dict_by_table: Dict,
+    lang: str,
+) -> Tuple[str, bool]:
+    """Erzeugt das ``<li>``-Fragment; zweiter Wert ist True, falls ein Fehler auftrat."""
+    failed = False
     cond_type_comp, cond_value_comp = condition_tuple # cond_value_comp kann String oder Tuple sein
     condition_html = "<li>"
 
@@ -1929,6 +2739,7 @@ def generate_condition_detail_html(
         )
         traceback.print_exc()
         condition_html += f"<i>Fehler bei Detailgenerierung: {html.escape(str(e_detail_gen))}</i>"
+        failed = True
     
     condition_html += "</li>"
-    return condition_html
\ No newline at end of file
+    return condition_html, failed
\ No newline at end of file
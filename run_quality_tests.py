@@ -1,7 +1,8 @@
 import json
 import logging
+import sys
 from pathlib import Path
-from typing import List
+from typing import Dict, Tuple
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
@@ -14,8 +15,11 @@ from server import app
 BASELINE_PATH = Path(__file__).resolve().parent / "data" / "baseline_results.json"
 
 
-def run_tests() -> None:
-    """Run /api/test-example for all examples and print summary."""
+def run_tests() -> Dict[Tuple[str, str], bool]:
+    """Run /api/test-example for all examples and print summary.
+
+    Returns ``{(beispiel_id, sprache): bestanden}``.
+    """
     # Load baseline data directly from file
     with BASELINE_PATH.open("r", encoding="utf-8") as f:
         baseline_data = json.load(f)
@@ -27,9 +31,9 @@ def run_tests() -> None:
         logger.error(
             "Fehler: Server-Daten wurden nicht korrekt initialisiert. Tests können nicht ausgeführt werden."
         )
-        return
+        return {}
 
-    results: List[bool] = []
+    results: Dict[Tuple[str, str], bool] = {}
 
     with app.test_client() as client:
         for ex_id, entry in baseline_data.items():
@@ -46,7 +50,7 @@ def run_tests() -> None:
                         lang,
                         resp.status_code,
                     )
-                    results.append(False)
+                    results[(ex_id, lang)] = False
                     continue
 
                 data = resp.get_json() or {}
@@ -60,11 +64,40 @@ def run_tests() -> None:
                     status,
                     f" - {diff}" if diff else "",
                 )
-                results.append(passed)
+                results[(ex_id, lang)] = passed
 
     total = len(results)
-    passed_count = sum(1 for r in results if r)
+    passed_count = sum(1 for r in results.values() if r)
     logger.info("\n%s/%s Tests bestanden.", passed_count, total)
+    return results
+
+
+def compare_mapping_modes() -> None:
+    """Run the baseline examples with batched and single LKN mapping and compare."""
+    import server
+
+    original_mode = server.MAPPING_MODE
+    results_by_mode: Dict[str, Dict[Tuple[str, str], bool]] = {}
+    try:
+        for mode in ("single", "batch"):
+            server.MAPPING_MODE = mode
+            logger.info("\n=== Mapping-Modus: %s ===", mode)
+            results_by_mode[mode] = run_tests()
+    finally:
+        server.MAPPING_MODE = original_mode
+
+    single, batch = results_by_mode["single"], results_by_mode["batch"]
+    for mode, results in results_by_mode.items():
+        logger.info("Mapping-Modus %s: %s/%s bestanden.", mode, sum(results.values()), len(results))
+    for key in sorted(set(single) | set(batch)):
+        if single.get(key) != batch.get(key):
+            logger.info(
+                "Abweichung Beispiel %s [%s]: single=%s, batch=%s",
+                key[0],
+                key[1],
+                "PASS" if single.get(key) else "FAIL",
+                "PASS" if batch.get(key) else "FAIL",
+            )
 
 
 import pytest
@@ -84,5 +117,8 @@ def run_pytest_tests():
             logger.warning(f"Test file not found: {test_file}")
 
 if __name__ == "__main__":
-    run_tests()
-    run_pytest_tests()
+    if "--compare-mapping" in sys.argv[1:]:
+        compare_mapping_modes()
+    else:
+        run_tests()
+        run_pytest_tests()
@@ -1,67 +1,392 @@
-from typing import Any, Dict, List, Set, Tuple
-from utils import expand_compound_words, extract_keywords
+import heapq
+import re
+from array import array
+from typing import Any, Dict, Iterator, List, Set, Tuple
+from utils import expand_compound_words, keywords_from_normalized_text
+
+try:
+    import numpy as np
+except ModuleNotFoundError:  # Optionales Backend, siehe CatalogTermMatrix
+    np = None
+
+# Textfelder eines LKN-Eintrags, die für Ranking und Dokumentfrequenz
+# zusammengeführt werden.
+CATALOG_TEXT_FIELDS = (
+    "Beschreibung",
+    "Beschreibung_f",
+    "Beschreibung_i",
+    "MedizinischeInterpretation",
+    "MedizinischeInterpretation_f",
+    "MedizinischeInterpretation_i",
+)
+
+_WORD_RE = re.compile(r"\w+")
+_NGRAM_SIZE = 3
+# Obergrenze für zwischengespeicherte Token-Postings (Teilstring-Auflösung)
+_TOKEN_CACHE_MAX = 4096
+
+
+def _combined_text(details: Dict[str, Any]) -> str:
+    texts = []
+    for base in CATALOG_TEXT_FIELDS:
+        val = details.get(base)
+        if val:
+            texts.append(str(val))
+    return " ".join(texts)
+
+
+def normalize_catalog_text(details: Dict[str, Any]) -> str:
+    """Return the lowercased, compound-expanded text of a catalog entry."""
+    return expand_compound_words(_combined_text(details)).lower()
+
+
+class NormalizedCatalogText:
+    """Speicher der normalisierten Katalogtexte (ein String pro LKN).
+
+    Standardmässig wird ein Dict ``LKN -> Text`` gehalten. Im kompakten Modus
+    werden alle Texte in einem zusammenhängenden Puffer mit Offsets abgelegt,
+    was bei grossen Katalogen die Zahl der Python-Objekte reduziert.
+    """
+
+    _SEPARATOR = "\n"
+
+    def __init__(self, compact: bool = False) -> None:
+        self.compact = compact
+        self._texts: Dict[str, str] = {}
+        self._positions: Dict[str, int] = {}
+        self._codes: List[str] = []
+        self._offsets = array("q", [0])
+        self._parts: List[str] = []
+        self._buffer = ""
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, lkn_code: object) -> bool:
+        return lkn_code in self._positions
+
+    def add(self, lkn_code: str, normalized_text: str) -> None:
+        if lkn_code in self._positions:
+            raise ValueError(f"LKN {lkn_code} bereits im Textspeicher")
+        self._positions[lkn_code] = len(self._codes)
+        self._codes.append(lkn_code)
+        if self.compact:
+            self._parts.append(normalized_text)
+            self._offsets.append(self._offsets[-1] + len(normalized_text) + len(self._SEPARATOR))
+        else:
+            self._texts[lkn_code] = normalized_text
+
+    def finalize(self) -> None:
+        """Fügt im kompakten Modus die gesammelten Texte zum Puffer zusammen."""
+        if self.compact and self._parts:
+            self._buffer += "".join(p + self._SEPARATOR for p in self._parts)
+            self._parts = []
+
+    def get(self, lkn_code: str) -> str | None:
+        if not self.compact:
+            return self._texts.get(lkn_code)
+        pos = self._positions.get(lkn_code)
+        if pos is None:
+            return None
+        self.finalize()
+        start = self._offsets[pos]
+        end = self._offsets[pos + 1] - len(self._SEPARATOR)
+        return self._buffer[start:end]
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """Yield ``(LKN, Text)`` in Katalogreihenfolge."""
+        for lkn_code in self._codes:
+            text = self.get(lkn_code)
+            yield lkn_code, text if text is not None else ""
+
+
+def build_normalized_catalog_text(
+    leistungskatalog_dict: Dict[str, Dict[str, Any]],
+    compact: bool = False,
+) -> NormalizedCatalogText:
+    """Normalize every catalog entry once (see :func:`normalize_catalog_text`)."""
+    store = NormalizedCatalogText(compact=compact)
+    for lkn_code, details in leistungskatalog_dict.items():
+        store.add(lkn_code, normalize_catalog_text(details))
+    store.finalize()
+    return store
+
+
+def _normalized_items(
+    leistungskatalog_dict: Dict[str, Dict[str, Any]],
+    normalized_text: NormalizedCatalogText | None,
+) -> Iterator[Tuple[str, str]]:
+    if normalized_text is not None and len(normalized_text) == len(leistungskatalog_dict):
+        return normalized_text.items()
+    return ((code, normalize_catalog_text(details)) for code, details in leistungskatalog_dict.items())
+
+
+def _ngrams(word: str) -> Set[str]:
+    return {word[i:i + _NGRAM_SIZE] for i in range(len(word) - _NGRAM_SIZE + 1)}
+
+
+class CatalogTokenIndex:
+    """Invertierter Index über die normalisierten Katalogtexte.
+
+    Für jedes Wort des (kleingeschriebenen, um Komposita erweiterten)
+    Katalogtextes wird festgehalten, wie oft es in welcher LKN vorkommt.
+    Das Ranking zählt Suchtokens wie bisher als Teilstring
+    (``combined.count(token)``). Da ein Token nur aus Wortzeichen besteht,
+    liegt jedes Vorkommen innerhalb eines Wortes; die Trefferzahl ergibt sich
+    daher aus den Postings aller Wörter, die das Token enthalten. Diese Wörter
+    werden über einen Trigramm-Index des Vokabulars gefunden.
+    """
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.positions: Dict[str, int] = {}
+        self.ngram_index: Dict[str, Set[str]] = {}
+        self._token_cache: Dict[str, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def add_document(self, lkn_code: str, normalized_text: str) -> None:
+        self.positions[lkn_code] = len(self.positions)
+        counts: Dict[str, int] = {}
+        for word in _WORD_RE.findall(normalized_text):
+            counts[word] = counts.get(word, 0) + 1
+        for word, cnt in counts.items():
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = {}
+                for gram in _ngrams(word):
+                    self.ngram_index.setdefault(gram, set()).add(word)
+            posting[lkn_code] = cnt
+
+    def _words_containing(self, token: str) -> List[str]:
+        if len(token) < _NGRAM_SIZE:
+            return [w for w in self.postings if token in w]
+        candidate_sets = []
+        for gram in _ngrams(token):
+            words = self.ngram_index.get(gram)
+            if not words:
+                return []
+            candidate_sets.append(words)
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for other in candidate_sets[1:]:
+            candidates &= other
+            if not candidates:
+                return []
+        return [w for w in candidates if token in w]
+
+    def occurrences(self, token: str) -> Dict[str, int]:
+        """Return ``{lkn: Anzahl Vorkommen}`` für ``token`` (Teilstring-Zählung)."""
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            return cached
+        result: Dict[str, int] = {}
+        for word in self._words_containing(token):
+            per_word = word.count(token)
+            for lkn_code, cnt in self.postings[word].items():
+                result[lkn_code] = result.get(lkn_code, 0) + per_word * cnt
+        if len(self._token_cache) >= _TOKEN_CACHE_MAX:
+            self._token_cache.clear()
+        self._token_cache[token] = result
+        return result
+
+
+def build_token_index(
+    leistungskatalog_dict: Dict[str, Dict[str, Any]],
+    normalized_text: NormalizedCatalogText | None = None,
+) -> CatalogTokenIndex:
+    """Build the inverted token index for :func:`rank_leistungskatalog_entries`."""
+    index = CatalogTokenIndex()
+    for lkn_code, text in _normalized_items(leistungskatalog_dict, normalized_text):
+        index.add_document(lkn_code, text)
+    return index
+
+
+class CatalogTermMatrix:
+    """Dünnbesetzte Term-Frequenz-Matrix (Wort × LKN) für das NumPy-Backend.
+
+    Die Matrix ist spaltenweise pro Vokabularwort abgelegt (CSC-ähnlich:
+    ``word_ptr`` / ``lkn_idx`` / ``counts``). Für eine Anfrage werden die
+    Spalten aller Wörter, die ein Token enthalten, mit ``np.bincount`` zu
+    einem Vorkommensvektor über alle LKNs summiert und mit der IDF des Tokens
+    gewichtet; die Top-``limit`` werden per ``argpartition`` bestimmt.
+    Die Summation erfolgt in derselben Reihenfolge wie beim Python-Scan, die
+    Scores sind daher identisch.
+    """
+
+    def __init__(self, token_index: CatalogTokenIndex) -> None:
+        if np is None:
+            raise RuntimeError("NumPy ist nicht installiert")
+        self.token_index = token_index
+        self.codes: List[str] = sorted(token_index.positions, key=token_index.positions.__getitem__)
+        self.word_columns: Dict[str, int] = {}
+        ptr = [0]
+        lkn_idx: List[int] = []
+        counts: List[int] = []
+        positions = token_index.positions
+        for col, (word, posting) in enumerate(token_index.postings.items()):
+            self.word_columns[word] = col
+            for lkn_code, cnt in posting.items():
+                lkn_idx.append(positions[lkn_code])
+                counts.append(cnt)
+            ptr.append(len(lkn_idx))
+        self.word_ptr = np.asarray(ptr, dtype=np.int64)
+        self.lkn_idx = np.asarray(lkn_idx, dtype=np.int32)
+        self.counts = np.asarray(counts, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def occurrence_vector(self, token: str) -> Any:
+        words = self.token_index._words_containing(token)
+        if not words:
+            return None
+        idx_parts = []
+        val_parts = []
+        for word in words:
+            col = self.word_columns[word]
+            start, end = self.word_ptr[col], self.word_ptr[col + 1]
+            idx_parts.append(self.lkn_idx[start:end])
+            val_parts.append(self.counts[start:end] * word.count(token))
+        return np.bincount(
+            np.concatenate(idx_parts),
+            weights=np.concatenate(val_parts),
+            minlength=len(self.codes),
+        )
+
+    def score(
+        self,
+        tokens: Set[str],
+        token_doc_freq: Dict[str, int],
+        limit: int,
+    ) -> List[Tuple[float, str]]:
+        n = len(self.codes)
+        scores = np.zeros(n, dtype=np.float64)
+        for t in tokens:
+            occ = self.occurrence_vector(t.lower())
+            if occ is None:
+                continue
+            df = token_doc_freq.get(t, n)
+            if not df:
+                continue
+            scores += occ * (1.0 / df)
+        candidates = np.flatnonzero(scores > 0)
+        if limit <= 0:
+            return []
+        if limit < len(candidates):
+            # Schwelle des k-ten Scores bestimmen und alle Gleichstände
+            # mitnehmen, damit die Katalogreihenfolge als Tie-Break gilt.
+            kth = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+            candidates = candidates[scores[candidates] >= kth]
+        order = np.lexsort((candidates, -scores[candidates]))
+        selected = candidates[order][:limit]
+        return [(float(scores[i]), self.codes[i]) for i in selected]
+
+
+def build_term_matrix(token_index: CatalogTokenIndex) -> CatalogTermMatrix | None:
+    """Return a :class:`CatalogTermMatrix` or ``None`` if NumPy is unavailable."""
+    if np is None:
+        return None
+    return CatalogTermMatrix(token_index)
+
 
 def compute_token_doc_freq(
     leistungskatalog_dict: Dict[str, Dict[str, Any]],
     token_doc_freq: Dict[str, int],
+    normalized_text: NormalizedCatalogText | None = None,
 ) -> None:
     """Compute document frequency for tokens across the Leistungskatalog."""
     token_doc_freq.clear()
-    for details in leistungskatalog_dict.values():
-        texts = []
-        for base in [
-            "Beschreibung",
-            "Beschreibung_f",
-            "Beschreibung_i",
-            "MedizinischeInterpretation",
-            "MedizinischeInterpretation_f",
-            "MedizinischeInterpretation_i",
-        ]:
-            val = details.get(base)
-            if val:
-                texts.append(str(val))
-        combined = " ".join(texts)
-        tokens = extract_keywords(combined)
+    for _, text in _normalized_items(leistungskatalog_dict, normalized_text):
+        tokens = keywords_from_normalized_text(text)
         for t in tokens:
             token_doc_freq[t] = token_doc_freq.get(t, 0) + 1
 
-def rank_leistungskatalog_entries(
+
+def _score_with_index(
     tokens: Set[str],
-    leistungskatalog_dict: Dict[str, Dict[str, Any]],
+    token_index: CatalogTokenIndex,
     token_doc_freq: Dict[str, int],
-    limit: int = 200,
-    return_scores: bool = False,
-) -> List[str] | List[Tuple[float, str]]:
-    """Return LKN codes ranked by weighted token occurrences.
+    catalog_size: int,
+) -> Iterator[Tuple[float, int, str]]:
+    scores: Dict[str, float] = {}
+    for t in tokens:
+        postings = token_index.occurrences(t.lower())
+        if not postings:
+            continue
+        df = token_doc_freq.get(t, catalog_size)
+        if not df:
+            continue
+        for lkn_code, occ in postings.items():
+            scores[lkn_code] = scores.get(lkn_code, 0.0) + occ * (1.0 / df)
+    positions = token_index.positions
+    return ((score, positions[code], code) for code, score in scores.items() if score > 0)
 
-    If ``return_scores`` is ``True`` the result is a list of ``(score, code)``
-    tuples, otherwise just the codes are returned.
-    """
-    scored: List[Tuple[float, str]] = []
-    for lkn_code, details in leistungskatalog_dict.items():
-        texts = []
-        for base in [
-            "Beschreibung",
-            "Beschreibung_f",
-            "Beschreibung_i",
-            "MedizinischeInterpretation",
-            "MedizinischeInterpretation_f",
-            "MedizinischeInterpretation_i",
-        ]:
-            val = details.get(base)
-            if val:
-                texts.append(str(val))
-        combined = expand_compound_words(" ".join(texts)).lower()
+
+def _score_full_scan(
+    tokens: Set[str],
+    leistungskatalog_dict: Dict[str, Dict[str, Any]],
+    token_doc_freq: Dict[str, int],
+    normalized_text: NormalizedCatalogText | None,
+) -> Iterator[Tuple[float, int, str]]:
+    catalog_size = len(leistungskatalog_dict)
+    for pos, (lkn_code, combined) in enumerate(_normalized_items(leistungskatalog_dict, normalized_text)):
         score = 0.0
         for t in tokens:
             occ = combined.count(t.lower())
             if occ:
-                df = token_doc_freq.get(t, len(leistungskatalog_dict))
+                df = token_doc_freq.get(t, catalog_size)
                 if df:
                     score += occ * (1.0 / df)
         if score > 0:
-            scored.append((score, lkn_code))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    if return_scores:
-        return scored[:limit]
-    return [code for _, code in scored[:limit]]
+            yield score, pos, lkn_code
+
+
+def _top_k(scored: Iterator[Tuple[float, int, str]], k: int) -> List[Tuple[float, str]]:
+    """Select the ``k`` best entries with a bounded heap.
+
+    Ordering: Score absteigend, bei Gleichstand Katalogreihenfolge – identisch
+    zur bisherigen stabilen Sortierung der vollständigen Liste.
+    """
+    best = heapq.nsmallest(k, scored, key=lambda x: (-x[0], x[1]))
+    return [(score, code) for score, _, code in best]
+
+
+def rank_leistungskatalog_entries(
+    tokens: Set[str],
+    leistungskatalog_dict: Dict[str, Dict[str, Any]],
+    token_doc_freq: Dict[str, int],
+    limit: int = 200,
+    return_scores: bool = False,
+    token_index: CatalogTokenIndex | None = None,
+    normalized_text: NormalizedCatalogText | None = None,
+    term_matrix: CatalogTermMatrix | None = None,
+    ratio_k: int | None = None,
+) -> List[str] | List[Tuple[float, str]] | Tuple[List[Any], List[Tuple[float, str]]]:
+    """Return LKN codes ranked by weighted token occurrences.
+
+    If ``return_scores`` is ``True`` the result is a list of ``(score, code)``
+    tuples, otherwise just the codes are returned. With a ``token_index`` (see
+    :func:`build_token_index`) only LKNs containing a query token are scored;
+    the result is identical to the full catalog scan. The scan itself reads
+    the precomputed ``normalized_text`` store when given. A ``term_matrix``
+    (see :func:`build_term_matrix`) selects the NumPy backend.
+
+    Only the best ``max(limit, ratio_k)`` entries are kept (bounded heap).
+    With ``ratio_k`` the function returns a tuple ``(ranking, head)`` where
+    ``head`` holds the top ``ratio_k`` ``(score, code)`` tuples, e.g. for the
+    score-ratio heuristic in ``analyze_billing``.
+    """
+    k = max(limit, ratio_k or 0)
+    word_tokens = all(_WORD_RE.fullmatch(t.lower()) for t in tokens)
+    if term_matrix is not None and word_tokens and len(term_matrix) == len(leistungskatalog_dict):
+        top = term_matrix.score(tokens, token_doc_freq, k)
+    elif token_index is not None and word_tokens and len(token_index) == len(leistungskatalog_dict):
+        top = _top_k(_score_with_index(tokens, token_index, token_doc_freq, len(leistungskatalog_dict)), k)
+    else:
+        top = _top_k(_score_full_scan(tokens, leistungskatalog_dict, token_doc_freq, normalized_text), k)
+    ranking: List[Any] = top[:limit] if return_scores else [code for _, code in top[:limit]]
+    if ratio_k is not None:
+        return ranking, top[:ratio_k]
+    return ranking
@@ -3,6 +3,7 @@ import os
 import re
 import json
 import time # für Zeitmessung
+import uuid
 import traceback # für detaillierte Fehlermeldungen
 from pathlib import Path
 from datetime import datetime, timezone
@@ -112,8 +113,15 @@ except ModuleNotFoundError:
     def load_dotenv(*a, **k) -> bool:
         return False
 import regelpruefer # Dein Modul
-from typing import Dict, List, Any, Set, Tuple, Callable, cast  # Tuple und Callable hinzugefügt
+import llm_client
+from typing import Dict, List, Any, Set, Tuple, Callable, Union, cast  # Tuple und Callable hinzugefügt
 from utils import (
+    build_code_table_index,
+    build_icd_text_indices,
+    build_lkn_pauschalen_index,
+    find_pauschalen_for_lkns,
+    clear_table_caches,
+    get_table_codes,
     get_table_content,
     translate_rule_error_message,
     expand_compound_words,
@@ -121,8 +129,23 @@ from utils import (
     extract_lkn_codes_from_text,
 )
 import html
-from prompts import get_stage1_prompt, get_stage2_mapping_prompt, get_stage2_ranking_prompt
-from selector import compute_token_doc_freq, rank_leistungskatalog_entries
+from prompts import (
+    get_stage1_prompt,
+    get_stage2_mapping_batch_prompt,
+    get_stage2_mapping_prompt,
+    get_stage2_ranking_prompt,
+)
+from data_snapshot import compute_code_fingerprint, compute_source_hash, load_snapshot, write_snapshot
+from selector import (
+    CatalogTokenIndex,
+    CatalogTermMatrix,
+    NormalizedCatalogText,
+    build_normalized_catalog_text,
+    build_term_matrix,
+    build_token_index,
+    compute_token_doc_freq,
+    rank_leistungskatalog_entries,
+)
 
 import logging
 import sys
@@ -172,35 +195,62 @@ PAUSCHALE_BED_PATH = DATA_DIR / "PAUSCHALEN_Bedingungen.json"
 TABELLEN_PATH = DATA_DIR / "PAUSCHALEN_Tabellen.json"
 BASELINE_RESULTS_PATH = DATA_DIR / "baseline_results.json"
 BEISPIELE_PATH = DATA_DIR / "beispiele.json"
+# Binärer Snapshot der Tarifdaten (siehe data_snapshot.py / compile_data_snapshot.py)
+DATA_SNAPSHOT_PATH = Path(os.getenv('DATA_SNAPSHOT_PATH', str(DATA_DIR / "tarifdaten.snapshot.pkl")))
+# Module, deren Klassen bzw. Ableitungslogik im Snapshot stecken (Code-Fingerabdruck).
+# server.py selbst baut den Grossteil des Payloads (load_data, write_data_snapshot).
+SNAPSHOT_CODE_FILES = [
+    Path(__file__).resolve().parent / name
+    for name in ("server.py", "selector.py", "utils.py", "data_snapshot.py")
+]
+DATA_SNAPSHOT_ENABLED = os.getenv('DATA_SNAPSHOT', '1').lower() not in ('0', 'false', 'no')
+# Nach einem JSON-Load automatisch einen frischen Snapshot schreiben
+DATA_SNAPSHOT_AUTOWRITE = os.getenv('DATA_SNAPSHOT_AUTOWRITE', '0').lower() in ('1', 'true', 'yes')
 
-# Retry configuration for Gemini API calls
+# Retry configuration for Gemini API calls (siehe llm_client.STAGE_POLICIES)
 # Bei HTTP 429 (Rate Limit) wird nach dem Exponential-Backoff-Schema erneut
 # versucht. Die Wartezeit berechnet sich als GEMINI_BACKOFF_SECONDS * (2**Versuch).
 GEMINI_MAX_RETRIES = 3
 GEMINI_BACKOFF_SECONDS = 1.0
 
+# Maximale Anzahl paralleler Stufe-2-Mapping-Aufrufe pro Request
+MAPPING_MAX_CONCURRENCY = max(1, int(os.getenv('MAPPING_MAX_CONCURRENCY', '4')))
+
+# Stufe-2-Mapping: "batch" = alle LKNs mit gleicher Kandidatenliste in einem
+# Aufruf (Einzel-Mapping als Fallback), "single" = ein Aufruf pro LKN.
+# Standard bleibt "single", bis run_quality_tests.py --compare-mapping für
+# "batch" keine Verschlechterung auf baseline_results.json zeigt.
+MAPPING_MODE = os.getenv('MAPPING_MODE', 'single').lower()
+
+# Normalisierte Katalogtexte als zusammenhängenden Puffer mit Offsets halten
+# (spart Objekte/Speicher, Zugriff minimal langsamer).
+CATALOG_TEXT_COMPACT = os.getenv('CATALOG_TEXT_COMPACT', '0').lower() in ('1', 'true', 'yes')
+# Scoring-Backend für das Katalog-Ranking: "python" (Token-Index) oder
+# "numpy" (dünnbesetzte Matrix, benötigt NumPy; sonst Fallback auf "python").
+RANKING_BACKEND = os.getenv('RANKING_BACKEND', 'python').lower()
+
 # --- Typ-Aliase für Klarheit ---
-EvaluateStructuredConditionsType = Callable[[str, Dict[Any, Any], List[Dict[Any, Any]], Dict[str, List[Dict[Any, Any]]]], bool]
+# Bedingungen als Index {Pauschale: [...]} (pauschale_bedingungen_indexed) oder flache Liste
+PauschaleBedingungenType = Union[Dict[str, List[Dict[Any, Any]]], List[Dict[Any, Any]]]
+EvaluateStructuredConditionsType = Callable[[str, Dict[Any, Any], PauschaleBedingungenType, Dict[str, List[Dict[Any, Any]]]], bool]
 CheckPauschaleConditionsType = Callable[
-    [str, Dict[Any, Any], List[Dict[Any, Any]], Dict[str, List[Dict[Any, Any]]]],
+    [str, Dict[Any, Any], PauschaleBedingungenType, Dict[str, List[Dict[Any, Any]]]],
     List[Dict[str, Any]]
 ]
-GetSimplifiedConditionsType = Callable[[str, List[Dict[Any, Any]]], Set[Any]]
+GetSimplifiedConditionsType = Callable[[str, PauschaleBedingungenType], Set[Any]]
 GenerateConditionDetailHtmlType = Callable[
     [Tuple[Any, ...], Dict[Any, Any], Dict[Any, Any], str],
     str,
 ]
-DetermineApplicablePauschaleType = Callable[
-    [str, List[Dict[str, Any]], Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, Any], Dict[str, Any], Dict[str, List[Dict[str, Any]]], Set[str], str],
-    Dict[str, Any]
-]
+# Positionsparameter wie unten; zusätzlich optionale Keyword-Argumente (z.B. condition_programs)
+DetermineApplicablePauschaleType = Callable[..., Dict[str, Any]]
 PrepareTardocAbrechnungType = Callable[[List[Dict[Any,Any]], Dict[str, Dict[Any,Any]], str], Dict[str,Any]]
 
 # --- Standard-Fallbacks für Funktionen aus regelpruefer_pauschale ---
 def default_evaluate_fallback( # Matches: evaluate_structured_conditions(pauschale_code: str, context: Dict, pauschale_bedingungen_data: List[Dict], tabellen_dict_by_table: Dict[str, List[Dict]]) -> bool
     pauschale_code: str,
     context: Dict[Any, Any],
-    pauschale_bedingungen_data: List[Dict[Any, Any]],
+    pauschale_bedingungen_data: PauschaleBedingungenType,
     tabellen_dict_by_table: Dict[str, List[Dict[Any, Any]]]
 ) -> bool:
     logger.warning("Fallback für 'evaluate_structured_conditions' aktiv.")
@@ -209,7 +259,7 @@ def default_evaluate_fallback( # Matches: evaluate_structured_conditions(pauscha
 def default_check_html_fallback(
     pauschale_code: str,
     context: Dict[Any, Any],
-    pauschale_bedingungen_data: List[Dict[Any, Any]],
+    pauschale_bedingungen_data: PauschaleBedingungenType,
     tabellen_dict_by_table: Dict[str, List[Dict[Any, Any]]]
 ) -> List[Dict[str, Any]]:
     logger.warning("Fallback für 'check_pauschale_conditions' aktiv.")
@@ -217,7 +267,7 @@ def default_check_html_fallback(
 
 def default_get_simplified_conditions_fallback( # Matches: get_simplified_conditions(pauschale_code: str, bedingungen_data: list[dict]) -> set
     pauschale_code: str,
-    bedingungen_data: List[Dict[Any, Any]]
+    bedingungen_data: PauschaleBedingungenType
 ) -> Set[Any]:
     logger.warning("Fallback für 'get_simplified_conditions' aktiv.")
     return set()
@@ -235,12 +285,13 @@ def default_determine_applicable_pauschale_fallback(
     user_input_param: str, rule_checked_leistungen_list_param: List[Dict[str, Any]],
     pauschale_haupt_pruef_kontext_param: Dict[str, Any],
     pauschale_lp_data_param: List[Dict[str, Any]],
-    pauschale_bedingungen_data_param: List[Dict[str, Any]],
+    pauschale_bedingungen_data_param: PauschaleBedingungenType,
     pauschalen_dict_param: Dict[str, Any],
     leistungskatalog_dict_param: Dict[str, Any],
     tabellen_dict_by_table_param: Dict[str, List[Dict[str, Any]]],
     potential_pauschale_codes_set_param: Set[str],
-    lang_param: str = 'de'
+    lang_param: str = 'de',
+    **kwargs: Any,
 ) -> Dict[str, Any]:
     logger.warning("Fallback für 'determine_applicable_pauschale' aktiv.")
     return {"type": "Error", "message": "Pauschalen-Hauptprüfung nicht verfügbar (Fallback)"}
@@ -273,6 +324,7 @@ except ImportError:
         return {"type":"Error", "message":"TARDOC Prep Fallback (LKN Modulimportfehler)"}
     prepare_tardoc_abrechnung_func = prepare_tardoc_lkn_import_fb
 
+rpp_module: Any = None
 try:
     # Für regelpruefer_pauschale.py
     logger.info("INFO: Versuche, regelpruefer_pauschale.py zu importieren...")
@@ -332,6 +384,8 @@ except Exception as e_gen: # Fängt auch andere Fehler während des Imports
 leistungskatalog_data: list[dict] = []
 leistungskatalog_dict: dict[str, dict] = {}
 regelwerk_dict: dict[str, list] = {} # Annahme: lade_regelwerk gibt List[RegelDict] pro LKN
+# Kompilierte Regelprüfungen pro LKN (regelpruefer.kompiliere_regelwerk, nicht im Snapshot)
+regelwerk_kompiliert: Dict[str, Any] = {}
 tardoc_tarif_dict: dict[str, dict] = {}
 tardoc_interp_dict: dict[str, dict] = {}
 pauschale_lp_data: list[dict] = []
@@ -342,17 +396,36 @@ tabellen_data: list[dict] = []
 tabellen_dict_by_table: dict[str, list[dict]] = {}
 # NEU: Indexierte und vorsortierte Pauschalenbedingungen
 pauschale_bedingungen_indexed: Dict[str, List[Dict[str, Any]]] = {}
+# Reverse-Index LKN -> Pauschalen (LP-Zuordnung, LKN-Listen, Tabellen-Bedingungen)
+lkn_pauschalen_index: Dict[str, Set[str]] = {}
+# Reverse-Index (Code, Tabelle_Typ) -> Tabellen, auch für regelpruefer_pauschale
+code_table_index: Dict[Tuple[str, str], Set[str]] = {}
+# Kompilierte Bedingungsprogramme pro Pauschale (nicht im Snapshot, da Closures)
+pauschale_programs: Dict[str, Any] = {}
+# Vereinfachte Bedingungssignaturen und Unterschiede innerhalb eines Stamms (Pauschalen-Vergleich)
+pauschale_signatures: Dict[str, frozenset] = {}
+pauschale_stem_diffs: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], Tuple[Any, ...]]] = {}
+# Sortierte potenzielle ICDs pro (Pauschale, Sprache)
+pauschale_potential_icds: Dict[Tuple[str, str], Tuple[Dict[str, Any], ...]] = {}
 daten_geladen: bool = False
 baseline_results: dict[str, dict] = {}
 examples_data: list[dict] = []
 token_doc_freq: dict[str, int] = {}
+# Invertierter Token-Index für das Ranking des Leistungskatalogs
+catalog_token_index: CatalogTokenIndex | None = None
+# Kleingeschriebene, um Komposita erweiterte Katalogtexte (einmal pro Load)
+catalog_normalized_text: NormalizedCatalogText | None = None
+# Term-Frequenz-Matrix für RANKING_BACKEND=numpy
+catalog_term_matrix: CatalogTermMatrix | None = None
 
 
 def create_app() -> FlaskType:
     """
     Erstellt die Flask-Instanz.  
-    Render (bzw. Gunicorn) ruft diese Factory einmal pro Worker auf
-    und bekommt das WSGI-Objekt zurück.
+    Render (bzw. Gunicorn) ruft diese Factory beim Import von ``server`` auf
+    und bekommt das WSGI-Objekt zurück. Mit ``preload_app`` (siehe
+    gunicorn.conf.py) geschieht das einmal im Master; die Worker erben die
+    geladenen Daten per fork.
     """
     app = FlaskType(__name__, static_folder='.', static_url_path='')
 
@@ -366,19 +439,210 @@ def create_app() -> FlaskType:
     # Ab hier bleiben alle @app.route-Dekorationen unverändert
     return app
 
+
+def _clear_data_containers() -> None:
+    """Leert alle globalen Tarifdaten-Container und abgeleiteten Indizes."""
+    global catalog_token_index, catalog_normalized_text, catalog_term_matrix
+    leistungskatalog_data.clear(); leistungskatalog_dict.clear(); regelwerk_dict.clear(); regelwerk_kompiliert.clear(); tardoc_tarif_dict.clear(); tardoc_interp_dict.clear()
+    pauschale_lp_data.clear(); pauschalen_data.clear(); pauschalen_dict.clear(); pauschale_bedingungen_data.clear(); pauschale_bedingungen_indexed.clear(); tabellen_data.clear()
+    tabellen_dict_by_table.clear(); lkn_pauschalen_index.clear(); code_table_index.clear()
+    pauschale_programs.clear(); pauschale_signatures.clear(); pauschale_stem_diffs.clear(); pauschale_potential_icds.clear()
+    clear_table_caches()
+    if rpp_module is not None and hasattr(rpp_module, "clear_fragment_cache"):
+        rpp_module.clear_fragment_cache()
+    token_doc_freq.clear()
+    catalog_token_index = None
+    catalog_normalized_text = None
+    catalog_term_matrix = None
+
+
+def _load_optional_data() -> None:
+    """Lädt Baseline-Resultate und Beispiele (nicht Teil des Snapshots)."""
+    global baseline_results, examples_data
+    try:
+        with open(BASELINE_RESULTS_PATH, 'r', encoding='utf-8') as f:
+            baseline_results = json.load(f)
+        logger.info("  ✓ Baseline-Ergebnisse geladen (%s Beispiele.)", len(baseline_results))
+    except Exception as e:
+        logger.warning("  WARNUNG: Baseline-Resultate konnten nicht geladen werden: %s", e)
+        baseline_results = {}
+    try:
+        with open(BEISPIELE_PATH, 'r', encoding='utf-8') as f:
+            examples_data = json.load(f)
+        logger.info("  ✓ Beispiel-Daten geladen (%s Einträge.)", len(examples_data))
+    except Exception as e:
+        logger.warning("  WARNUNG: Beispiel-Daten konnten nicht geladen werden: %s", e)
+        examples_data = []
+
+
+def _data_source_hash() -> str:
+    """Inhalts-Hash aller Quelldateien, die in den Snapshot einfliessen."""
+    sources = [
+        LEISTUNGSKATALOG_PATH, PAUSCHALE_LP_PATH, PAUSCHALEN_PATH, PAUSCHALE_BED_PATH,
+        TARDOC_TARIF_PATH, TARDOC_INTERP_PATH, TABELLEN_PATH,
+    ]
+    code_fingerprint = compute_code_fingerprint(SNAPSHOT_CODE_FILES)
+    return compute_source_hash(sources, extra=f"compact={CATALOG_TEXT_COMPACT}|code={code_fingerprint}")
+
+
+def _build_ranking_backend() -> None:
+    """Baut die optionale NumPy-Term-Matrix (nicht im Snapshot, da optional)."""
+    global catalog_term_matrix
+    catalog_term_matrix = None
+    if RANKING_BACKEND == 'numpy' and catalog_token_index is not None:
+        catalog_term_matrix = build_term_matrix(catalog_token_index)
+        if catalog_term_matrix is None:
+            logger.warning("  WARNUNG: RANKING_BACKEND=numpy, aber NumPy ist nicht installiert. Nutze Python-Backend.")
+        else:
+            logger.info("  ✓ Term-Matrix für NumPy-Ranking aufgebaut (%s Einträge).", len(catalog_term_matrix.lkn_idx))
+
+
+def _build_regelwerk_programs() -> None:
+    """Kompiliert das TARDOC-Regelwerk (nach JSON- und Snapshot-Load)."""
+    regelwerk_kompiliert.clear()
+    if rp_lkn_module is None or not hasattr(rp_lkn_module, 'kompiliere_regelwerk'):
+        return
+    compile_start = time.time()
+    regelwerk_kompiliert.update(rp_lkn_module.kompiliere_regelwerk(regelwerk_dict))
+    logger.info(
+        "  ✓ Regelwerk kompiliert (%s LKNs, %.3fs).",
+        len(regelwerk_kompiliert),
+        time.time() - compile_start,
+    )
+
+
+def _build_pauschale_programs() -> None:
+    """Kompiliert die Bedingungsprogramme aller Pauschalen (nach JSON- und Snapshot-Load).
+
+    Berechnet zusätzlich die vereinfachten Signaturen und Stamm-Unterschiede
+    für den Pauschalen-Vergleich sowie die ICD-Indizes (Beschreibungen und
+    potenzielle ICDs pro Pauschale und Sprache).
+    """
+    pauschale_programs.clear(); pauschale_signatures.clear(); pauschale_stem_diffs.clear(); pauschale_potential_icds.clear()
+    icd_start = time.time()
+    icd_index_count = build_icd_text_indices(tabellen_dict_by_table)
+    logger.info("  ✓ ICD-Beschreibungsindizes aufgebaut (%s Indizes, %.3fs).", icd_index_count, time.time() - icd_start)
+    if rpp_module is None or not hasattr(rpp_module, 'compile_pauschale_programs'):
+        return
+    compile_start = time.time()
+    pauschale_programs.update(
+        rpp_module.compile_pauschale_programs(
+            pauschale_bedingungen_data, tabellen_dict_by_table, pauschalen_dict.keys()
+        )
+    )
+    logger.info(
+        "  ✓ Bedingungsprogramme kompiliert (%s Pauschalen, %.3fs).",
+        len(pauschale_programs),
+        time.time() - compile_start,
+    )
+    pauschale_signatures.update(
+        rpp_module.build_simplified_signatures(pauschale_bedingungen_indexed, pauschalen_dict.keys())
+    )
+    pauschale_stem_diffs.update(rpp_module.build_stem_diffs(pauschale_signatures))
+    logger.info(
+        "  ✓ Bedingungssignaturen berechnet (%s Pauschalen, %s Stamm-Vergleiche).",
+        len(pauschale_signatures),
+        len(pauschale_stem_diffs),
+    )
+    pauschale_potential_icds.update(
+        rpp_module.build_potential_icds_index(pauschale_bedingungen_indexed, tabellen_dict_by_table)
+    )
+    logger.info("  ✓ Potenzielle ICDs pro Pauschale und Sprache vorberechnet (%s Einträge).", len(pauschale_potential_icds))
+
+
+def write_data_snapshot(source_hash: str | None = None) -> bool:
+    """Schreibt die aktuell geladenen Tarifdaten als Snapshot."""
+    if not daten_geladen:
+        logger.warning("  WARNUNG: Daten nicht vollständig geladen, kein Snapshot geschrieben.")
+        return False
+    payload = {
+        "leistungskatalog_data": leistungskatalog_data,
+        "leistungskatalog_dict": leistungskatalog_dict,
+        "regelwerk_dict": regelwerk_dict,
+        "tardoc_tarif_dict": tardoc_tarif_dict,
+        "tardoc_interp_dict": tardoc_interp_dict,
+        "pauschale_lp_data": pauschale_lp_data,
+        "pauschalen_data": pauschalen_data,
+        "pauschalen_dict": pauschalen_dict,
+        "pauschale_bedingungen_data": pauschale_bedingungen_data,
+        "pauschale_bedingungen_indexed": pauschale_bedingungen_indexed,
+        "tabellen_data": tabellen_data,
+        "tabellen_dict_by_table": tabellen_dict_by_table,
+        "lkn_pauschalen_index": lkn_pauschalen_index,
+        "code_table_index": code_table_index,
+        "token_doc_freq": token_doc_freq,
+        "catalog_normalized_text": catalog_normalized_text,
+        "catalog_token_index": catalog_token_index,
+    }
+    return write_snapshot(DATA_SNAPSHOT_PATH, source_hash or _data_source_hash(), payload)
+
+
+def _apply_data_snapshot(payload: Dict[str, Any]) -> bool:
+    """Übernimmt die Snapshot-Daten in die globalen Container."""
+    global catalog_normalized_text, catalog_token_index
+    containers: Dict[str, Any] = {
+        "leistungskatalog_data": leistungskatalog_data,
+        "leistungskatalog_dict": leistungskatalog_dict,
+        "regelwerk_dict": regelwerk_dict,
+        "tardoc_tarif_dict": tardoc_tarif_dict,
+        "tardoc_interp_dict": tardoc_interp_dict,
+        "pauschale_lp_data": pauschale_lp_data,
+        "pauschalen_data": pauschalen_data,
+        "pauschalen_dict": pauschalen_dict,
+        "pauschale_bedingungen_data": pauschale_bedingungen_data,
+        "pauschale_bedingungen_indexed": pauschale_bedingungen_indexed,
+        "tabellen_data": tabellen_data,
+        "tabellen_dict_by_table": tabellen_dict_by_table,
+        "lkn_pauschalen_index": lkn_pauschalen_index,
+        "code_table_index": code_table_index,
+        "token_doc_freq": token_doc_freq,
+    }
+    if any(key not in payload for key in containers) or payload.get("catalog_token_index") is None:
+        logger.warning("  WARNUNG: Daten-Snapshot unvollständig, lade aus JSON.")
+        return False
+    for key, target in containers.items():
+        if isinstance(target, list):
+            target.extend(payload[key])
+        else:
+            target.update(payload[key])
+    catalog_normalized_text = payload.get("catalog_normalized_text")
+    catalog_token_index = payload["catalog_token_index"]
+    return True
+
+
 # --- Daten laden Funktion ---
-def load_data() -> bool:
+def load_data(use_snapshot: bool | None = None) -> bool:
     global leistungskatalog_data, leistungskatalog_dict, regelwerk_dict, tardoc_tarif_dict, tardoc_interp_dict
     global pauschale_lp_data, pauschalen_data, pauschalen_dict, pauschale_bedingungen_data, pauschale_bedingungen_indexed, tabellen_data
-    global tabellen_dict_by_table, daten_geladen
+    global tabellen_dict_by_table, daten_geladen, catalog_token_index, catalog_normalized_text, lkn_pauschalen_index, code_table_index
+    global catalog_term_matrix
 
     all_loaded_successfully = True
     logger.info("--- Lade Daten ---")
     # Reset all data containers
-    leistungskatalog_data.clear(); leistungskatalog_dict.clear(); regelwerk_dict.clear(); tardoc_tarif_dict.clear(); tardoc_interp_dict.clear()
-    pauschale_lp_data.clear(); pauschalen_data.clear(); pauschalen_dict.clear(); pauschale_bedingungen_data.clear(); pauschale_bedingungen_indexed.clear(); tabellen_data.clear()
-    tabellen_dict_by_table.clear()
-    token_doc_freq.clear()
+    _clear_data_containers()
+
+    if use_snapshot is None:
+        use_snapshot = DATA_SNAPSHOT_ENABLED
+    source_hash = _data_source_hash() if use_snapshot else None
+    if use_snapshot and source_hash:
+        snapshot_start = time.time()
+        payload = load_snapshot(DATA_SNAPSHOT_PATH, source_hash)
+        if payload is not None and _apply_data_snapshot(payload):
+            logger.info(
+                "  ✓ Tarifdaten aus Snapshot %s geladen (%.3fs).",
+                DATA_SNAPSHOT_PATH,
+                time.time() - snapshot_start,
+            )
+            _load_optional_data()
+            _build_ranking_backend()
+            _build_regelwerk_programs()
+            _build_pauschale_programs()
+            logger.info("--- Daten laden abgeschlossen ---")
+            daten_geladen = True
+            return True
+        # Teilweise übernommene Daten verwerfen und regulär aus JSON laden
+        _clear_data_containers()
 
     files_to_load = {
         "Leistungskatalog": (LEISTUNGSKATALOG_PATH, leistungskatalog_data, 'LKN', leistungskatalog_dict),
@@ -454,23 +718,7 @@ def load_data() -> bool:
              all_loaded_successfully = False
              traceback.print_exc()
 
-    # Zusätzliche optionale Dateien laden
-    try:
-        global baseline_results
-        with open(BASELINE_RESULTS_PATH, 'r', encoding='utf-8') as f:
-            baseline_results = json.load(f)
-        logger.info("  ✓ Baseline-Ergebnisse geladen (%s Beispiele.)", len(baseline_results))
-    except Exception as e:
-        logger.warning("  WARNUNG: Baseline-Resultate konnten nicht geladen werden: %s", e)
-        baseline_results = {}
-    try:
-        global examples_data
-        with open(BEISPIELE_PATH, 'r', encoding='utf-8') as f:
-            examples_data = json.load(f)
-        logger.info("  ✓ Beispiel-Daten geladen (%s Einträge.)", len(examples_data))
-    except Exception as e:
-        logger.warning("  WARNUNG: Beispiel-Daten konnten nicht geladen werden: %s", e)
-        examples_data = []
+    _load_optional_data()
 
     # Regelwerk direkt aus TARDOC_Tarifpositionen extrahieren
     try:
@@ -485,8 +733,19 @@ def load_data() -> bool:
         traceback.print_exc(); regelwerk_dict.clear(); all_loaded_successfully = False
 
     # Compute document frequencies for ranking
-    compute_token_doc_freq(leistungskatalog_dict, token_doc_freq)
+    catalog_normalized_text = build_normalized_catalog_text(
+        leistungskatalog_dict, compact=CATALOG_TEXT_COMPACT
+    )
+    logger.info(
+        "  ✓ Katalogtexte normalisiert (%s LKNs, kompakt=%s).",
+        len(catalog_normalized_text),
+        CATALOG_TEXT_COMPACT,
+    )
+    compute_token_doc_freq(leistungskatalog_dict, token_doc_freq, catalog_normalized_text)
     logger.info("  ✓ Token-Dokumentfrequenzen berechnet (%s Tokens).", len(token_doc_freq))
+    catalog_token_index = build_token_index(leistungskatalog_dict, catalog_normalized_text)
+    logger.info("  ✓ Token-Index aufgebaut (%s Wörter).", len(catalog_token_index.postings))
+    _build_ranking_backend()
 
     # NEU: Indexiere und sortiere Pauschalbedingungen
     if pauschale_bedingungen_data and all_loaded_successfully:
@@ -529,6 +788,17 @@ def load_data() -> bool:
     elif not all_loaded_successfully:
         logger.warning("  WARNUNG: Überspringe Indizierung der Pauschalbedingungen aufgrund vorheriger Ladefehler.")
 
+    code_table_index.update(build_code_table_index(tabellen_dict_by_table))
+    logger.info("  ✓ Reverse-Index Code -> Tabellen aufgebaut (%s Einträge).", len(code_table_index))
+    lkn_pauschalen_index.update(
+        build_lkn_pauschalen_index(
+            pauschale_lp_data, pauschale_bedingungen_data, pauschalen_dict, tabellen_dict_by_table
+        )
+    )
+    logger.info("  ✓ Reverse-Index LKN -> Pauschalen aufgebaut (%s LKNs).", len(lkn_pauschalen_index))
+    _build_regelwerk_programs()
+    _build_pauschale_programs()
+
 
     logger.info("--- Daten laden abgeschlossen ---")
     if not all_loaded_successfully:
@@ -537,6 +807,8 @@ def load_data() -> bool:
     else:
         logger.info("INFO: Alle Daten erfolgreich geladen.")
         daten_geladen = True
+        if use_snapshot and DATA_SNAPSHOT_AUTOWRITE:
+            write_data_snapshot(source_hash)
     logger.info("DEBUG: load_data() beendet. leistungskatalog_dict leer? %s", not leistungskatalog_dict)
     return all_loaded_successfully
 
@@ -564,31 +836,10 @@ def call_gemini_stage1(user_input: str, katalog_context: str, lang: str = "de")
     logger.info("Sende Anfrage Stufe 1 an Gemini Model: %s...", GEMINI_MODEL)
     logger.debug(f"LLM_S1_REQUEST_PAYLOAD: {json.dumps(payload, ensure_ascii=False)}")
     try:
-        response = None
-        for attempt in range(GEMINI_MAX_RETRIES):
-            try:
-                response = requests.post(gemini_url, json=payload, timeout=90)
-                logger.info("Gemini Stufe 1 Antwort Status Code: %s", response.status_code)
-                if response.status_code == 429:
-                    raise requests.exceptions.HTTPError(response=response)
-                response.raise_for_status()
-                break
-            except requests.exceptions.RequestException as e:
-                if attempt < GEMINI_MAX_RETRIES - 1:
-                    wait_time = GEMINI_BACKOFF_SECONDS * (2 ** attempt)
-                    logger.warning(
-                        "Gemini Stufe 1 Netzwerkfehler: %s. Neuer Versuch in %s Sekunden.",
-                        e,
-                        wait_time,
-                    )
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.error("Netzwerkfehler bei Gemini Stufe 1 nach %s Versuchen: %s", GEMINI_MAX_RETRIES, e)
-                    raise ConnectionError(f"Netzwerkfehler bei Gemini Stufe 1: {e}") from e
-        if response is None:
-            raise ConnectionError("Keine Antwort von Gemini Stufe 1 erhalten")
-        gemini_data = response.json()
+        gemini_data = llm_client.generate_json(
+            "stage1", gemini_url, payload, GEMINI_MODEL, lang,
+            GEMINI_MAX_RETRIES, GEMINI_BACKOFF_SECONDS, cache_write=False,
+        )
         logger.debug(f"LLM_S1_RAW_GEMINI_RESPONSE: {json.dumps(gemini_data, ensure_ascii=False)}")
         logger.info(
             f"LLM_S1_RAW_GEMINI_DATA: {json.dumps(gemini_data, ensure_ascii=False)}"
@@ -832,6 +1083,8 @@ def call_gemini_stage1(user_input: str, katalog_context: str, lang: str = "de")
         logger.info(f"LLM_S1_INFO: LLM Stufe 1 Antwortstruktur und Basistypen validiert/normalisiert.")
         logger.info(f"LLM_S1_FINAL_VALIDATED_LEISTUNGEN: {json.dumps(validated_identified_leistungen, indent=2, ensure_ascii=False)}")
         logger.info(f"LLM Stage 1 response: {json.dumps(llm_response_json, ensure_ascii=False)}") # Beibehalten für Kompatibilität mit bestehenden Logs
+        # Erst nach erfolgreichem Parsen und Validieren cachen
+        llm_client.cache_response("stage1", payload, GEMINI_MODEL, lang, gemini_data)
         return llm_response_json
 
     except requests.exceptions.RequestException as req_err:
@@ -846,21 +1099,25 @@ def call_gemini_stage1(user_input: str, katalog_context: str, lang: str = "de")
         traceback.print_exc()
         raise e
 
-def call_gemini_stage2_mapping(tardoc_lkn: str, tardoc_desc: str, candidate_pauschal_lkns: Dict[str, str], lang: str = "de") -> str | None:
-    if not GEMINI_API_KEY: raise ValueError("GEMINI_API_KEY nicht konfiguriert.")
-    if not candidate_pauschal_lkns:
-        logger.warning("Keine Kandidaten-LKNs für Mapping von %s übergeben.", tardoc_lkn)
-        return None
-
+def _mapping_candidates_text(candidate_pauschal_lkns: Dict[str, str], label: str) -> str:
     candidates_text = "\n".join([f"- {lkn}: {desc}" for lkn, desc in candidate_pauschal_lkns.items()])
     if len(candidates_text) > 15000:  # Limit Kontextlänge (Anpassen nach Bedarf)
         logger.warning(
             "Kandidatenliste für %s zu lang (%s Zeichen), wird gekürzt.",
-            tardoc_lkn,
+            label,
             len(candidates_text),
         )
         candidates_text = candidates_text[:15000] + "\n..."  # Einfache Kürzung
+    return candidates_text
+
+
+def call_gemini_stage2_mapping(tardoc_lkn: str, tardoc_desc: str, candidate_pauschal_lkns: Dict[str, str], lang: str = "de") -> str | None:
+    if not GEMINI_API_KEY: raise ValueError("GEMINI_API_KEY nicht konfiguriert.")
+    if not candidate_pauschal_lkns:
+        logger.warning("Keine Kandidaten-LKNs für Mapping von %s übergeben.", tardoc_lkn)
+        return None
 
+    candidates_text = _mapping_candidates_text(candidate_pauschal_lkns, tardoc_lkn)
     prompt = get_stage2_mapping_prompt(tardoc_lkn, tardoc_desc, candidates_text, lang)
 
     gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
@@ -874,35 +1131,10 @@ def call_gemini_stage2_mapping(tardoc_lkn: str, tardoc_desc: str, candidate_paus
     }
     logger.info("Sende Anfrage Stufe 2 (Mapping) für %s an Gemini Model: %s...", tardoc_lkn, GEMINI_MODEL)
     try:
-        response = None
-        for attempt in range(GEMINI_MAX_RETRIES):
-            try:
-                response = requests.post(gemini_url, json=payload, timeout=60)
-                logger.info(
-                    "Gemini Stufe 2 (Mapping) Antwort Status Code: %s",
-                    response.status_code,
-                )
-                if response.status_code == 429:
-                    raise requests.exceptions.HTTPError(response=response)
-                response.raise_for_status()
-                break
-            except requests.exceptions.HTTPError as http_err:
-                if (
-                    http_err.response is not None
-                    and http_err.response.status_code == 429
-                    and attempt < GEMINI_MAX_RETRIES - 1
-                ):
-                    wait_time = GEMINI_BACKOFF_SECONDS * (2 ** attempt)
-                    logger.warning(
-                        "Gemini Stufe 2 (Mapping) Rate Limit erreicht. Neuer Versuch in %s Sekunden.",
-                        wait_time,
-                    )
-                    time.sleep(wait_time)
-                    continue
-                raise
-        if response is None:
-            return None
-        gemini_data = response.json()
+        gemini_data = llm_client.generate_json(
+            "stage2_mapping", gemini_url, payload, GEMINI_MODEL, lang,
+            GEMINI_MAX_RETRIES, GEMINI_BACKOFF_SECONDS, cache_write=False,
+        )
 
         raw_text_response_part = ""
         if gemini_data.get('candidates'):
@@ -919,6 +1151,7 @@ def call_gemini_stage2_mapping(tardoc_lkn: str, tardoc_desc: str, candidate_paus
             return None
         if raw_text_response_part.upper() == "NONE":
             logger.info("Kein passendes Mapping für %s gefunden (LLM sagte explizit NONE).", tardoc_lkn)
+            llm_client.cache_response("stage2_mapping", payload, GEMINI_MODEL, lang, gemini_data)
             return None
 
         extracted_codes_from_llm = []
@@ -952,6 +1185,7 @@ def call_gemini_stage2_mapping(tardoc_lkn: str, tardoc_desc: str, candidate_paus
         for code in extracted_codes_from_llm:
             if code in candidate_pauschal_lkns:
                 logger.info("Mapping erfolgreich (aus Liste): %s -> %s", tardoc_lkn, code)
+                llm_client.cache_response("stage2_mapping", payload, GEMINI_MODEL, lang, gemini_data)
                 return code
 
         if extracted_codes_from_llm: # Nur loggen, wenn LLM was zurückgab, das nicht passte
@@ -980,6 +1214,89 @@ def call_gemini_stage2_mapping(tardoc_lkn: str, tardoc_desc: str, candidate_paus
         traceback.print_exc()
         return None
 
+def call_gemini_stage2_mapping_batch(
+    tardoc_leistungen: List[Tuple[str, str]],
+    candidate_pauschal_lkns: Dict[str, str],
+    lang: str = "de",
+) -> Dict[str, str | None]:
+    """Mappt mehrere TARDOC-LKNs mit gemeinsamer Kandidatenliste in einem Aufruf.
+
+    Liefert ``{tardoc_lkn: gemappte_lkn oder None}`` für alle LKNs, zu denen
+    die Antwort eine Aussage enthält. Fehlende LKNs (oder eine unlesbare
+    Antwort) sind nicht im Ergebnis; der Aufrufer mappt sie einzeln.
+    """
+    if not GEMINI_API_KEY: raise ValueError("GEMINI_API_KEY nicht konfiguriert.")
+    if not tardoc_leistungen or not candidate_pauschal_lkns:
+        return {}
+
+    lkn_codes = [code for code, _ in tardoc_leistungen]
+    label = ",".join(lkn_codes)
+    leistungen_text = "\n".join(f"- {code}: {desc}" for code, desc in tardoc_leistungen)
+    candidates_text = _mapping_candidates_text(candidate_pauschal_lkns, label)
+    prompt = get_stage2_mapping_batch_prompt(leistungen_text, candidates_text, lang)
+
+    gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "response_mime_type": "application/json",
+            "temperature": 0.05,
+            "maxOutputTokens": min(4096, 256 + 128 * len(tardoc_leistungen)),
+        }
+    }
+    logger.info("Sende Anfrage Stufe 2 (Mapping, Batch) für %s an Gemini Model: %s...", label, GEMINI_MODEL)
+    try:
+        gemini_data = llm_client.generate_json(
+            "stage2_mapping", gemini_url, payload, GEMINI_MODEL, lang,
+            GEMINI_MAX_RETRIES, GEMINI_BACKOFF_SECONDS, cache_write=False,
+        )
+        raw_text_response_part = ""
+        candidate_list_map = gemini_data.get('candidates')
+        if candidate_list_map and isinstance(candidate_list_map, list):
+            parts_map = candidate_list_map[0].get('content', {}).get('parts', [{}])
+            if parts_map and isinstance(parts_map, list):
+                raw_text_response_part = parts_map[0].get('text', '').strip()
+        logger.info("DEBUG: Roher Text von LLM Stufe 2 (Mapping, Batch) für %s: '%s'", label, raw_text_response_part)
+
+        match_markdown = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', raw_text_response_part, re.IGNORECASE)
+        if match_markdown:
+            raw_text_response_part = match_markdown.group(1).strip()
+        parsed_data = json.loads(raw_text_response_part) if raw_text_response_part else {}
+        if not isinstance(parsed_data, dict):
+            raise ValueError("Batch-Mapping-Antwort ist kein JSON-Objekt")
+        llm_client.cache_response("stage2_mapping", payload, GEMINI_MODEL, lang, gemini_data)
+    except requests.exceptions.RequestException as req_err:
+        logger.error("Netzwerkfehler bei Gemini Stufe 2 (Mapping, Batch): %s", req_err)
+        return {}
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError) as e:
+        logger.error("Fehler beim Verarbeiten der Batch-Mapping-Antwort für %s: %s", label, e)
+        return {}
+
+    answers = {str(k).strip().upper(): v for k, v in parsed_data.items()}
+    results: Dict[str, str | None] = {}
+    for code in lkn_codes:
+        if code.upper() not in answers:
+            continue
+        value = answers[code.upper()]
+        if isinstance(value, str):
+            value = value.split(',')
+        if not isinstance(value, list):
+            continue
+        extracted = [str(c).strip().upper().replace('"', '') for c in value if str(c).strip()]
+        results[code] = next((c for c in extracted if c in candidate_pauschal_lkns), None)
+        if results[code]:
+            logger.info("Mapping erfolgreich (Batch): %s -> %s", code, results[code])
+        elif extracted:
+            logger.warning(
+                "Keiner der vom Mapping-LLM zurückgegebenen Codes (%s) war valide oder passte für %s.",
+                extracted,
+                code,
+            )
+    missing = [code for code in lkn_codes if code not in results]
+    if missing:
+        logger.warning("Batch-Mapping ohne Antwort für %s, Einzel-Mapping folgt.", missing)
+    return results
+
 # --- LLM Stufe 2: Pauschalen-Ranking ---
 def call_gemini_stage2_ranking(user_input: str, potential_pauschalen_text: str, lang: str = "de") -> list[str]:
     if not GEMINI_API_KEY:
@@ -991,35 +1308,10 @@ def call_gemini_stage2_ranking(user_input: str, potential_pauschalen_text: str,
     payload = {"contents": [{"parts": [{"text": prompt}]}], "generationConfig": {"temperature": 0.1, "maxOutputTokens": 500}}
     logger.info("Sende Anfrage Stufe 2 (Ranking) an Gemini Model: %s...", GEMINI_MODEL)
     try:
-        response = None
-        for attempt in range(GEMINI_MAX_RETRIES):
-            try:
-                response = requests.post(gemini_url, json=payload, timeout=45)
-                logger.info(
-                    "Gemini Stufe 2 (Ranking) Antwort Status Code: %s",
-                    response.status_code,
-                )
-                if response.status_code == 429:
-                    raise requests.exceptions.HTTPError(response=response)
-                response.raise_for_status()
-                break
-            except requests.exceptions.HTTPError as http_err:
-                if (
-                    http_err.response is not None
-                    and http_err.response.status_code == 429
-                    and attempt < GEMINI_MAX_RETRIES - 1
-                ):
-                    wait_time = GEMINI_BACKOFF_SECONDS * (2 ** attempt)
-                    logger.warning(
-                        "Gemini Stufe 2 (Ranking) Rate Limit erreicht. Neuer Versuch in %s Sekunden.",
-                        wait_time,
-                    )
-                    time.sleep(wait_time)
-                    continue
-                raise
-        if response is None:
-            return []
-        gemini_data = response.json()
+        gemini_data = llm_client.generate_json(
+            "stage2_ranking", gemini_url, payload, GEMINI_MODEL, lang,
+            GEMINI_MAX_RETRIES, GEMINI_BACKOFF_SECONDS, cache_write=False,
+        )
 
         ranked_text = ""
         if gemini_data.get('candidates'):
@@ -1048,6 +1340,8 @@ def call_gemini_stage2_ranking(user_input: str, potential_pauschalen_text: str,
             logger.warning("LLM Stufe 2 (Ranking) hat keine gültigen Codes aus '%s' zurückgegeben.", ranked_text)
         elif not ranked_text:
             logger.warning("LLM Stufe 2 (Ranking) hat leeren Text zurückgegeben.")
+        if ranked_codes:
+            llm_client.cache_response("stage2_ranking", payload, GEMINI_MODEL, lang, gemini_data)
         return ranked_codes
     except requests.exceptions.RequestException as req_err:
         logger.error("Netzwerkfehler bei Gemini Stufe 2 (Ranking): %s", req_err)
@@ -1070,18 +1364,28 @@ def call_gemini_stage2_ranking(user_input: str, potential_pauschalen_text: str,
 # prepare_tardoc_abrechnung wird jetzt über prepare_tardoc_abrechnung_func aufgerufen,
 # die entweder die echte Funktion aus regelpruefer.py oder einen Fallback enthält.
 
+def build_pruef_kontext(kontext: Dict[str, Any]) -> Any:
+    """Normalisiert den Pauschalen-Prüfkontext einmal pro Anfrage.
+
+    Liefert einen ``regelpruefer_pauschale.EvaluationContext`` oder, falls das
+    Modul nicht geladen ist, das unveränderte Dict.
+    """
+    if rpp_module is not None and hasattr(rpp_module, 'EvaluationContext'):
+        return rpp_module.EvaluationContext(kontext)
+    return kontext
+
 def get_relevant_p_pz_condition_lkns( # Beibehalten, falls spezifisch nur P/PZ benötigt wird
     potential_pauschale_codes: Set[str],
-    pauschale_bedingungen_data_list: List[Dict[str, Any]], # Umbenannt zur Klarheit
+    pauschale_bedingungen_by_code: Dict[str, List[Dict[str, Any]]], # pauschale_bedingungen_indexed
     tabellen_dict: Dict[str, List[Dict[str, Any]]], # Umbenannt zur Klarheit
     leistungskatalog: Dict[str, Dict[str, Any]] # Umbenannt zur Klarheit
 ) -> Dict[str, str]:
     relevant_lkn_codes: Set[str] = set()
-    BED_PAUSCHALE_KEY = 'Pauschale'; BED_TYP_KEY = 'Bedingungstyp'; BED_WERTE_KEY = 'Werte'
+    BED_TYP_KEY = 'Bedingungstyp'; BED_WERTE_KEY = 'Werte'
 
     relevant_conditions = [
-        cond for cond in pauschale_bedingungen_data_list # Verwende umbenannten Parameter
-        if cond.get(BED_PAUSCHALE_KEY) in potential_pauschale_codes
+        cond for code in potential_pauschale_codes
+        for cond in pauschale_bedingungen_by_code.get(code, [])
     ]
     for cond in relevant_conditions:
         typ = cond.get(BED_TYP_KEY, "").upper(); wert = cond.get(BED_WERTE_KEY, "")
@@ -1093,10 +1397,7 @@ def get_relevant_p_pz_condition_lkns( # Beibehalten, falls spezifisch nur P/PZ b
             table_names = [t.strip() for t in str(wert).split(',') if t.strip()] # str(wert) für Sicherheit
             for table_name in table_names:
                 # Nutze die globale Variable tabellen_dict_by_table oder den übergebenen Parameter
-                content = get_table_content(table_name, "service_catalog", tabellen_dict) # Verwende umbenannten Parameter
-                for item in content:
-                    code_val = item.get('Code')
-                    if code_val: relevant_lkn_codes.add(str(code_val).upper()) # str(code_val)
+                relevant_lkn_codes.update(get_table_codes(table_name, "service_catalog", tabellen_dict))
 
     valid_p_pz_candidates: Dict[str, str] = {}
     for lkn in relevant_lkn_codes:
@@ -1108,19 +1409,19 @@ def get_relevant_p_pz_condition_lkns( # Beibehalten, falls spezifisch nur P/PZ b
 
 def get_LKNs_from_pauschalen_conditions(
     potential_pauschale_codes: Set[str],
-    pauschale_bedingungen_data_list: List[Dict[str, Any]], # Umbenannt
+    pauschale_bedingungen_by_code: Dict[str, List[Dict[str, Any]]], # pauschale_bedingungen_indexed
     tabellen_dict: Dict[str, List[Dict[str, Any]]], # Umbenannt
     leistungskatalog: Dict[str, Dict[str, Any]] # Umbenannt
 ) -> Dict[str, str]:
     # print(f"--- DEBUG: Start get_LKNs_from_pauschalen_conditions für {potential_pauschale_codes} ---")
     condition_lkns_with_desc: Dict[str, str] = {}
     processed_lkn_codes: Set[str] = set()
-    BED_PAUSCHALE_KEY = 'Pauschale'; BED_TYP_KEY = 'Bedingungstyp'; BED_WERTE_KEY = 'Werte'
+    BED_TYP_KEY = 'Bedingungstyp'; BED_WERTE_KEY = 'Werte'
 
     relevant_conditions = [
-        cond for cond in pauschale_bedingungen_data_list # Verwende umbenannt
-        if cond.get(BED_PAUSCHALE_KEY) in potential_pauschale_codes and
-           cond.get(BED_TYP_KEY, "").upper() in [
+        cond for code in sorted(potential_pauschale_codes)
+        for cond in pauschale_bedingungen_by_code.get(code, [])
+        if cond.get(BED_TYP_KEY, "").upper() in [
                "LEISTUNGSPOSITIONEN IN LISTE", "LKN",
                "LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE"
            ]]
@@ -1179,9 +1480,7 @@ def search_pauschalen(keyword: str) -> List[Dict[str, Any]]:
         text_it = data.get("Pauschale_Text_i", "")
         if any(pattern.search(str(t) or "") for t in [text_de, text_fr, text_it]):
             lkns: Set[str] = set()
-            for cond in pauschale_bedingungen_data:
-                if cond.get("Pauschale") != code:
-                    continue
+            for cond in pauschale_bedingungen_indexed.get(code, []):
                 typ = str(cond.get("Bedingungstyp", "")).upper()
                 werte = cond.get("Werte", "")
                 if not werte:
@@ -1190,10 +1489,7 @@ def search_pauschalen(keyword: str) -> List[Dict[str, Any]]:
                     lkns.update(l.strip().upper() for l in str(werte).split(',') if l.strip())
                 elif typ in ["LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE"]:
                     for table_name in (t.strip() for t in str(werte).split(',') if t.strip()):
-                        for item in get_table_content(table_name, "service_catalog", tabellen_dict_by_table):
-                            code_item = item.get('Code')
-                            if code_item:
-                                lkns.add(str(code_item).upper())
+                        lkns.update(get_table_codes(table_name, "service_catalog", tabellen_dict_by_table))
             results.append({
                 "code": code,
                 "text": text_de,
@@ -1203,17 +1499,98 @@ def search_pauschalen(keyword: str) -> List[Dict[str, Any]]:
 
 
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Schützt Schreibzugriffe auf baseline_results (/api/test-example). Alle übrigen
+# globalen Datencontainer werden nach load_data() nur noch gelesen; der
+# Request-Zustand von analyze_billing liegt ausschliesslich in lokalen
+# Variablen, daher können Requests parallel (threaded/gthread) laufen.
+baseline_results_lock = threading.Lock()
+
+def _map_single_lkn(t_lkn_code: Any, t_lkn_desc: Any, candidates: Dict[str, str], lang: str) -> Tuple[str | None, Exception | None]:
+    try:
+        return call_gemini_stage2_mapping(str(t_lkn_code), str(t_lkn_desc), candidates, lang), None
+    except Exception as e_map_call:  # Auswertung (inkl. ConnectionError) beim Aufrufer
+        if not isinstance(e_map_call, ConnectionError):
+            traceback.print_exc()
+        return None, e_map_call
+
+
+def _run_batch_mappings(
+    mapping_tasks: List[Tuple[Any, Any, Dict[str, str]]],
+    runnable: List[int],
+    lang: str,
+    outcomes: List[Tuple[str | None, Exception | None] | None],
+) -> List[int]:
+    """Batch-Mapping je Kandidatenliste; gibt die Indizes ohne Batch-Ergebnis zurück."""
+    groups: Dict[int, List[int]] = {}
+    for idx in runnable:
+        groups.setdefault(id(mapping_tasks[idx][2]), []).append(idx)
+    remaining: List[int] = []
+    for indices in groups.values():
+        if len(indices) < 2:
+            remaining.extend(indices)
+            continue
+        candidates = mapping_tasks[indices[0]][2]
+        leistungen = [(str(mapping_tasks[i][0]), str(mapping_tasks[i][1])) for i in indices]
+        try:
+            batch_results = call_gemini_stage2_mapping_batch(leistungen, candidates, lang)
+        except Exception as e_batch:
+            logger.error("Fehler beim Batch-Mapping, Einzel-Mapping folgt: %s", e_batch)
+            batch_results = {}
+        for idx in indices:
+            code = str(mapping_tasks[idx][0])
+            if code in batch_results:
+                outcomes[idx] = (batch_results[code], None)
+            else:
+                remaining.append(idx)
+    return sorted(remaining)
+
+
+def run_stage2_mappings(
+    mapping_tasks: List[Tuple[Any, Any, Dict[str, str]]], lang: str
+) -> List[Tuple[str | None, Exception | None] | None]:
+    """Führt die Stufe-2-Mappings für ``(lkn, beschreibung, kandidaten)`` aus.
+
+    Bei ``MAPPING_MODE=batch`` werden alle Aufgaben mit derselben
+    Kandidatenliste (gleiches Dict-Objekt) in einem LLM-Aufruf gemappt. LKNs,
+    für die der Batch keine Antwort liefert, sowie der Modus ``single`` laufen
+    einzeln auf einem begrenzten Thread-Pool (``MAPPING_MAX_CONCURRENCY``).
+    Das Ergebnis hat dieselbe Reihenfolge wie ``mapping_tasks``:
+    ``(gemappte_lkn, fehler)`` pro Aufgabe oder ``None``, wenn das Mapping
+    mangels LKN, Beschreibung oder Kandidaten übersprungen wird.
+    """
+    outcomes: List[Tuple[str | None, Exception | None] | None] = [None] * len(mapping_tasks)
+    runnable = [
+        idx for idx, (code, desc, candidates) in enumerate(mapping_tasks)
+        if code and desc and candidates
+    ]
+    if MAPPING_MODE == "batch":
+        runnable = _run_batch_mappings(mapping_tasks, runnable, lang, outcomes)
+    workers = min(MAPPING_MAX_CONCURRENCY, len(runnable))
+    if workers <= 1:
+        for idx in runnable:
+            outcomes[idx] = _map_single_lkn(*mapping_tasks[idx], lang)
+            if isinstance(outcomes[idx][1], ConnectionError):
+                break  # wie bisher: nach Verbindungsfehler keine weiteren Aufrufe
+        return outcomes
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-mapping") as pool:
+        futures = {idx: pool.submit(_map_single_lkn, *mapping_tasks[idx], lang) for idx in runnable}
+        for idx in runnable:
+            outcomes[idx] = futures[idx].result()
+            if isinstance(outcomes[idx][1], ConnectionError):
+                for pending in futures.values():
+                    pending.cancel()
+                break
+    return outcomes
 
-# Lock for sequential processing
-processing_lock = threading.Lock()
 
 # --- API Endpunkt ---
 @app.route('/api/analyze-billing', methods=['POST'])
 def analyze_billing():
-    with processing_lock:
-        # Basic request data for logging before full parsing
-        data_for_log = request.get_json(silent=True) or {}
-        user_input_log = data_for_log.get('inputText', '')[:100]
+    # Basic request data for logging before full parsing
+    data_for_log = request.get_json(silent=True) or {}
+    user_input_log = data_for_log.get('inputText', '')[:100]
     icd_input_log = data_for_log.get('icd', [])
     gtin_input_log = data_for_log.get('gtin', [])
     use_icd_flag_log = data_for_log.get('useIcd', True)
@@ -1240,6 +1617,10 @@ def analyze_billing():
     use_icd_flag = data.get('useIcd', True)
     age_input = data.get('age') # Will be used for alter_user
     gender_input = data.get('gender') # Will be used for geschlecht_user
+    # "selected": Bedingungs-HTML nur für die gewählte Pauschale (weitere über /api/pauschale-conditions)
+    detail_level = data.get('detail_level', 'selected')
+    if detail_level not in ('selected', 'full'):
+        detail_level = 'selected'
 
     # Bereinige ICD und GTIN Eingaben
     icd_input = [str(i).strip().upper() for i in icd_input_raw if isinstance(i, str) and str(i).strip()]
@@ -1261,7 +1642,7 @@ def analyze_billing():
     # For this exercise, I'll keep it to exactly match the prompt's request of adding the logger line,
     # but in a real scenario, one might remove the print now.
 
-    request_id = f"req_{time.time_ns()}" # Eindeutige Request-ID
+    request_id = f"req_{uuid.uuid4().hex[:12]}" # Eindeutige Request-ID (auch bei parallelen Requests)
     logger.info(f"[{request_id}] --- Start /api/analyze-billing ---")
     logger.info(
         "[{request_id}] Input: '%s...', ICDs: %s, GTINs: %s, useIcd: %s, Age: %s, Gender: %s",
@@ -1295,18 +1676,19 @@ def analyze_billing():
             logger.info(f"DEBUG: Beispiel token_doc_freq Key: {next(iter(token_doc_freq.keys()))}")
         # --- DEBUGGING END ---
 
-        ranked_results = cast(
-            List[Tuple[float, str]],
+        ranked_codes, top_ranking_results = cast(
+            Tuple[List[str], List[Tuple[float, str]]],
             rank_leistungskatalog_entries(
                 tokens,
                 leistungskatalog_dict,
                 token_doc_freq,
                 500,
-                return_scores=True,
+                token_index=catalog_token_index,
+                normalized_text=catalog_normalized_text,
+                term_matrix=catalog_term_matrix,
+                ratio_k=5,
             ),
         )
-        ranked_codes = [code for _, code in ranked_results]
-        top_ranking_results = ranked_results[:5]
         if direct_codes:
             ranked_codes = list(dict.fromkeys(direct_codes + ranked_codes))
         # --- DEBUGGING START ---
@@ -1420,6 +1802,7 @@ def analyze_billing():
             logger.info("(Heuristik C02.CP.0100) 'Anzahl' für Pauschale auf 2 gesetzt.")
 
     finale_abrechnung_obj: Dict[str, Any] | None = None
+    pauschale_haupt_pruef_kontext: Any = None
     fallback_pauschale_search = False
 
     if not final_validated_llm_leistungen:
@@ -1441,7 +1824,7 @@ def analyze_billing():
 
         potential_pauschale_codes_set: Set[str] = set(ranking_codes)
         if potential_pauschale_codes_set:
-            pauschale_haupt_pruef_kontext = {
+            pauschale_haupt_pruef_kontext = build_pruef_kontext({
                 "ICD": icd_input,
                 "GTIN": gtin_input,
                 "Alter": alter_context_val,
@@ -1450,20 +1833,24 @@ def analyze_billing():
                 "LKN": [],
                 "Seitigkeit": seitigkeit_context_val,
                 "Anzahl": anzahl_fuer_pauschale_context,
-            }
+            })
             try:
                 pauschale_pruef_ergebnis_dict = determine_applicable_pauschale_func(
                     user_input,
                         [], # rule_checked_leistungen_list_param
                     pauschale_haupt_pruef_kontext,
                     pauschale_lp_data,
-                        # pauschale_bedingungen_data, # Ersetzt durch pauschale_bedingungen_indexed
-                        pauschale_bedingungen_data, # KORREKTUR: Liste statt Dict
+                        pauschale_bedingungen_indexed,
                     pauschalen_dict,
                     leistungskatalog_dict,
                     tabellen_dict_by_table,
                     potential_pauschale_codes_set,
                     lang,
+                    condition_programs=pauschale_programs,
+                    detail_level=detail_level,
+                    simplified_signatures=pauschale_signatures,
+                    stem_diffs=pauschale_stem_diffs,
+                    potential_icds_index=pauschale_potential_icds,
                 )
                 finale_abrechnung_obj = pauschale_pruef_ergebnis_dict
                 if finale_abrechnung_obj.get("type") == "Pauschale":
@@ -1487,80 +1874,47 @@ def analyze_billing():
          msg_none = translate_rule_error_message("Keine LKN vom LLM identifiziert/validiert.", lang)
          regel_ergebnisse_details_list.append({"lkn": None, "initiale_menge": 0, "regelpruefung": {"abrechnungsfaehig": False, "fehler": [msg_none]}, "finale_menge": 0})
     else:
-        alle_lkn_codes_fuer_regelpruefung = [str(l.get("lkn")) for l in final_validated_llm_leistungen if l.get("lkn")] # Sicherstellen, dass es Strings sind
-        for leistung_data in final_validated_llm_leistungen:
-            lkn_code_val = leistung_data.get("lkn")
-            if not isinstance(lkn_code_val, str): continue # Sollte durch obige Validierung nicht passieren
-            lkn_code = lkn_code_val
-
-            menge_initial_val = leistung_data.get("menge", 1)
-            # print(f"INFO: Prüfe Regeln für LKN {lkn_code} (Initiale Menge: {menge_initial_val})")
-            regel_ergebnis_dict: Dict[str,Any] = {"abrechnungsfaehig": False, "fehler": ["Regelprüfung nicht durchgeführt."]}
-            finale_menge_nach_regeln = 0
-            # rp_lkn_module wurde oben importiert
-            if rp_lkn_module and hasattr(rp_lkn_module, 'pruefe_abrechnungsfaehigkeit') and regelwerk_dict: # Globale Variable hier OK
-                abrechnungsfall_kontext = {
-                    "LKN": lkn_code, "Menge": menge_initial_val,
-                    "Begleit_LKNs": [b_lkn for b_lkn in alle_lkn_codes_fuer_regelpruefung if b_lkn != lkn_code],
-                    "ICD": icd_input, "Geschlecht": geschlecht_context_val, "Alter": alter_context_val,
-                    "Pauschalen": [], "GTIN": gtin_input
-                }
-                try:
-                    regel_ergebnis_dict = rp_lkn_module.pruefe_abrechnungsfaehigkeit(abrechnungsfall_kontext, regelwerk_dict) # Globale Variable hier OK
-                    if regel_ergebnis_dict.get("abrechnungsfaehig"):
-                        finale_menge_nach_regeln = menge_initial_val
-                    else:
-                        fehler_liste_regel = regel_ergebnis_dict.get("fehler", [])
-                        mengen_reduktions_fehler = next((f for f in fehler_liste_regel if "Menge auf" in f and "reduziert" in f), None)
-                        if mengen_reduktions_fehler:
-                            match_menge = re.search(r"Menge auf (\d+)", mengen_reduktions_fehler)
-                            if match_menge:
-                                try:
-                                    finale_menge_nach_regeln = int(match_menge.group(1))
-                                    regel_ergebnis_dict["abrechnungsfaehig"] = True
-                                    logger.info(
-                                        "Menge für LKN %s durch Regelprüfer auf %s angepasst.",
-                                        lkn_code,
-                                        finale_menge_nach_regeln,
-                                    )
-                                except ValueError:
-                                    finale_menge_nach_regeln = 0  # Fallback
-                        else:
-                            mengenbesch_fehler = next((f for f in fehler_liste_regel if "Mengenbeschränkung überschritten" in f and "max." in f), None)
-                            if mengenbesch_fehler:
-                                match_max = re.search(r"max\.\s*(\d+)", mengenbesch_fehler)
-                                if match_max:
-                                    try:
-                                        finale_menge_nach_regeln = int(match_max.group(1))
-                                        regel_ergebnis_dict["abrechnungsfaehig"] = True
-                                        regel_ergebnis_dict.setdefault("fehler", []).append(
-                                            f"Menge auf {finale_menge_nach_regeln} reduziert (Mengenbeschränkung)"
-                                        )
-                                        logger.info(
-                                            "Menge für LKN %s automatisch auf %s reduziert wegen Mengenbeschränkung.",
-                                            lkn_code,
-                                            finale_menge_nach_regeln,
-                                        )
-                                    except ValueError:
-                                        finale_menge_nach_regeln = 0
-                        if finale_menge_nach_regeln == 0:
-                            logger.info(
-                                "LKN %s nicht abrechnungsfähig wegen Regel(n): %s",
-                                lkn_code,
-                                regel_ergebnis_dict.get('fehler', []),
-                            )
-                except Exception as e_rule:
-                    logger.error("Fehler bei Regelprüfung für LKN %s: %s", lkn_code, e_rule)
-                    traceback.print_exc()
-                    regel_ergebnis_dict = {"abrechnungsfaehig": False, "fehler": [f"Interner Fehler bei Regelprüfung: {e_rule}"]}
-            else:
-                logger.warning("Keine Regelprüfung für LKN %s durchgeführt (Regelprüfer oder Regelwerk fehlt).", lkn_code)
-                regel_ergebnis_dict = {"abrechnungsfaehig": False, "fehler": ["Regelprüfung nicht verfügbar."]}
-            
+        leistungen_mit_lkn = [l for l in final_validated_llm_leistungen if isinstance(l.get("lkn"), str)]
+        regelpruefung_verfuegbar = bool(rp_lkn_module and hasattr(rp_lkn_module, 'pruefe_fall') and regelwerk_dict) # Globale Variable hier OK
+        if regelpruefung_verfuegbar:
+            # Ein Durchgang für den ganzen Fall; Mengenreduktionen kommen strukturiert zurück
+            fall_kontext = {
+                "ICD": icd_input, "Geschlecht": geschlecht_context_val, "Alter": alter_context_val,
+                "Pauschalen": [], "GTIN": gtin_input
+            }
+            regel_ergebnisse_fall = rp_lkn_module.pruefe_fall(
+                final_validated_llm_leistungen, fall_kontext, regelwerk_dict, regelwerk_kompiliert or None
+            )
+        else:
+            regel_ergebnisse_fall = []
+            for leistung_data in leistungen_mit_lkn:
+                logger.warning("Keine Regelprüfung für LKN %s durchgeführt (Regelprüfer oder Regelwerk fehlt).", leistung_data.get("lkn"))
+                regel_ergebnisse_fall.append({
+                    "lkn": leistung_data.get("lkn"), "initiale_menge": leistung_data.get("menge", 1),
+                    "regelpruefung": {"abrechnungsfaehig": False, "fehler": ["Regelprüfung nicht verfügbar."]},
+                    "finale_menge": 0, "max_menge": None,
+                })
+        for leistung_data, regel_ergebnis in zip(leistungen_mit_lkn, regel_ergebnisse_fall):
+            lkn_code = regel_ergebnis["lkn"]
+            regel_ergebnis_dict = regel_ergebnis["regelpruefung"]
+            finale_menge_nach_regeln = regel_ergebnis["finale_menge"]
+            if regel_ergebnis.get("max_menge") is not None:
+                logger.info(
+                    "Menge für LKN %s automatisch auf %s reduziert wegen Mengenbeschränkung.",
+                    lkn_code,
+                    finale_menge_nach_regeln,
+                )
+            if finale_menge_nach_regeln == 0 and regelpruefung_verfuegbar and regel_ergebnis_dict.get("fehler"):
+                logger.info(
+                    "LKN %s nicht abrechnungsfähig wegen Regel(n): %s",
+                    lkn_code,
+                    regel_ergebnis_dict.get('fehler', []),
+                )
+
             if lang in ["fr", "it"]:
                 regel_ergebnis_dict["fehler"] = [translate_rule_error_message(m, lang) for m in regel_ergebnis_dict.get("fehler", [])]
 
-            regel_ergebnisse_details_list.append({"lkn": lkn_code, "initiale_menge": menge_initial_val, "regelpruefung": regel_ergebnis_dict, "finale_menge": finale_menge_nach_regeln})
+            regel_ergebnisse_details_list.append({"lkn": lkn_code, "initiale_menge": regel_ergebnis["initiale_menge"], "regelpruefung": regel_ergebnis_dict, "finale_menge": finale_menge_nach_regeln})
             if regel_ergebnis_dict.get("abrechnungsfaehig") and finale_menge_nach_regeln > 0:
                 rule_checked_leistungen_list.append({**leistung_data, "menge": finale_menge_nach_regeln})
     rule_time = time.time(); logger.info("Zeit nach Regelprüfung: %.2fs", rule_time - llm1_time)
@@ -1578,44 +1932,9 @@ def analyze_billing():
         logger.info("Pauschalenpotenzial nach Regelprüfung vorhanden. Starte LKN-Mapping & Pauschalen-Hauptprüfung.")
         potential_pauschale_codes_set: Set[str] = set()
         regelkonforme_lkn_codes_fuer_suche = {str(l.get('lkn')) for l in rule_checked_leistungen_list if l.get('lkn')} # Sicherstellen Strings
-        
-        for item_lp in pauschale_lp_data: # Globale Variable
-            lkn_in_lp_db_val = item_lp.get('Leistungsposition')
-            if isinstance(lkn_in_lp_db_val, str) and lkn_in_lp_db_val in regelkonforme_lkn_codes_fuer_suche:
-                pc_code = item_lp.get('Pauschale')
-                if pc_code and str(pc_code) in pauschalen_dict: potential_pauschale_codes_set.add(str(pc_code)) # Globale Variable
-        
-        regelkonforme_lkns_in_tables_cache: Dict[str, Set[str]] = {}
-        for cond_data in pauschale_bedingungen_data: # Globale Variable
-            pc_code_cond_val = cond_data.get('Pauschale')
-            if not (pc_code_cond_val and str(pc_code_cond_val) in pauschalen_dict): continue # Globale Variable
-            pc_code_cond = str(pc_code_cond_val)
-
-            bedingungstyp_cond_str = cond_data.get('Bedingungstyp', "").upper()
-            werte_cond_str = cond_data.get('Werte', "")
-
-            if bedingungstyp_cond_str in ["LEISTUNGSPOSITIONEN IN LISTE", "LKN"]:
-                werte_liste_cond_set = {w.strip().upper() for w in str(werte_cond_str).split(',') if w.strip()}
-                if not regelkonforme_lkn_codes_fuer_suche.isdisjoint(werte_liste_cond_set):
-                    potential_pauschale_codes_set.add(pc_code_cond)
-
-            elif bedingungstyp_cond_str in ["LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE"]:
-                table_refs_cond_set = {t.strip().lower() for t in str(werte_cond_str).split(',') if t.strip()}
-                for lkn_regelkonform_raw in regelkonforme_lkn_codes_fuer_suche:
-                    if isinstance(lkn_regelkonform_raw, str): # KORREKTUR für Fehler 1 & 2
-                        lkn_regelkonform_str = lkn_regelkonform_raw
-                        if lkn_regelkonform_str not in regelkonforme_lkns_in_tables_cache:
-                            tables_for_lkn_set = set()
-                            for table_name_key_norm, table_entries_list in tabellen_dict_by_table.items(): # Globale Variable
-                                for entry_item in table_entries_list:
-                                    if entry_item.get('Code', '').upper() == lkn_regelkonform_str and \
-                                       entry_item.get('Tabelle_Typ', '').lower() == "service_catalog":
-                                        tables_for_lkn_set.add(table_name_key_norm)
-                            regelkonforme_lkns_in_tables_cache[lkn_regelkonform_str] = tables_for_lkn_set
-                        
-                        if not table_refs_cond_set.isdisjoint(regelkonforme_lkns_in_tables_cache[lkn_regelkonform_str]):
-                            potential_pauschale_codes_set.add(pc_code_cond)
-                            break
+        potential_pauschale_codes_set.update(
+            find_pauschalen_for_lkns(regelkonforme_lkn_codes_fuer_suche, lkn_pauschalen_index)
+        )
         logger.info(
             "DEBUG: %s potenzielle Pauschalen für Mapping/Prüfung gefunden: %s",
             len(potential_pauschale_codes_set),
@@ -1626,7 +1945,7 @@ def analyze_billing():
             logger.info("Keine potenziellen Pauschalen nach initialer Suche gefunden. Gehe zu TARDOC.")
         else:
             mapping_candidate_lkns_dict = get_LKNs_from_pauschalen_conditions(
-                potential_pauschale_codes_set, pauschale_bedingungen_data, # Globale Variablen
+                potential_pauschale_codes_set, pauschale_bedingungen_indexed, # Globale Variablen
                 tabellen_dict_by_table, leistungskatalog_dict) # Globale Variablen
             # print(f"DEBUG: {len(mapping_candidate_lkns_dict)} LKN-Kandidaten für LLM-Mapping vorbereitet.")
 
@@ -1636,63 +1955,68 @@ def analyze_billing():
             mapping_process_had_connection_error = False
 
             if tardoc_lkns_to_map_list and mapping_candidate_lkns_dict:
+                # Für AG.* LKNs einmalig auf WA.*/ANAST-Kandidaten einschränken; alle
+                # AG.* LKNs teilen sich dasselbe Dict (relevant für Batch-Mapping).
+                filtered_anast_candidates: Dict[str, str] | None = None
+                mapping_tasks: List[Tuple[Any, Any, Dict[str, str]]] = []
                 for tardoc_leistung_map_obj in tardoc_lkns_to_map_list:
                     t_lkn_code = tardoc_leistung_map_obj.get('lkn')
                     t_lkn_desc = tardoc_leistung_map_obj.get('beschreibung')
                     current_candidates_for_llm = mapping_candidate_lkns_dict
                     if isinstance(t_lkn_code, str) and t_lkn_code.startswith('AG.'):
-                        anast_table_content_codes = {
-                            str(item['Code']).upper() for item in get_table_content("ANAST", "service_catalog", tabellen_dict_by_table) if item.get('Code') # Globale Variable
-                        }
-                        filtered_anast_candidates = {
-                            k: v for k, v in mapping_candidate_lkns_dict.items()
-                            if k.startswith('WA.') or k in anast_table_content_codes
-                        }
+                        if filtered_anast_candidates is None:
+                            anast_table_content_codes = get_table_codes("ANAST", "service_catalog", tabellen_dict_by_table)
+                            filtered_anast_candidates = {
+                                k: v for k, v in mapping_candidate_lkns_dict.items()
+                                if k.startswith('WA.') or k in anast_table_content_codes
+                            }
                         if filtered_anast_candidates:
                             current_candidates_for_llm = filtered_anast_candidates
-                            # print(f"  INFO: Für Mapping von {t_lkn_code} wurden Kandidaten auf ANAST/WA.* ({len(current_candidates_for_llm)}) reduziert.")
-
-                    if t_lkn_code and t_lkn_desc and current_candidates_for_llm:
-                        try:
-                            mapped_target_lkn_code = call_gemini_stage2_mapping(str(t_lkn_code), str(t_lkn_desc), current_candidates_for_llm, lang)
-                            if mapped_target_lkn_code:
-                                mapped_lkn_codes_set.add(mapped_target_lkn_code)
-                                # print(f"INFO: LKN-Mapping: {t_lkn_code} -> {mapped_target_lkn_code}")
-                            llm_stage2_mapping_results["mapping_results"].append({
-                                "tardoc_lkn": t_lkn_code, "tardoc_desc": t_lkn_desc,
-                                "mapped_lkn": mapped_target_lkn_code,
-                                "candidates_considered_count": len(current_candidates_for_llm)
-                            })
-                        except ConnectionError as e_conn_map:
-                            logger.error(
-                                "Verbindung zu LLM Stufe 2 (Mapping) für %s fehlgeschlagen: %s",
-                                t_lkn_code,
-                                e_conn_map,
-                            )
-                            finale_abrechnung_obj = {
-                                "type": "Error",
-                                "message": f"Verbindungsfehler zum Analyse-Service (Stufe 2 Mapping): {e_conn_map}",
-                            }
-                            mapping_process_had_connection_error = True
-                            break
-                        except Exception as e_map_call:
-                            logger.error(
-                                "Fehler bei Aufruf von LLM Stufe 2 (Mapping) für %s: %s",
-                                t_lkn_code,
-                                e_map_call,
-                            )
-                            traceback.print_exc()
-                            llm_stage2_mapping_results["mapping_results"].append(
-                                {
-                                    "tardoc_lkn": t_lkn_code,
-                                    "tardoc_desc": t_lkn_desc,
-                                    "mapped_lkn": None,
-                                    "error": str(e_map_call),
-                                    "candidates_considered_count": len(current_candidates_for_llm),
-                                }
-                            )
-                    else:
+                    mapping_tasks.append((t_lkn_code, t_lkn_desc, current_candidates_for_llm))
+
+                # Mapping-Aufrufe parallel ausführen; Auswertung in Eingabereihenfolge,
+                # damit Ergebnisliste und Abbruch bei Verbindungsfehler deterministisch bleiben.
+                mapping_outcomes = run_stage2_mappings(mapping_tasks, lang)
+                for (t_lkn_code, t_lkn_desc, current_candidates_for_llm), outcome in zip(mapping_tasks, mapping_outcomes):
+                    if outcome is None:
                         llm_stage2_mapping_results["mapping_results"].append({"tardoc_lkn": t_lkn_code or "N/A", "tardoc_desc": t_lkn_desc or "N/A", "mapped_lkn": None, "info": "Mapping übersprungen", "candidates_considered_count": len(current_candidates_for_llm) if current_candidates_for_llm else 0})
+                        continue
+                    mapped_target_lkn_code, e_map = outcome
+                    if isinstance(e_map, ConnectionError):
+                        logger.error(
+                            "Verbindung zu LLM Stufe 2 (Mapping) für %s fehlgeschlagen: %s",
+                            t_lkn_code,
+                            e_map,
+                        )
+                        finale_abrechnung_obj = {
+                            "type": "Error",
+                            "message": f"Verbindungsfehler zum Analyse-Service (Stufe 2 Mapping): {e_map}",
+                        }
+                        mapping_process_had_connection_error = True
+                        break
+                    if e_map is not None:
+                        logger.error(
+                            "Fehler bei Aufruf von LLM Stufe 2 (Mapping) für %s: %s",
+                            t_lkn_code,
+                            e_map,
+                        )
+                        llm_stage2_mapping_results["mapping_results"].append(
+                            {
+                                "tardoc_lkn": t_lkn_code,
+                                "tardoc_desc": t_lkn_desc,
+                                "mapped_lkn": None,
+                                "error": str(e_map),
+                                "candidates_considered_count": len(current_candidates_for_llm),
+                            }
+                        )
+                        continue
+                    if mapped_target_lkn_code:
+                        mapped_lkn_codes_set.add(mapped_target_lkn_code)
+                    llm_stage2_mapping_results["mapping_results"].append({
+                        "tardoc_lkn": t_lkn_code, "tardoc_desc": t_lkn_desc,
+                        "mapped_lkn": mapped_target_lkn_code,
+                        "candidates_considered_count": len(current_candidates_for_llm)
+                    })
             else:
                 logger.info("Überspringe LKN-Mapping (keine E/EZ LKNs oder keine Mapping-Kandidaten).")
             mapping_time = time.time(); logger.info("Zeit nach LKN-Mapping: %.2fs", mapping_time - rule_time)
@@ -1711,50 +2035,7 @@ def analyze_billing():
                 # LKN-Sets erneut suchen (inkl. gemappter LKNs)
                 erweiterte_lkn_suchmenge = {str(l).upper() for l in final_lkn_context_for_pauschale_set}
 
-                neu_gefundene_codes: Set[str] = set()
-
-                for item_lp in pauschale_lp_data:
-                    lkn_in_lp_db_val = item_lp.get('Leistungsposition')
-                    if (
-                        isinstance(lkn_in_lp_db_val, str)
-                        and lkn_in_lp_db_val.upper() in erweiterte_lkn_suchmenge
-                    ):
-                        pc_code = item_lp.get('Pauschale')
-                        if pc_code and str(pc_code) in pauschalen_dict:
-                            neu_gefundene_codes.add(str(pc_code))
-
-                erweiterte_lkns_in_tables_cache: Dict[str, Set[str]] = {}
-                for cond_data in pauschale_bedingungen_data:
-                    pc_code_cond_val = cond_data.get('Pauschale')
-                    if not (pc_code_cond_val and str(pc_code_cond_val) in pauschalen_dict):
-                        continue
-                    pc_code_cond = str(pc_code_cond_val)
-
-                    bedingungstyp_cond_str = cond_data.get('Bedingungstyp', "").upper()
-                    werte_cond_str = cond_data.get('Werte', "")
-
-                    if bedingungstyp_cond_str in ["LEISTUNGSPOSITIONEN IN LISTE", "LKN"]:
-                        werte_liste_cond_set = {w.strip().upper() for w in str(werte_cond_str).split(',') if w.strip()}
-                        if not erweiterte_lkn_suchmenge.isdisjoint(werte_liste_cond_set):
-                            neu_gefundene_codes.add(pc_code_cond)
-
-                    elif bedingungstyp_cond_str in ["LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE"]:
-                        table_refs_cond_set = {t.strip().lower() for t in str(werte_cond_str).split(',') if t.strip()}
-                        for lkn_raw in erweiterte_lkn_suchmenge:
-                            if isinstance(lkn_raw, str):
-                                lkn_str = lkn_raw.upper()
-                                if lkn_str not in erweiterte_lkns_in_tables_cache:
-                                    tables_for_lkn_set = set()
-                                    for table_name_key_norm, table_entries_list in tabellen_dict_by_table.items():
-                                        for entry_item in table_entries_list:
-                                            if entry_item.get('Code', '').upper() == lkn_str and \
-                                               entry_item.get('Tabelle_Typ', '').lower() == "service_catalog":
-                                                tables_for_lkn_set.add(table_name_key_norm)
-                                    erweiterte_lkns_in_tables_cache[lkn_str] = tables_for_lkn_set
-
-                                if not table_refs_cond_set.isdisjoint(erweiterte_lkns_in_tables_cache[lkn_str]):
-                                    neu_gefundene_codes.add(pc_code_cond)
-                                    break
+                neu_gefundene_codes = find_pauschalen_for_lkns(erweiterte_lkn_suchmenge, lkn_pauschalen_index)
 
                 if neu_gefundene_codes:
                     potential_pauschale_codes_set.update(neu_gefundene_codes)
@@ -1764,12 +2045,13 @@ def analyze_billing():
                     potential_pauschale_codes_set,
                 )
 
-                pauschale_haupt_pruef_kontext = {
+                # Einmal pro Anfrage normalisiert; alle Bedingungsprüfungen nutzen denselben Kontext
+                pauschale_haupt_pruef_kontext = build_pruef_kontext({
                     "ICD": icd_input, "GTIN": gtin_input, "Alter": alter_context_val,
                     "Geschlecht": geschlecht_context_val, "useIcd": use_icd_flag,
                     "LKN": final_lkn_context_list_for_pauschale, "Seitigkeit": seitigkeit_context_val,
                     "Anzahl": anzahl_fuer_pauschale_context
-                }
+                })
                 try:
                     logger.info(f"[{request_id}] Starte Pauschalen-Hauptprüfung (useIcd=%s)...", use_icd_flag)
                     time_before_determine_pauschale = time.time()
@@ -1777,11 +2059,12 @@ def analyze_billing():
                     pauschale_pruef_ergebnis_dict = determine_applicable_pauschale_func(
                         user_input, rule_checked_leistungen_list, pauschale_haupt_pruef_kontext,
                         pauschale_lp_data,
-                        # pauschale_bedingungen_data, # Ersetzt durch pauschale_bedingungen_indexed
-                        pauschale_bedingungen_data, # KORREKTUR: Liste statt Dict
+                        pauschale_bedingungen_indexed,
                         pauschalen_dict,
                         leistungskatalog_dict, tabellen_dict_by_table, potential_pauschale_codes_set,
-                        lang
+                        lang, condition_programs=pauschale_programs, detail_level=detail_level,
+                        simplified_signatures=pauschale_signatures, stem_diffs=pauschale_stem_diffs,
+                        potential_icds_index=pauschale_potential_icds,
                     )
                     finale_abrechnung_obj = pauschale_pruef_ergebnis_dict
                     if finale_abrechnung_obj.get("type") == "Pauschale":
@@ -1817,6 +2100,9 @@ def analyze_billing():
     }
     if fallback_pauschale_search:
         final_response_payload["fallback_pauschale_search"] = True
+    if finale_abrechnung_obj.get("type") == "Pauschale" and pauschale_haupt_pruef_kontext is not None:
+        # Damit der Client Bedingungs-HTML weiterer Kandidaten nachladen kann
+        final_response_payload["pauschale_pruef_kontext"] = dict(getattr(pauschale_haupt_pruef_kontext, "raw", pauschale_haupt_pruef_kontext))
     end_time = time.time(); total_time = end_time - start_time
     logger.info("Gesamtverarbeitungszeit Backend: %.2fs", total_time)
     logger.info(
@@ -1855,6 +2141,82 @@ def perform_analysis(text: str,
             raise RuntimeError(f"analyze-billing failed: {resp.status_code} {resp.get_data(as_text=True)}")
         return resp.get_json()
 
+PRUEF_KONTEXT_KEYS = ("ICD", "GTIN", "LKN", "Alter", "AlterBeiEintritt", "Geschlecht", "Seitigkeit", "Anzahl", "useIcd")
+PRUEF_KONTEXT_LISTEN = ("ICD", "GTIN", "LKN")
+PRUEF_KONTEXT_ZAHLEN = ("Alter", "AlterBeiEintritt", "Anzahl")
+PRUEF_KONTEXT_TEXTE = ("Geschlecht", "Seitigkeit")
+
+
+def parse_pruef_kontext(raw_context: Dict[str, Any]) -> Tuple[Dict[str, Any], str | None]:
+    """Prüft und normalisiert einen vom Client gesendeten Pauschalen-Prüfkontext.
+
+    Listenfelder müssen Listen aus Strings sein (GTIN auch Zahlen), Alter und
+    Anzahl ganze Zahlen (auch als Ziffern-String oder 42.0), Geschlecht/Seitigkeit
+    Strings und ``useIcd`` ein Boolean; ``null`` gilt als nicht gesetzt.
+    Liefert ``(kontext, None)`` oder ``({}, fehlermeldung)``.
+    """
+    kontext: Dict[str, Any] = {}
+    for key in PRUEF_KONTEXT_KEYS:
+        value = raw_context.get(key)
+        if value is None:
+            continue
+        if key in PRUEF_KONTEXT_LISTEN:
+            if not isinstance(value, list):
+                return {}, f"'{key}' muss eine Liste sein"
+            erlaubt = (str, int) if key == "GTIN" else (str,)
+            if any(isinstance(v, bool) or not isinstance(v, erlaubt) for v in value):
+                return {}, f"'{key}' darf nur Codes als Strings enthalten"
+            kontext[key] = [str(v) for v in value]
+        elif key in PRUEF_KONTEXT_ZAHLEN:
+            if isinstance(value, str) and value.strip().isdigit():
+                value = int(value.strip())
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if isinstance(value, bool) or not isinstance(value, int):
+                return {}, f"'{key}' muss eine ganze Zahl sein"
+            kontext[key] = value
+        elif key in PRUEF_KONTEXT_TEXTE:
+            if not isinstance(value, str):
+                return {}, f"'{key}' muss ein String sein"
+            kontext[key] = value
+        else:  # useIcd
+            if not isinstance(value, bool):
+                return {}, f"'{key}' muss true oder false sein"
+            kontext[key] = value
+    return kontext, None
+
+
+@app.route('/api/pauschale-conditions', methods=['POST'])
+def pauschale_conditions_endpoint():
+    """Bedingungs-HTML für einen Pauschalen-Kandidaten nachladen.
+
+    Erwartet ``code``, ``lang`` und den ``pauschale_pruef_kontext`` aus der
+    Antwort von /api/analyze-billing (Feld ``context``).
+    """
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    data = request.get_json() or {}
+    code = str(data.get("code", "")).strip()
+    lang = data.get("lang", "de")
+    if lang not in ['de', 'fr', 'it']:
+        lang = 'de'
+    if code not in pauschalen_dict:
+        return jsonify({"error": f"Unbekannte Pauschale '{code}'"}), 404
+    if rpp_module is None or not hasattr(rpp_module, "render_pauschale_conditions"):
+        return jsonify({"error": "Pauschalen-Prüfung nicht verfügbar"}), 503
+    raw_context = data.get("context") or {}
+    if not isinstance(raw_context, dict):
+        return jsonify({"error": "'context' muss ein Objekt sein"}), 400
+    kontext_werte, fehler = parse_pruef_kontext(raw_context)
+    if fehler:
+        return jsonify({"error": f"Ungültiger Kontext: {fehler}"}), 400
+    kontext = build_pruef_kontext(kontext_werte)
+    result = rpp_module.render_pauschale_conditions(
+        code, kontext, pauschale_bedingungen_indexed, tabellen_dict_by_table,
+        leistungskatalog_dict, lang, condition_programs=pauschale_programs,
+    )
+    return jsonify(result)
+
 @app.route('/api/quality', methods=['POST'])
 def quality_endpoint():
     """Simple quality check endpoint returning baseline comparison."""
@@ -1867,6 +2229,11 @@ def quality_endpoint():
     match = result == baseline
     return jsonify({"result": result, "baseline": baseline, "match": match})
 
+@app.route('/api/llm-stats', methods=['GET'])
+def llm_stats_endpoint():
+    """Zähler des gepoolten Gemini-Clients (Aufrufe, Verbindungen geöffnet/wiederverwendet)."""
+    return jsonify(llm_client.get_stats())
+
 @app.route('/api/test-example', methods=['POST'])
 def test_example():
     """Vergleicht das Ergebnis einer Beispielanalyse mit dem Baseline-Resultat."""
@@ -1932,7 +2299,8 @@ def test_example():
 
     result = simplify(analysis_full)
 
-    baseline_entry.setdefault('current', {})[lang] = result
+    with baseline_results_lock:
+        baseline_entry.setdefault('current', {})[lang] = result
 
     def diff_results(expected: dict, actual: dict) -> str:
         parts = []
@@ -0,0 +1,145 @@
+import copy
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the root directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import server
+
+# Deterministische Stub-Antworten pro Eingabetext
+STUB_STAGE1 = {
+    "Konsultation HAz, 17 Minuten": [
+        {"lkn": "CA.00.0010", "typ": "E", "menge": 1},
+        {"lkn": "CA.00.0020", "typ": "E", "menge": 12},
+    ],
+    "Konsultation 10 Minuten und Warzenentfernung": [
+        {"lkn": "CA.00.0010", "typ": "E", "menge": 1},
+        {"lkn": "MK.05.0070", "typ": "P", "menge": 1},
+    ],
+    "Arthroskopie Knie links": [
+        {"lkn": "C08.GD.0030", "typ": "P", "menge": 1},
+        {"lkn": "WA.10.0010", "typ": "P", "menge": 1},
+    ],
+    "Blinddarmentfernung": [],
+}
+
+
+def _stub_stage1(user_input, katalog_context, lang="de"):
+    time.sleep(0.01)  # simuliert Netzwerklatenz, damit Requests überlappen
+    for text, leistungen in STUB_STAGE1.items():
+        if user_input.startswith(text):
+            return {
+                "identified_leistungen": copy.deepcopy(leistungen),
+                "extracted_info": {"seitigkeit": "unbekannt", "anzahl_prozeduren": None},
+                "begruendung_llm": "stub",
+            }
+    return {"identified_leistungen": [], "extracted_info": {}, "begruendung_llm": "stub"}
+
+
+def _stub_mapping(tardoc_lkn, tardoc_desc, candidate_pauschal_lkns, lang="de"):
+    time.sleep(0.01)
+    return sorted(candidate_pauschal_lkns)[0] if candidate_pauschal_lkns else None
+
+
+def _stub_ranking(user_input, potential_pauschalen_text, lang="de"):
+    time.sleep(0.01)
+    return [line.split(":", 1)[0] for line in potential_pauschalen_text.splitlines()[:3]]
+
+
+def _analyze(text):
+    with server.app.test_client() as client:
+        response = client.post('/api/analyze-billing', json={'inputText': text, 'useIcd': False})
+        return response.status_code, response.get_json()
+
+
+def test_parallel_requests_match_sequential(monkeypatch):
+    monkeypatch.setattr(server, "call_gemini_stage1", _stub_stage1)
+    monkeypatch.setattr(server, "call_gemini_stage2_mapping", _stub_mapping)
+    monkeypatch.setattr(server, "call_gemini_stage2_ranking", _stub_ranking)
+    monkeypatch.setattr(server, "MAPPING_MODE", "single")
+
+    inputs = list(STUB_STAGE1) * 6
+    sequential = {text: _analyze(text) for text in STUB_STAGE1}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        parallel = list(pool.map(_analyze, inputs))
+
+    for text, result in zip(inputs, parallel):
+        assert result == sequential[text], text
+
+
+def test_stage2_mappings_run_in_parallel_and_keep_order(monkeypatch):
+    def slow_mapping(tardoc_lkn, tardoc_desc, candidate_pauschal_lkns, lang="de"):
+        time.sleep(0.1)
+        return f"MAP-{tardoc_lkn}"
+
+    monkeypatch.setattr(server, "call_gemini_stage2_mapping", slow_mapping)
+    monkeypatch.setattr(server, "MAPPING_MAX_CONCURRENCY", 4)
+    monkeypatch.setattr(server, "MAPPING_MODE", "single")
+    candidates = {"C01.AA.0010": "Kandidat"}
+    tasks = [(f"AA.00.00{i}0", "Beschreibung", candidates) for i in range(4)]
+    tasks.insert(2, ("AA.00.0099", None, candidates))  # ohne Beschreibung -> übersprungen
+
+    start = time.perf_counter()
+    outcomes = server.run_stage2_mappings(tasks, "de")
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.3
+    assert outcomes[2] is None
+    assert [o[0] for o in outcomes if o is not None] == [f"MAP-AA.00.00{i}0" for i in range(4)]
+
+
+def test_stage2_mappings_stop_after_connection_error(monkeypatch):
+    calls = []
+
+    def failing_mapping(tardoc_lkn, tardoc_desc, candidate_pauschal_lkns, lang="de"):
+        calls.append(tardoc_lkn)
+        if tardoc_lkn == "AA.00.0010":
+            raise ConnectionError("offline")
+        return "X"
+
+    monkeypatch.setattr(server, "call_gemini_stage2_mapping", failing_mapping)
+    monkeypatch.setattr(server, "MAPPING_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(server, "MAPPING_MODE", "single")
+    tasks = [(f"AA.00.00{i}0", "Beschreibung", {"C": "c"}) for i in range(3)]
+
+    outcomes = server.run_stage2_mappings(tasks, "de")
+
+    assert calls == ["AA.00.0000", "AA.00.0010"]
+    assert isinstance(outcomes[1][1], ConnectionError)
+    assert outcomes[2] is None
+
+
+def test_batch_mapping_groups_by_candidates_and_falls_back(monkeypatch):
+    batch_calls = []
+    single_calls = []
+
+    def batch_mapping(tardoc_leistungen, candidate_pauschal_lkns, lang="de"):
+        batch_calls.append([code for code, _ in tardoc_leistungen])
+        # AA.00.0020 fehlt in der Antwort -> Einzel-Mapping
+        return {"AA.00.0000": "C1", "AA.00.0010": None}
+
+    def single_mapping(tardoc_lkn, tardoc_desc, candidate_pauschal_lkns, lang="de"):
+        single_calls.append(tardoc_lkn)
+        return "C2"
+
+    monkeypatch.setattr(server, "call_gemini_stage2_mapping_batch", batch_mapping)
+    monkeypatch.setattr(server, "call_gemini_stage2_mapping", single_mapping)
+    monkeypatch.setattr(server, "MAPPING_MODE", "batch")
+    shared = {"C1": "eins", "C2": "zwei"}
+    anast = {"WA.10.0010": "Anästhesie"}
+    tasks = [
+        ("AA.00.0000", "Beschreibung", shared),
+        ("AG.00.0010", "Anästhesie", anast),
+        ("AA.00.0010", "Beschreibung", shared),
+        ("AA.00.0020", "Beschreibung", shared),
+    ]
+
+    outcomes = server.run_stage2_mappings(tasks, "de")
+
+    assert batch_calls == [["AA.00.0000", "AA.00.0010", "AA.00.0020"]]
+    assert sorted(single_calls) == ["AA.00.0020", "AG.00.0010"]
+    assert [o[0] for o in outcomes] == ["C1", "C2", None, "C2"]
@@ -0,0 +1,281 @@
+import unittest
+import sys
+import pathlib
+import json
+import random
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from utils import get_table_content
+from regelpruefer_pauschale import (
+    EvaluationContext,
+    build_simplified_signatures,
+    build_potential_icds_index,
+    build_stem_diffs,
+    clear_fragment_cache,
+    generate_condition_detail_html,
+    determine_applicable_pauschale,
+    get_pauschale_stamm,
+    get_beschreibung_fuer_icd_im_backend,
+    get_conditions_for_pauschale,
+    get_simplified_conditions,
+    check_single_condition,
+    compile_pauschale_program,
+    compile_pauschale_programs,
+    evaluate_all_pauschalen,
+    evaluate_compiled_pauschale,
+    evaluate_pauschale_logic_orchestrator,
+)
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+TABLE_TYPES = {
+    "HAUPTDIAGNOSE IN TABELLE": "icd",
+    "LEISTUNGSPOSITIONEN IN TABELLE": "service_catalog",
+    "TARIFPOSITIONEN IN TABELLE": "service_catalog",
+}
+
+
+def _load_tables(bedingungen):
+    """Echte Tabellen, falls vorhanden; sonst synthetische Tabellen für alle Referenzen."""
+    tab_path = ROOT / "data/PAUSCHALEN_Tabellen.json"
+    tab_dict = {}
+    if tab_path.exists():
+        with open(tab_path, encoding="utf-8") as f:
+            for row in json.load(f):
+                if row.get("Tabelle"):
+                    tab_dict.setdefault(row["Tabelle"].lower(), []).append(row)
+        return tab_dict
+    for cond in bedingungen:
+        typ = TABLE_TYPES.get(str(cond.get("Bedingungstyp", "")).upper())
+        if not typ:
+            continue
+        for name in str(cond.get("Werte", "")).split(","):
+            name = name.strip().lower()
+            if name and name not in tab_dict:
+                tab_dict[name] = [
+                    {"Tabelle": name, "Code": f"{name.upper()}.{i}", "Tabelle_Typ": typ} for i in range(2)
+                ]
+    return tab_dict
+
+
+def _candidate_values(conditions, tab_dict):
+    """Sammelt pro Kontextfeld Werte, die Bedingungen der Pauschale erfüllen können."""
+    values = {"LKN": set(), "ICD": set(), "GTIN": set()}
+    for cond in conditions:
+        typ = str(cond.get("Bedingungstyp", "")).upper()
+        werte = str(cond.get("Werte", ""))
+        parts = [w.strip() for w in werte.split(",") if w.strip()]
+        if typ in ("LEISTUNGSPOSITIONEN IN LISTE", "LKN"):
+            values["LKN"].update(parts)
+        elif typ in ("MEDIKAMENTE IN LISTE", "GTIN"):
+            values["GTIN"].update(parts)
+        elif typ == "ICD":
+            values["ICD"].update(parts)
+        elif typ in TABLE_TYPES:
+            field = "ICD" if TABLE_TYPES[typ] == "icd" else "LKN"
+            for name in parts:
+                codes = sorted(str(e.get("Code")) for e in tab_dict.get(name.lower(), []) if e.get("Code"))
+                values[field].update(codes[:2])
+    return {k: sorted(v) for k, v in values.items()}
+
+
+class TestConditionPrograms(unittest.TestCase):
+    def test_compiled_programs_match_orchestrator_for_all_pauschalen(self):
+        with open(ROOT / "data/PAUSCHALEN_Bedingungen.json", encoding="utf-8") as f:
+            bedingungen = json.load(f)
+        tab_dict = _load_tables(bedingungen)
+        programs = compile_pauschale_programs(bedingungen, tab_dict)
+
+        rows_by_code = {}
+        for cond in bedingungen:
+            rows_by_code.setdefault(cond["Pauschale"], []).append(cond)
+        self.assertEqual(set(programs), set(rows_by_code))
+
+        rng = random.Random(42)
+        checked = 0
+        for code, rows in sorted(rows_by_code.items()):
+            values = _candidate_values(rows, tab_dict)
+            contexts = [
+                {},
+                {"useIcd": False, "LKN": values["LKN"]},
+                {**values, "Seitigkeit": "links", "Anzahl": 2, "AlterBeiEintritt": 30, "Geschlecht": "weiblich"},
+            ]
+            for _ in range(8):
+                contexts.append({
+                    field: rng.sample(vals, rng.randint(0, len(vals))) for field, vals in values.items()
+                } | {
+                    "useIcd": rng.random() < 0.8,
+                    "Seitigkeit": rng.choice(["links", "rechts", "beidseits", "einseitig", "unbekannt"]),
+                    "Anzahl": rng.choice([None, 1, 2, 3, 5, "x"]),
+                    "AlterBeiEintritt": rng.choice([None, 0, 5, 16, 18, 40, 70]),
+                    "Geschlecht": rng.choice(["männlich", "weiblich", "unbekannt"]),
+                })
+            for context in contexts:
+                expected = evaluate_pauschale_logic_orchestrator(code, context, rows, tab_dict)
+                self.assertEqual(
+                    evaluate_compiled_pauschale(programs[code], context), expected, (code, context)
+                )
+                checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_levels_and_ast_blocks(self):
+        rows = [
+            {"BedingungsID": 1, "Pauschale": "X", "Gruppe": 1, "Operator": "ODER", "Bedingungstyp": "LKN", "Werte": "A", "Ebene": 1},
+            {"BedingungsID": 2, "Pauschale": "X", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LKN", "Werte": "B", "Ebene": 2},
+            {"BedingungsID": 3, "Pauschale": "X", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LKN", "Werte": "C", "Ebene": 2},
+            {"BedingungsID": 4, "Pauschale": "X", "Bedingungstyp": "AST VERBINDUNGSOPERATOR", "Werte": "UND"},
+            {"BedingungsID": 5, "Pauschale": "X", "Gruppe": 2, "Operator": "UND", "Bedingungstyp": "SEITIGKEIT", "Werte": "'E'", "Vergleichsoperator": "=", "Ebene": 1},
+        ]
+        program = compile_pauschale_program("X", rows, {})
+        for lkns in ([], ["A"], ["B"], ["B", "C"]):
+            for seitigkeit in ("links", "beidseits"):
+                context = {"LKN": lkns, "Seitigkeit": seitigkeit}
+                self.assertEqual(
+                    evaluate_compiled_pauschale(program, context),
+                    evaluate_pauschale_logic_orchestrator("X", context, rows, {}),
+                    context,
+                )
+
+    def test_evaluation_context_matches_dict_context(self):
+        with open(ROOT / "data/PAUSCHALEN_Bedingungen.json", encoding="utf-8") as f:
+            bedingungen = json.load(f)
+        tab_dict = _load_tables(bedingungen)
+        context = {
+            **_candidate_values(bedingungen, tab_dict),
+            "Seitigkeit": "Links", "Anzahl": 2, "AlterBeiEintritt": 30, "Geschlecht": "Weiblich",
+        }
+        ctx = EvaluationContext(context)
+        self.assertIs(EvaluationContext.of(ctx), ctx)
+        self.assertEqual(ctx.get("Anzahl"), 2)
+        self.assertIsInstance(ctx.lkns, frozenset)
+        for cond in bedingungen:
+            self.assertEqual(
+                check_single_condition(cond, ctx, tab_dict),
+                check_single_condition(cond, context, tab_dict),
+                cond,
+            )
+        for code in {cond["Pauschale"] for cond in bedingungen[:200]}:
+            self.assertEqual(
+                evaluate_pauschale_logic_orchestrator(code, ctx, bedingungen, tab_dict),
+                evaluate_pauschale_logic_orchestrator(code, context, bedingungen, tab_dict),
+            )
+
+    def test_leaf_results_are_shared_across_pauschalen(self):
+        shared = {"Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LEISTUNGSPOSITIONEN IN LISTE", "Werte": "AA.00.0010", "Ebene": 1}
+        rows = [
+            {**shared, "BedingungsID": 1, "Pauschale": "X1"},
+            {**shared, "BedingungsID": 2, "Pauschale": "X2"},
+            {"BedingungsID": 3, "Pauschale": "X2", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "SEITIGKEIT", "Werte": "'B'", "Vergleichsoperator": "=", "Ebene": 1},
+        ]
+        tab_dict = {}
+        programs = compile_pauschale_programs(rows, tab_dict)
+        ctx = EvaluationContext({"LKN": ["aa.00.0010"], "Seitigkeit": "beidseits"})
+        self.assertTrue(evaluate_compiled_pauschale(programs["X1"], ctx))
+        self.assertTrue(evaluate_compiled_pauschale(programs["X2"], ctx))
+        self.assertEqual(ctx.memo_stats()["misses"], 2)
+        self.assertEqual(ctx.memo_stats()["hits"], 1)
+        # Der Interpreter (z.B. für das HTML) nutzt dieselbe Memo-Tabelle
+        self.assertTrue(check_single_condition(rows[2], ctx, tab_dict))
+        self.assertEqual(ctx.memo_stats()["hits"], 2)
+        self.assertTrue(evaluate_pauschale_logic_orchestrator("X2", ctx, rows, tab_dict))
+        self.assertEqual(ctx.memo_stats()["misses"], 2)
+
+    def test_evaluate_all_pauschalen(self):
+        with open(ROOT / "data/PAUSCHALEN_Bedingungen.json", encoding="utf-8") as f:
+            bedingungen = json.load(f)
+        tab_dict = _load_tables(bedingungen)
+        programs = compile_pauschale_programs(bedingungen, tab_dict, ["OHNE.BEDINGUNG"])
+        context = {**_candidate_values(bedingungen[:300], tab_dict), "Seitigkeit": "links", "Anzahl": 1}
+
+        result = evaluate_all_pauschalen(context, programs)
+        self.assertEqual(result["codes"], sorted(programs))
+        self.assertIn("OHNE.BEDINGUNG", result["valid_codes"])
+        for i, code in enumerate(result["codes"]):
+            expected = evaluate_pauschale_logic_orchestrator(code, context, bedingungen, tab_dict)
+            self.assertEqual(bool(result["bitmap"] >> i & 1), expected, code)
+            self.assertEqual(code in result["failing_groups"], not expected, code)
+        self.assertGreater(result["memo"]["hits"], 0)
+
+    def test_failing_groups(self):
+        rows = [
+            {"BedingungsID": 1, "Pauschale": "X", "Gruppe": 1, "Operator": "ODER", "Bedingungstyp": "LKN", "Werte": "A", "Ebene": 1},
+            {"BedingungsID": 2, "Pauschale": "X", "Gruppe": 2, "Operator": "UND", "Bedingungstyp": "LKN", "Werte": "B", "Ebene": 1},
+            {"BedingungsID": 3, "Pauschale": "X", "Bedingungstyp": "AST VERBINDUNGSOPERATOR", "Werte": "UND"},
+            {"BedingungsID": 4, "Pauschale": "X", "Gruppe": 3, "Operator": "UND", "Bedingungstyp": "LKN", "Werte": "C", "Ebene": 1},
+        ]
+        programs = compile_pauschale_programs(rows, {})
+        self.assertEqual(evaluate_all_pauschalen({"LKN": ["A"]}, programs)["failing_groups"], {"X": [2, 3]})
+        result = evaluate_all_pauschalen({"LKN": ["A", "C"]}, programs)
+        self.assertEqual((result["bitmap"], result["valid_codes"], result["failing_groups"]), (1, ["X"], {}))
+
+    def test_precomputed_signatures_and_stem_diffs(self):
+        with open(ROOT / "data/PAUSCHALEN_Bedingungen.json", encoding="utf-8") as f:
+            bedingungen = json.load(f)
+        signatures = build_simplified_signatures(bedingungen)
+        for code, signature in signatures.items():
+            self.assertEqual(signature, frozenset(get_simplified_conditions(code, bedingungen)), code)
+
+        diffs = build_stem_diffs(signatures)
+        self.assertTrue(diffs)
+        for (selected, other), (additional, missing) in diffs.items():
+            self.assertEqual(get_pauschale_stamm(selected), get_pauschale_stamm(other))
+            self.assertEqual(set(additional), signatures[other] - signatures[selected])
+            self.assertEqual(set(missing), signatures[selected] - signatures[other])
+
+    def test_comparison_html_uses_precomputed_diffs(self):
+        with open(ROOT / "data/PAUSCHALEN_Bedingungen.json", encoding="utf-8") as f:
+            bedingungen = json.load(f)
+        tab_dict = _load_tables(bedingungen)
+        signatures = build_simplified_signatures(bedingungen)
+        diffs = build_stem_diffs(signatures)
+        stamm_codes = sorted(code for code in signatures if get_pauschale_stamm(code) == "C04.51")
+        self.assertGreater(len(stamm_codes), 1)
+        pauschalen_dict = {code: {"Pauschale": code, "Pauschale_Text": code, "Taxpunkte": "1"} for code in stamm_codes}
+        context = {**_candidate_values(bedingungen, tab_dict), "Seitigkeit": "beidseits", "Anzahl": 2}
+        args = ("", [], context, [], bedingungen, pauschalen_dict, {}, tab_dict, set(stamm_codes))
+        plain = determine_applicable_pauschale(*args)
+        precomputed = determine_applicable_pauschale(*args, simplified_signatures=signatures, stem_diffs=diffs)
+        self.assertEqual(plain["type"], "Pauschale")
+        self.assertEqual(plain["details"]["pauschale_erklaerung_html"], precomputed["details"]["pauschale_erklaerung_html"])
+
+    def test_condition_fragment_cache(self):
+        import regelpruefer_pauschale as rpp
+        katalog = {"AA.00.0010": {"Beschreibung": "Konsultation"}}
+        tabellen = {"tab1": [{"Code": "AA.00.0010", "Code_Text": "Konsultation", "Tabelle_Typ": "service_catalog"}]}
+        cond = ("LKN_TABLE", "TAB1")
+        clear_fragment_cache()
+        first = generate_condition_detail_html(cond, katalog, tabellen, "de")
+        self.assertEqual(first, rpp._build_condition_detail_html(cond, katalog, tabellen, "de")[0])
+        self.assertIs(generate_condition_detail_html(cond, katalog, tabellen, "de"), first)
+        self.assertIsNot(generate_condition_detail_html(cond, katalog, dict(tabellen), "de"), first)
+        self.assertIsNot(generate_condition_detail_html(cond, katalog, tabellen, "fr"), first)
+        clear_fragment_cache()
+        self.assertEqual(len(rpp._fragment_cache), 0)
+        self.assertIsNot(generate_condition_detail_html(cond, katalog, tabellen, "de"), first)
+
+    def test_icd_indices_match_table_scan(self):
+        with open(ROOT / "data/PAUSCHALEN_Bedingungen.json", encoding="utf-8") as f:
+            bedingungen = json.load(f)
+        tab_dict = _load_tables(bedingungen)
+        tab_dict["icd_hauptkatalog"] = [{"Code": "Z99.9", "Code_Text": "Haupt", "Code_Text_f": "Principal", "Tabelle_Typ": "icd"}]
+        index = build_potential_icds_index(bedingungen, tab_dict)
+        codes = {cond["Pauschale"] for cond in bedingungen}
+        self.assertEqual({code for code, _ in index}, codes)
+        for code in codes:
+            for lang in ("de", "fr"):
+                expected, source = {}, {}
+                for cond in get_conditions_for_pauschale(code, bedingungen):
+                    if cond.get("Bedingungstyp", "").upper() == "HAUPTDIAGNOSE IN TABELLE" and cond.get("Werte"):
+                        for entry in get_table_content(cond["Werte"], "icd", tab_dict, lang):
+                            expected[entry["Code"]] = {"Code": entry["Code"], "Code_Text": entry["Code_Text"] or "N/A"}
+                            source[entry["Code"]] = cond["Werte"]
+                self.assertEqual(list(index[(code, lang)]), sorted(expected.values(), key=lambda x: x["Code"]), code)
+                for entry in index[(code, lang)][:3]:
+                    self.assertEqual(
+                        get_beschreibung_fuer_icd_im_backend(entry["Code"].lower(), tab_dict, source[entry["Code"]], lang), entry["Code_Text"]
+                    )
+        self.assertEqual(get_beschreibung_fuer_icd_im_backend("z99.9", tab_dict, lang="fr"), "Principal")
+        self.assertEqual(get_beschreibung_fuer_icd_im_backend("UNBEKANNT", tab_dict), "UNBEKANNT")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import sys
+import pathlib
+import tempfile
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from data_snapshot import compute_code_fingerprint, compute_source_hash, load_snapshot, write_snapshot
+
+
+def _fehlschlag():
+    raise AssertionError("Daten dürfen nicht entpickelt werden")
+
+
+class _NichtLadbar:
+    def __reduce__(self):
+        return (_fehlschlag, ())
+
+
+class TestDataSnapshot(unittest.TestCase):
+    def test_roundtrip_and_invalidation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = pathlib.Path(tmp)
+            source = tmp_path / "quelle.json"
+            source.write_text('[{"LKN": "AA.00.0010"}]', encoding="utf-8")
+            snapshot = tmp_path / "daten.snapshot.pkl"
+
+            bedingung = {"Pauschale": "X", "BedingungsID": 1}
+            payload = {"liste": [bedingung], "index": {"X": [bedingung]}}
+            source_hash = compute_source_hash([source])
+            self.assertTrue(write_snapshot(snapshot, source_hash, payload))
+
+            loaded = load_snapshot(snapshot, source_hash)
+            self.assertEqual(loaded, payload)
+            # Gemeinsame Referenzen bleiben erhalten
+            self.assertIs(loaded["liste"][0], loaded["index"]["X"][0])
+
+            source.write_text('[{"LKN": "AA.00.0020"}]', encoding="utf-8")
+            new_hash = compute_source_hash([source])
+            self.assertNotEqual(new_hash, source_hash)
+            self.assertIsNone(load_snapshot(snapshot, new_hash))
+
+    def test_code_fingerprint_invalidates_without_unpickling(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = pathlib.Path(tmp)
+            source = tmp_path / "quelle.json"
+            source.write_text("[]", encoding="utf-8")
+            code = tmp_path / "modul.py"
+            code.write_text("VERSION = 1\n", encoding="utf-8")
+            snapshot = tmp_path / "daten.snapshot.pkl"
+
+            old_hash = compute_source_hash([source], extra=f"code={compute_code_fingerprint([code])}")
+            self.assertTrue(write_snapshot(snapshot, old_hash, {"objekt": _NichtLadbar()}))
+            code.write_text("VERSION = 2\n", encoding="utf-8")
+            new_hash = compute_source_hash([source], extra=f"code={compute_code_fingerprint([code])}")
+            self.assertNotEqual(new_hash, old_hash)
+            # Die Daten würden beim Entpickeln eine Ausnahme werfen; der Kopf verhindert das.
+            self.assertIsNone(load_snapshot(snapshot, new_hash))
+
+    def test_missing_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(load_snapshot(pathlib.Path(tmp) / "fehlt.pkl", "abc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_cache import LLMResponseCache, make_cache_key
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_model_stage_lang_and_payload(self):
+        payload = {"contents": [{"parts": [{"text": "x"}]}], "generationConfig": {"temperature": 0.05}}
+        key = make_cache_key("m", "stage1", "de", payload)
+        self.assertEqual(key, make_cache_key("m", "stage1", "de", dict(payload)))
+        self.assertNotEqual(key, make_cache_key("m2", "stage1", "de", payload))
+        self.assertNotEqual(key, make_cache_key("m", "stage2_mapping", "de", payload))
+        self.assertNotEqual(key, make_cache_key("m", "stage1", "fr", payload))
+        other = {**payload, "generationConfig": {"temperature": 0.1}}
+        self.assertNotEqual(key, make_cache_key("m", "stage1", "de", other))
+
+    def test_hit_miss_and_ttl(self):
+        cache = LLMResponseCache(self.path, ttl_seconds=60, max_entries=10)
+        self.assertEqual(cache.get("a"), (False, None))
+        cache.set("a", {"candidates": [1]})
+        self.assertEqual(cache.get("a"), (True, {"candidates": [1]}))
+        with patch("llm_cache.time.time", return_value=time.time() + 120):
+            self.assertEqual(cache.get("a"), (False, None))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["expired"]), (1, 2, 1))
+
+    def test_lru_eviction(self):
+        cache = LLMResponseCache(self.path, ttl_seconds=0, max_entries=2)
+        with patch("llm_cache.time.time", side_effect=[1.0, 2.0, 3.0, 4.0]):
+            cache.set("a", 1)
+            cache.set("b", 2)
+            cache.get("a")  # a zuletzt genutzt -> b wird verdrängt
+            cache.set("c", 3)
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.get("c"), (True, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+requests = pytest.importorskip("requests")
+import llm_client
+from llm_cache import LLMResponseCache
+
+
+def _candidate(text, finish_reason="STOP"):
+    return {"content": {"parts": [{"text": text}]}, "finishReason": finish_reason}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-Alive
+    status_codes: list = []
+    candidates: list = []
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        status = self.status_codes.pop(0) if self.status_codes else 200
+        candidate = self.candidates.pop(0) if self.candidates else _candidate('{"ok": true}')
+        body = json.dumps({"ok": status == 200, "candidates": [candidate]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    llm_client.reset_session()
+    yield f"http://127.0.0.1:{server.server_address[1]}/generate"
+    server.shutdown()
+    server.server_close()
+    llm_client.reset_session()
+    _Handler.status_codes = []
+    _Handler.candidates = []
+
+
+def test_connections_are_reused(local_server):
+    for _ in range(3):
+        response = llm_client.post_gemini("stage2_ranking", local_server, {"x": 1})
+        assert response.json()["ok"] is True
+    stats = llm_client.get_stats()
+    assert stats["http_requests"] == 3
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 2
+    assert stats["calls_per_stage"] == {"stage2_ranking": 3}
+
+
+def test_rate_limit_retry_policy(local_server):
+    _Handler.status_codes = [429, 200]
+    response = llm_client.post_gemini("stage2_mapping", local_server, {}, max_retries=3, backoff_seconds=0)
+    assert response.status_code == 200
+
+    # Mapping/Ranking wiederholen nur bei 429, andere Fehler werden sofort weitergereicht
+    _Handler.status_codes = [500, 200]
+    with pytest.raises(requests.exceptions.HTTPError):
+        llm_client.post_gemini("stage2_mapping", local_server, {}, max_retries=3, backoff_seconds=0)
+
+    # Stufe 1 wiederholt bei jedem Netzwerk-/HTTP-Fehler
+    _Handler.status_codes = [500, 200]
+    response = llm_client.post_gemini("stage1", local_server, {}, max_retries=3, backoff_seconds=0)
+    assert response.status_code == 200
+
+
+def test_generate_json_uses_cache(local_server, monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMResponseCache(os.path.join(tmp, "cache.sqlite3"), ttl_seconds=60, max_entries=10)
+        monkeypatch.setattr(llm_client, "_cache", cache)
+        monkeypatch.setattr(llm_client, "LLM_CACHE_ENABLED", True)
+        payload = {"contents": [{"parts": [{"text": "prompt"}]}]}
+        first = llm_client.generate_json("stage1", local_server, payload, "model", "de")
+        second = llm_client.generate_json("stage1", local_server, payload, "model", "de")
+        assert first == second
+        # Zweiter Aufruf kam aus dem Cache, nicht über das Netzwerk
+        assert llm_client.get_stats()["http_requests"] == 1
+        assert cache.stats()["hits"] == 1
+
+
+def test_incomplete_responses_are_not_cached(local_server, monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMResponseCache(os.path.join(tmp, "cache.sqlite3"), ttl_seconds=60, max_entries=10)
+        monkeypatch.setattr(llm_client, "_cache", cache)
+        monkeypatch.setattr(llm_client, "LLM_CACHE_ENABLED", True)
+        payload = {"contents": [{"parts": [{"text": "prompt"}]}]}
+        # Abgeschnittene und leere Antworten landen nicht im Cache
+        _Handler.candidates = [_candidate('{"identified', "MAX_TOKENS"), _candidate("")]
+        for _ in range(2):
+            data = llm_client.generate_json("stage1", local_server, payload, "model", "de")
+            assert llm_client.cache_response("stage1", payload, "model", "de", data) is False
+        # Unparsebare Antwort mit STOP: der Aufrufer cacht erst nach erfolgreichem Parsen
+        _Handler.candidates = [_candidate("kein JSON")]
+        data = llm_client.generate_json("stage1", local_server, payload, "model", "de", cache_write=False)
+        with pytest.raises(json.JSONDecodeError):
+            json.loads(data["candidates"][0]["content"]["parts"][0]["text"])
+        # Nächster Aufruf geht wieder ans Netzwerk und liefert die gültige Antwort
+        data = llm_client.generate_json("stage1", local_server, payload, "model", "de", cache_write=False)
+        assert json.loads(data["candidates"][0]["content"]["parts"][0]["text"]) == {"ok": True}
+        assert llm_client.get_stats()["http_requests"] == 4
+        assert cache.stats()["hits"] == 0
+        assert llm_client.cache_response("stage1", payload, "model", "de", data) is True
+        assert llm_client.generate_json("stage1", local_server, payload, "model", "de") == data
+        assert cache.stats()["hits"] == 1
+        assert llm_client.get_stats()["http_requests"] == 4
@@ -4,7 +4,8 @@ import pathlib
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
-from regelpruefer_pauschale import determine_applicable_pauschale
+from regelpruefer_pauschale import determine_applicable_pauschale, render_pauschale_conditions
+from utils import build_code_table_index, build_lkn_pauschalen_index, get_tables_for_code
 
 
 class TestPauschaleSelection(unittest.TestCase):
@@ -84,6 +85,102 @@ class TestPauschaleSelection(unittest.TestCase):
         self.assertEqual(result["details"]["Pauschale"], "C90.01B")
         self.assertTrue(result["bedingungs_pruef_html"].startswith("<"))
 
+    def test_reverse_index_matches_candidate_scan(self):
+        pauschalen_dict = {
+            code: {"Pauschale": code, "Pauschale_Text": code, "Taxpunkte": "1"}
+            for code in ("P1", "P2", "P3", "P4")
+        }
+        lp_data = [
+            {"Leistungsposition": "AA.00.0010", "Pauschale": "P1"},
+            {"Leistungsposition": "AA.00.0020", "Pauschale": "UNBEKANNT"},
+        ]
+        bedingungen = [
+            {"Pauschale": "P2", "Bedingungstyp": "LEISTUNGSPOSITIONEN IN LISTE", "Werte": "bb.00.0010, AA.00.0030"},
+            {"Pauschale": "P3", "Bedingungstyp": "LEISTUNGSPOSITIONEN IN TABELLE", "Werte": "TAB1"},
+            {"Pauschale": "P4", "Bedingungstyp": "TARIFPOSITIONEN IN TABELLE", "Werte": "tab2"},
+        ]
+        tabellen = {
+            "tab1": [{"Code": "CC.00.0010", "Tabelle_Typ": "service_catalog"}],
+            "tab2": [{"Code": "DD.00.0010", "Tabelle_Typ": "icd"}],
+        }
+        index = build_lkn_pauschalen_index(lp_data, bedingungen, pauschalen_dict, tabellen)
+        self.assertEqual(index["BB.00.0010"], {"P2"})
+        self.assertNotIn("AA.00.0020", index)
+        self.assertNotIn("DD.00.0010", index)
+
+        for lkns in (["AA.00.0010"], ["BB.00.0010", "CC.00.0010"], ["DD.00.0010"], ["AA.00.0030", "aa.00.0010"]):
+            args = ("", [], {"LKN": lkns}, lp_data, bedingungen, pauschalen_dict, {}, tabellen)
+            scanned = determine_applicable_pauschale(*args)
+            indexed = determine_applicable_pauschale(*args, lkn_pauschalen_index=index)
+            self.assertEqual(
+                [c["code"] for c in scanned.get("evaluated_pauschalen", [])],
+                [c["code"] for c in indexed.get("evaluated_pauschalen", [])],
+                lkns,
+            )
+
+    def test_indexed_conditions_match_flat_list(self):
+        pauschalen_dict = {
+            code: {"Pauschale": code, "Pauschale_Text": code, "Taxpunkte": tp}
+            for code, tp in (("X01.01A", "300"), ("X01.01B", "200"), ("X01.01C", "100"))
+        }
+        bedingungen = [
+            {"BedingungsID": 3, "Pauschale": "X01.01A", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LEISTUNGSPOSITIONEN IN LISTE", "Werte": "AA.00.0010", "Ebene": 1},
+            {"BedingungsID": 4, "Pauschale": "X01.01A", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "HAUPTDIAGNOSE IN TABELLE", "Werte": "ICDTAB", "Ebene": 1},
+            {"BedingungsID": 1, "Pauschale": "X01.01B", "Gruppe": 1, "Operator": "ODER", "Bedingungstyp": "LEISTUNGSPOSITIONEN IN LISTE", "Werte": "AA.00.0010", "Ebene": 1},
+            {"BedingungsID": 2, "Pauschale": "X01.01B", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LEISTUNGSPOSITIONEN IN TABELLE", "Werte": "LKNTAB", "Ebene": 1},
+            {"BedingungsID": 5, "Pauschale": "X01.01C", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LEISTUNGSPOSITIONEN IN TABELLE", "Werte": "LKNTAB", "Ebene": 1},
+        ]
+        indexed = {}
+        for cond in bedingungen:
+            indexed.setdefault(cond["Pauschale"], []).append(cond)
+        tabellen = {
+            "icdtab": [{"Code": "A00", "Code_Text": "Icd", "Tabelle_Typ": "icd"}],
+            "lkntab": [{"Code": "AA.00.0010", "Code_Text": "Lkn", "Tabelle_Typ": "service_catalog"}],
+        }
+        for context in ({"LKN": ["AA.00.0010"], "ICD": ["A00"]}, {"LKN": ["AA.00.0010"]}):
+            args = ("", [], context, [], None, pauschalen_dict, {}, tabellen, None)
+            results = []
+            for data in (bedingungen, indexed):
+                call_args = list(args)
+                call_args[4] = data
+                results.append(determine_applicable_pauschale(*call_args))
+            self.assertEqual(results[0], results[1], context)
+        self.assertEqual(results[0]["details"]["Pauschale"], "X01.01B")
+
+    def test_condition_html_only_for_selected_pauschale(self):
+        pauschalen_dict = {
+            code: {"Pauschale": code, "Pauschale_Text": code, "Taxpunkte": tp}
+            for code, tp in (("X02.01A", "300"), ("X02.01B", "200"))
+        }
+        bedingungen = [
+            {"BedingungsID": 1, "Pauschale": "X02.01A", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LKN", "Werte": "BB.00.0010", "Ebene": 1},
+            {"BedingungsID": 2, "Pauschale": "X02.01B", "Gruppe": 1, "Operator": "UND", "Bedingungstyp": "LKN", "Werte": "AA.00.0010", "Ebene": 1},
+        ]
+        args = ("", [], {"LKN": ["AA.00.0010"]}, [], bedingungen, pauschalen_dict, {}, {}, {"X02.01A", "X02.01B"})
+
+        lazy = determine_applicable_pauschale(*args)
+        self.assertEqual(lazy["details"]["Pauschale"], "X02.01B")
+        lazy_html = {c["code"]: c["bedingungs_pruef_html"] for c in lazy["evaluated_pauschalen"]}
+        self.assertEqual(lazy_html["X02.01A"], "")
+        self.assertEqual(lazy_html["X02.01B"], lazy["bedingungs_pruef_html"])
+
+        full = determine_applicable_pauschale(*args, detail_level="full")
+        self.assertEqual(full["bedingungs_pruef_html"], lazy["bedingungs_pruef_html"])
+        for cand in full["evaluated_pauschalen"]:
+            rendered = render_pauschale_conditions(cand["code"], {"LKN": ["AA.00.0010"]}, bedingungen, {}, {})
+            self.assertEqual(rendered["bedingungs_pruef_html"], cand["bedingungs_pruef_html"])
+            self.assertEqual(rendered["is_valid_structured"], cand["is_valid_structured"])
+
+    def test_code_table_index(self):
+        tabellen = {
+            "tab1": [{"Code": "cc.00.0010", "Tabelle_Typ": "service_catalog"}, {"Code": "A00", "Tabelle_Typ": "icd"}],
+            "tab2": [{"Code": "CC.00.0010", "Tabelle_Typ": "Service_Catalog"}],
+        }
+        index = build_code_table_index(tabellen)
+        self.assertEqual(get_tables_for_code("CC.00.0010", "service_catalog", index), {"tab1", "tab2"})
+        self.assertEqual(get_tables_for_code("a00", "ICD", index), {"tab1"})
+        self.assertEqual(get_tables_for_code("A00", "service_catalog", index), set())
+
 
 if __name__ == "__main__":
     unittest.main()
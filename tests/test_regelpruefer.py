@@ -0,0 +1,129 @@
+import unittest
+import sys
+import pathlib
+import json
+import random
+import re
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from regelpruefer import _pruefe_interpretiert, kompiliere_regelwerk, pruefe_abrechnungsfaehigkeit, pruefe_fall
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+SYNTHETISCHES_REGELWERK = {
+    "AA.00.0010": [{"Typ": "Mengenbeschränkung", "MaxMenge": 2}, {"Typ": "Nicht kumulierbar mit", "LKNs": ["AA.00.0020", "AA.00.0030"]}],
+    "AA.00.0020": [{"Typ": "Nur als Zuschlag zu", "LKN": "AA.00.0010"}, {"Typ": "Nicht kumulierbar mit", "LKN": "AA.00.0030"}],
+    "AA.00.0030": [
+        {"Typ": "Patientenbedingung", "Feld": "Alter", "MinWert": 18, "MaxWert": "65"},
+        {"Typ": "Patientenbedingung", "Feld": "Geschlecht", "Wert": "W"},
+        {"Typ": "Patientenbedingung", "Feld": "GTIN", "Wert": ["111", 222]},
+    ],
+    "AA.00.0040": [
+        {"Typ": "Diagnosepflicht", "ICD": ["a00", "B01"]},
+        {"Typ": "Pauschalenausschluss", "Pauschalen": ["C01.01A"]},
+        {"Typ": "Patientenbedingung", "Feld": "Alter", "Wert": 40},
+        {"Typ": "Patientenbedingung", "Feld": "Gewicht"},
+    ],
+    "AA.00.0050": [
+        {"Typ": "Patientenbedingung", "Feld": "Alter", "MinWert": "ab 18"},
+        {"Typ": "Mengenbeschränkung", "MaxMenge": "3"},
+        {"Typ": "Unbekannt"},
+        {"MaxMenge": 1},
+        {"Typ": "Diagnosepflicht", "ICD": "C00"},
+        {"Typ": "Pauschalenausschluss", "Pauschale": "C02.01A"},
+    ],
+    "AA.00.0060": [],
+}
+
+
+def _regelwerk():
+    """Synthetisches Regelwerk plus die Regeln aus TARDOC_Tarifpositionen, falls vorhanden."""
+    regelwerk = dict(SYNTHETISCHES_REGELWERK)
+    tardoc_path = ROOT / "data/TARDOC_Tarifpositionen.json"
+    if tardoc_path.exists():
+        with open(tardoc_path, encoding="utf-8") as f:
+            for entry in json.load(f):
+                if entry.get("LKN") and entry.get("Regeln"):
+                    regelwerk[entry["LKN"]] = entry["Regeln"]
+    return regelwerk
+
+
+class TestKompiliertesRegelwerk(unittest.TestCase):
+    def test_compiled_matches_interpreter(self):
+        regelwerk = _regelwerk()
+        kompiliert = kompiliere_regelwerk(regelwerk)
+        self.assertEqual(set(kompiliert), set(regelwerk))
+        referenzierte = sorted(
+            {code for rules in regelwerk.values() for rule in rules
+             for code in ([rule["LKN"]] if isinstance(rule.get("LKN"), str) else []) + list(rule.get("LKNs") or [])}
+        )
+        lkns = sorted(regelwerk) + ["ZZ.99.9999"]
+        rng = random.Random(24)
+        for _ in range(3000):
+            lkn = rng.choice(lkns)
+            fall = {
+                "LKN": lkn,
+                "Menge": rng.choice([0, 1, 2, 3, 7, None]),
+                "Begleit_LKNs": rng.sample(referenzierte + lkns, rng.randint(0, 4)),
+                "ICD": rng.choice([[], ["A00"], ["b01", "X"], "C00"]),
+                "Geschlecht": rng.choice([None, "w", "M", 1]),
+                "Alter": rng.choice([None, 10, 18, 40, "70", "alt"]),
+                "Pauschalen": rng.choice([[], ["C01.01A"], "C02.01A"]),
+                "GTIN": rng.choice([None, [], ["222"], "111", ["999"]]),
+            }
+            erwartet = _pruefe_interpretiert(fall, regelwerk)
+            self.assertEqual(pruefe_abrechnungsfaehigkeit(fall, regelwerk, kompiliert), erwartet, fall)
+            self.assertEqual(pruefe_abrechnungsfaehigkeit(fall, regelwerk), erwartet, fall)
+
+    def test_messages(self):
+        kompiliert = kompiliere_regelwerk(SYNTHETISCHES_REGELWERK)
+        fall = {"LKN": "AA.00.0010", "Menge": 3, "Begleit_LKNs": ["AA.00.0030", "BB.00.0010", "AA.00.0020"]}
+        self.assertEqual(
+            pruefe_abrechnungsfaehigkeit(fall, SYNTHETISCHES_REGELWERK, kompiliert),
+            {
+                "abrechnungsfaehig": False,
+                "fehler": [
+                    "Mengenbeschränkung überschritten (max. 2, angefragt 3)",
+                    "Nicht kumulierbar mit: AA.00.0030, AA.00.0020",
+                ],
+            },
+        )
+
+    def test_pruefe_fall_matches_per_lkn_loop(self):
+        regelwerk = _regelwerk()
+        kompiliert = kompiliere_regelwerk(regelwerk)
+        lkns = sorted(regelwerk) + ["ZZ.99.9999"]
+        rng = random.Random(25)
+        for _ in range(300):
+            leistungen = [{"lkn": rng.choice(lkns), "menge": rng.choice([1, 2, 3, 5])} for _ in range(rng.randint(1, 6))]
+            kontext = {"ICD": ["A00"], "Geschlecht": rng.choice(["w", "m"]), "Alter": rng.choice([30, 70]), "Pauschalen": [], "GTIN": []}
+            alle = [l["lkn"] for l in leistungen]
+            erwartet = []
+            for leistung in leistungen:
+                fall = {**kontext, "LKN": leistung["lkn"], "Menge": leistung["menge"], "Begleit_LKNs": [b for b in alle if b != leistung["lkn"]]}
+                ergebnis = pruefe_abrechnungsfaehigkeit(fall, regelwerk)
+                finale = leistung["menge"] if ergebnis["abrechnungsfaehig"] else 0
+                meldung = next((f for f in ergebnis["fehler"] if "Mengenbeschränkung überschritten" in f), None)
+                if not ergebnis["abrechnungsfaehig"] and meldung:
+                    finale = int(re.search(r"max\.\s*(\d+)", meldung).group(1))
+                    ergebnis["abrechnungsfaehig"] = True
+                    ergebnis["fehler"].append(f"Menge auf {finale} reduziert (Mengenbeschränkung)")
+                erwartet.append((leistung["lkn"], leistung["menge"], ergebnis, finale))
+            for werk in (kompiliert, None):
+                ergebnisse = pruefe_fall(leistungen, kontext, regelwerk, werk)
+                self.assertEqual(
+                    [(r["lkn"], r["initiale_menge"], r["regelpruefung"], r["finale_menge"]) for r in ergebnisse], erwartet, leistungen
+                )
+
+    def test_pruefe_fall_structured_quantity(self):
+        ergebnisse = pruefe_fall(
+            [{"lkn": "AA.00.0010", "menge": 5}, {"lkn": "AA.00.0060"}, {"lkn": None}], {}, SYNTHETISCHES_REGELWERK
+        )
+        self.assertEqual([r["lkn"] for r in ergebnisse], ["AA.00.0010", "AA.00.0060"])
+        self.assertEqual((ergebnisse[0]["finale_menge"], ergebnisse[0]["max_menge"]), (2, 2))
+        self.assertTrue(ergebnisse[0]["regelpruefung"]["abrechnungsfaehig"])
+        self.assertEqual((ergebnisse[1]["finale_menge"], ergebnisse[1]["max_menge"]), (1, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import sys
+import pathlib
+import json
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from selector import (
+    build_normalized_catalog_text,
+    build_term_matrix,
+    build_token_index,
+    compute_token_doc_freq,
+    normalize_catalog_text,
+    rank_leistungskatalog_entries,
+)
+from utils import extract_keywords
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+
+class TestTokenIndexRanking(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        root = pathlib.Path(__file__).resolve().parents[1]
+        with open(root / "data/LKAAT_Leistungskatalog.json", encoding="utf-8") as f:
+            data = json.load(f)
+        cls.katalog = {row["LKN"]: row for row in data if row.get("LKN")}
+        cls.doc_freq = {}
+        compute_token_doc_freq(cls.katalog, cls.doc_freq)
+        cls.index = build_token_index(cls.katalog)
+
+    def test_index_matches_full_scan(self):
+        queries = [
+            "Hausärztliche Konsultation 15 Minuten",
+            "Entfernung Warze am linken Oberarm",
+            "Arthroskopie Knie rechts mit Meniskusnaht",
+            "Konsultation Psychiatrie Kind",
+            "Blinddarmentfernung laparoskopisch",
+            "consultation de médecine de famille",
+            "visita specialistica",
+        ]
+        for query in queries:
+            tokens = extract_keywords(query)
+            expected = rank_leistungskatalog_entries(
+                tokens, self.katalog, self.doc_freq, 500, return_scores=True
+            )
+            actual = rank_leistungskatalog_entries(
+                tokens, self.katalog, self.doc_freq, 500, return_scores=True,
+                token_index=self.index,
+            )
+            self.assertEqual([c for _, c in actual], [c for _, c in expected], query)
+            for (s_act, _), (s_exp, _) in zip(actual, expected):
+                self.assertAlmostEqual(s_act, s_exp, places=9)
+
+    def test_unknown_token_returns_empty(self):
+        result = rank_leistungskatalog_entries(
+            {"xqzvw"}, self.katalog, self.doc_freq, token_index=self.index
+        )
+        self.assertEqual(result, [])
+
+    def test_normalized_text_store(self):
+        for compact in (False, True):
+            store = build_normalized_catalog_text(self.katalog, compact=compact)
+            self.assertEqual(len(store), len(self.katalog))
+            for code, details in list(self.katalog.items())[:200]:
+                self.assertEqual(store.get(code), normalize_catalog_text(details))
+            freq = {}
+            compute_token_doc_freq(self.katalog, freq, store)
+            self.assertEqual(freq, self.doc_freq)
+            tokens = extract_keywords("Konsultation Grundversorger")
+            self.assertEqual(
+                rank_leistungskatalog_entries(tokens, self.katalog, self.doc_freq, normalized_text=store),
+                rank_leistungskatalog_entries(tokens, self.katalog, self.doc_freq),
+            )
+
+    def test_heap_top_k_matches_full_sort(self):
+        tokens = extract_keywords("Konsultation Untersuchung Kind")
+        n = len(self.katalog)
+        reference = []
+        for code, details in self.katalog.items():
+            text = normalize_catalog_text(details)
+            score = sum(
+                text.count(t) / self.doc_freq.get(t, n) for t in tokens if text.count(t)
+            )
+            if score > 0:
+                reference.append((score, code))
+        reference.sort(key=lambda x: x[0], reverse=True)
+        for limit in (1, 5, 50, len(reference) + 10):
+            ranked, head = rank_leistungskatalog_entries(
+                tokens, self.katalog, self.doc_freq, limit, token_index=self.index, ratio_k=5
+            )
+            self.assertEqual(ranked, [c for _, c in reference[:limit]])
+            self.assertEqual([c for _, c in head], [c for _, c in reference[:5]])
+
+    @unittest.skipIf(numpy is None, "NumPy nicht installiert")
+    def test_numpy_backend_matches_full_scan(self):
+        matrix = build_term_matrix(self.index)
+        for query in ["Hausärztliche Konsultation 15 Minuten", "Arthroskopie Knie rechts"]:
+            tokens = extract_keywords(query)
+            for limit in (5, 500):
+                expected = rank_leistungskatalog_entries(
+                    tokens, self.katalog, self.doc_freq, limit, return_scores=True
+                )
+                actual = rank_leistungskatalog_entries(
+                    tokens, self.katalog, self.doc_freq, limit, return_scores=True,
+                    term_matrix=matrix,
+                )
+                self.assertEqual(actual, expected, query)
+
+
+if __name__ == "__main__":
+    unittest.main()
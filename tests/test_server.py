@@ -68,6 +68,29 @@ def test_analyze_billing_with_unknown_lkn():
             response = client.post('/api/analyze-billing', json={'inputText': 'GG.99.9999 5 Minuten'})
             assert response.status_code == 200
 
+def test_pauschale_conditions_endpoint():
+    """Bedingungs-HTML eines Kandidaten lässt sich nachladen."""
+    code = sorted(server.pauschale_bedingungen_indexed)[0]
+    with server.app.test_client() as client:
+        response = client.post('/api/pauschale-conditions', json={'code': code, 'context': {'LKN': ['C08.AH.0010'], 'useIcd': False}})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['code'] == code
+        assert isinstance(data['is_valid_structured'], bool)
+        assert data['bedingungs_pruef_html'].startswith('<')
+
+        response = client.post('/api/pauschale-conditions', json={'code': 'GIBT.ES.NICHT', 'context': {}})
+        assert response.status_code == 404
+
+        for context in ({'ICD': [1]}, {'LKN': 'C08.AH.0010'}, {'Alter': 'alt'}, {'Anzahl': True}, {'useIcd': 'ja'}, {'Geschlecht': ['w']}):
+            response = client.post('/api/pauschale-conditions', json={'code': code, 'context': context})
+            assert response.status_code == 400, context
+            assert 'error' in response.get_json()
+
+        response = client.post('/api/pauschale-conditions', json={'code': code, 'context': {'GTIN': [7680000000000], 'Alter': '42', 'Anzahl': None}})
+        assert response.status_code == 200
+
+
 def test_submit_feedback_local(tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     monkeypatch.delenv("GITHUB_TOKEN", raising=False)
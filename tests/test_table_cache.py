@@ -0,0 +1,47 @@
+import json
+import unittest
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from utils import _build_table_content, clear_table_caches, get_table_codes, get_table_content
+
+
+class TestTableCache(unittest.TestCase):
+    def setUp(self):
+        clear_table_caches()
+        self.tabellen = {
+            "tab1": [
+                {"Code": "b.01", "Code_Text": "B", "Code_Text_f": "B fr", "Tabelle_Typ": "service_catalog"},
+                {"Code": "A.01", "Code_Text": "A", "Tabelle_Typ": "service_catalog"},
+                {"Code": "X00", "Code_Text": "Icd", "Tabelle_Typ": "icd"},
+            ],
+            "tab2": [{"Code": "A.01", "Code_Text": "A2"}],
+        }
+
+    def test_cached_content_matches_uncached(self):
+        for ref in ("TAB1", "tab1, tab2", "fehlt"):
+            for lang in ("de", "fr"):
+                cached = get_table_content(ref, "service_catalog", self.tabellen, lang)
+                self.assertEqual(list(cached), _build_table_content(ref, "service_catalog", self.tabellen, lang))
+                self.assertIs(get_table_content(ref.upper(), "SERVICE_CATALOG", self.tabellen, lang), cached)
+
+    def test_results_are_immutable_and_serializable(self):
+        content = get_table_content("tab1", "service_catalog", self.tabellen)
+        with self.assertRaises(TypeError):
+            content[0]["Code"] = "Z"
+        self.assertEqual(json.loads(json.dumps(content))[0]["Code"], "A.01")
+
+    def test_table_codes(self):
+        self.assertEqual(get_table_codes("tab1", "service_catalog", self.tabellen), frozenset({"A.01", "B.01"}))
+        self.assertEqual(get_table_codes("tab1", "icd", self.tabellen), frozenset({"X00"}))
+
+    def test_cache_is_per_table_dict(self):
+        get_table_codes("tab1", "icd", self.tabellen)
+        other = {"tab1": [{"Code": "Y00", "Tabelle_Typ": "icd"}]}
+        self.assertEqual(get_table_codes("tab1", "icd", other), frozenset({"Y00"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 # utils.py
 import html
 import logging
-from typing import Dict, List, Any, Set
+from typing import Dict, FrozenSet, List, Any, Set, Tuple
 import re
 
 logger = logging.getLogger(__name__)
@@ -10,9 +10,8 @@ def escape(text: Any) -> str:
     """Escapes HTML special characters in a string."""
     return html.escape(str(text))
 
-def get_table_content(table_ref: str, table_type: str, tabellen_dict_by_table: dict, lang: str = 'de') -> list[dict]:
-    """Holt Einträge für eine Tabelle und einen Typ (Case-Insensitive).
-    Berücksichtigt die Sprache für den Text."""
+def _build_table_content(table_ref: str, table_type: str, tabellen_dict_by_table: dict, lang: str = 'de') -> list[dict]:
+    """Ungecachte Variante von :func:`get_table_content`."""
     content = []
     # Schlüssel für PAUSCHALEN_Tabellen - anpassen falls nötig!
     TAB_CODE_KEY = 'Code'; TAB_TEXT_KEY = 'Code_Text'; TAB_TYP_KEY = 'Tabelle_Typ'
@@ -47,6 +46,117 @@ def get_table_content(table_ref: str, table_type: str, tabellen_dict_by_table: d
     unique_content = {item['Code']: item for item in all_entries_for_type}.values()
     return sorted(unique_content, key=lambda x: x.get('Code', ''))
 
+
+class FrozenDict(dict):
+    """Schreibgeschütztes ``dict`` für gecachte Tabelleneinträge (bleibt JSON-serialisierbar)."""
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> Any:
+        raise TypeError("Gecachte Tabelleneinträge sind schreibgeschützt")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _readonly  # type: ignore[assignment]
+
+    def __reduce__(self) -> Any:
+        return (FrozenDict, (dict(self),))
+
+
+# Caches für get_table_content/get_table_codes. Schlüssel enthält id() des
+# Tabellen-Dicts; der Eintrag hält eine Referenz darauf, damit die id nicht
+# wiederverwendet werden kann. load_data() leert die Caches (clear_table_caches).
+TABLE_CACHE_MAX_ENTRIES = 4096
+_table_content_cache: Dict[Tuple[int, str, str, str], Tuple[dict, Tuple[FrozenDict, ...]]] = {}
+_table_codes_cache: Dict[Tuple[int, str, str], Tuple[dict, FrozenSet[str]]] = {}
+_icd_text_index_cache: Dict[Tuple[int, str, str], Tuple[dict, Dict[str, str]]] = {}
+
+# Allgemeine ICD-Tabelle als Fallback für ICD-Beschreibungen
+ICD_HAUPTKATALOG = "icd_hauptkatalog"
+ICD_INDEX_LANGS = ("de", "fr", "it")
+
+
+def _normalize_table_ref(table_ref: str) -> str:
+    return ",".join(t.strip().lower() for t in str(table_ref).split(',') if t.strip())
+
+
+def clear_table_caches() -> None:
+    """Leert die Caches von :func:`get_table_content` und :func:`get_table_codes`."""
+    _table_content_cache.clear()
+    _table_codes_cache.clear()
+    _icd_text_index_cache.clear()
+
+
+def get_table_content(table_ref: str, table_type: str, tabellen_dict_by_table: dict, lang: str = 'de') -> Tuple[FrozenDict, ...]:
+    """Holt Einträge für eine Tabelle und einen Typ (Case-Insensitive).
+    Berücksichtigt die Sprache für den Text.
+
+    Das Ergebnis wird pro ``(Tabellen-Dict, Tabellenreferenz, Typ, Sprache)``
+    gecacht und ist unveränderlich (Tupel aus :class:`FrozenDict`).
+    """
+    key = (id(tabellen_dict_by_table), _normalize_table_ref(table_ref), table_type.lower(), lang)
+    cached = _table_content_cache.get(key)
+    if cached is not None and cached[0] is tabellen_dict_by_table:
+        return cached[1]
+    content = tuple(FrozenDict(item) for item in _build_table_content(table_ref, table_type, tabellen_dict_by_table, lang))
+    if len(_table_content_cache) >= TABLE_CACHE_MAX_ENTRIES:
+        _table_content_cache.clear()
+    _table_content_cache[key] = (tabellen_dict_by_table, content)
+    return content
+
+
+def get_table_codes(table_ref: str, table_type: str, tabellen_dict_by_table: dict) -> FrozenSet[str]:
+    """Menge der Codes (gross) einer Tabellenreferenz für Mitgliedschaftstests."""
+    key = (id(tabellen_dict_by_table), _normalize_table_ref(table_ref), table_type.lower())
+    cached = _table_codes_cache.get(key)
+    if cached is not None and cached[0] is tabellen_dict_by_table:
+        return cached[1]
+    codes = frozenset(
+        str(entry['Code']).upper()
+        for entry in get_table_content(table_ref, table_type, tabellen_dict_by_table)
+        if entry.get('Code')
+    )
+    if len(_table_codes_cache) >= TABLE_CACHE_MAX_ENTRIES:
+        _table_codes_cache.clear()
+    _table_codes_cache[key] = (tabellen_dict_by_table, codes)
+    return codes
+
+
+def get_icd_text_index(table_ref: str, tabellen_dict_by_table: dict, lang: str = 'de') -> Dict[str, str]:
+    """Index ``Code (gross) -> Code_Text`` der ICD-Einträge einer Tabellenreferenz.
+
+    Bei mehrfach vorkommenden Codes gewinnt wie bei der linearen Suche der
+    erste Eintrag aus :func:`get_table_content`.
+    """
+    key = (id(tabellen_dict_by_table), _normalize_table_ref(table_ref), lang)
+    cached = _icd_text_index_cache.get(key)
+    if cached is not None and cached[0] is tabellen_dict_by_table:
+        return cached[1]
+    index: Dict[str, str] = {}
+    for entry in get_table_content(table_ref, "icd", tabellen_dict_by_table, lang):
+        code = str(entry.get('Code', '')).upper()
+        if code:
+            index.setdefault(code, entry.get('Code_Text', code))
+    if len(_icd_text_index_cache) >= TABLE_CACHE_MAX_ENTRIES:
+        _icd_text_index_cache.clear()
+    _icd_text_index_cache[key] = (tabellen_dict_by_table, index)
+    return index
+
+
+def build_icd_text_indices(tabellen_dict_by_table: dict, langs: Tuple[str, ...] = ICD_INDEX_LANGS) -> int:
+    """Baut beim Laden die ICD-Indizes aller Tabellen mit ICD-Einträgen sowie
+    den globalen Index (``ICD_HAUPTKATALOG``) für alle Sprachen auf.
+
+    Gibt die Anzahl der aufgebauten Indizes zurück.
+    """
+    table_names = [
+        name for name, entries in tabellen_dict_by_table.items()
+        if name == ICD_HAUPTKATALOG
+        or any(str(e.get('Tabelle_Typ', '')).lower() == 'icd' for e in entries if isinstance(e, dict))
+    ]
+    for name in table_names:
+        for lang in langs:
+            get_icd_text_index(name, tabellen_dict_by_table, lang)
+    return len(table_names) * len(langs)
+
+
 def get_lang_field(entry: Dict[str, Any], base_key: str, lang: str) -> Any:
     """Returns the value for a language-aware key if available."""
     if not isinstance(entry, dict):
@@ -684,7 +794,14 @@ def extract_keywords(text: str) -> Set[str]:
     """
 
     expanded = expand_compound_words(text)
-    tokens = re.findall(r"\b\w+\b", expanded.lower())
+    return keywords_from_normalized_text(expanded.lower())
+
+
+def keywords_from_normalized_text(normalized: str) -> Set[str]:
+    """Wie :func:`extract_keywords`, aber für bereits erweiterten und
+    kleingeschriebenen Text (z.B. aus dem normalisierten Katalogtext-Speicher).
+    """
+    tokens = re.findall(r"\b\w+\b", normalized)
     base_tokens = {t for t in tokens if len(t) >= 4 and t not in STOPWORDS}
 
     def collect_synonyms(token: str) -> Set[str]:
@@ -719,3 +836,91 @@ def extract_lkn_codes_from_text(text: str) -> List[str]:
         return []
     return [m.group(0).upper() for m in LKN_CODE_REGEX.finditer(text)]
 
+
+
+# --- Reverse-Index Code -> Tabellen ---
+def build_code_table_index(
+    tabellen_dict_by_table: Dict[str, List[Dict[str, Any]]],
+) -> Dict[Tuple[str, str], Set[str]]:
+    """Return ``{(Code gross, Tabelle_Typ klein): {normalisierte Tabellennamen}}``.
+
+    Ersetzt das Durchsuchen aller Tabellen, um festzustellen, in welchen
+    Tabellen eines Typs ein Code vorkommt. Einträge ohne ``Tabelle_Typ``
+    werden unter dem Typ ``""`` geführt.
+    """
+    index: Dict[Tuple[str, str], Set[str]] = {}
+    for table_name, entries in tabellen_dict_by_table.items():
+        for entry in entries:
+            code = entry.get('Code')
+            if not code:
+                continue
+            key = (str(code).upper(), str(entry.get('Tabelle_Typ') or "").lower())
+            index.setdefault(key, set()).add(table_name)
+    return index
+
+
+def get_tables_for_code(
+    code: str, table_type: str, code_table_index: Dict[Tuple[str, str], Set[str]]
+) -> Set[str]:
+    """Normalisierte Namen aller Tabellen vom Typ ``table_type``, die ``code`` enthalten."""
+    return code_table_index.get((str(code).upper(), table_type.lower()), set())
+
+
+# --- Reverse-Index LKN -> Pauschalen für die Kandidatensuche ---
+LKN_LIST_CONDITION_TYPES = ("LEISTUNGSPOSITIONEN IN LISTE", "LKN")
+LKN_TABLE_CONDITION_TYPES = ("LEISTUNGSPOSITIONEN IN TABELLE", "TARIFPOSITIONEN IN TABELLE")
+
+
+def build_lkn_pauschalen_index(
+    pauschale_lp_data: List[Dict[str, Any]],
+    pauschale_bedingungen_data: List[Dict[str, Any]],
+    pauschalen_dict: Dict[str, Any],
+    tabellen_dict_by_table: Dict[str, List[Dict[str, Any]]],
+) -> Dict[str, Set[str]]:
+    """Return ``{LKN (gross): {Pauschalen-Codes}}`` für alle Pauschalen in ``pauschalen_dict``.
+
+    Erfasst direkte Zuordnungen aus den Leistungspositionen, LKN-Listen in
+    Bedingungen ("LEISTUNGSPOSITIONEN IN LISTE"/"LKN") sowie LKNs aus
+    ``service_catalog``-Tabellen, die von Tabellen-Bedingungen referenziert
+    werden.
+    """
+    index: Dict[str, Set[str]] = {}
+
+    for item in pauschale_lp_data:
+        lkn = item.get('Leistungsposition')
+        pc = item.get('Pauschale')
+        if isinstance(lkn, str) and pc and str(pc) in pauschalen_dict:
+            index.setdefault(lkn.upper(), set()).add(str(pc))
+
+    pauschalen_by_table: Dict[str, Set[str]] = {}
+    for cond in pauschale_bedingungen_data:
+        pc = cond.get('Pauschale')
+        if not (pc and str(pc) in pauschalen_dict):
+            continue
+        typ = str(cond.get('Bedingungstyp') or "").upper()
+        werte = str(cond.get('Werte') or "")
+        if typ in LKN_LIST_CONDITION_TYPES:
+            for w in werte.split(','):
+                if w.strip():
+                    index.setdefault(w.strip().upper(), set()).add(str(pc))
+        elif typ in LKN_TABLE_CONDITION_TYPES:
+            for t in werte.split(','):
+                if t.strip():
+                    pauschalen_by_table.setdefault(t.strip().lower(), set()).add(str(pc))
+
+    for table_name, pcs in pauschalen_by_table.items():
+        for entry in tabellen_dict_by_table.get(table_name, []):
+            code = entry.get('Code')
+            if code and str(entry.get('Tabelle_Typ') or "").lower() == "service_catalog":
+                index.setdefault(str(code).upper(), set()).update(pcs)
+
+    return index
+
+
+def find_pauschalen_for_lkns(lkns: Any, lkn_pauschalen_index: Dict[str, Set[str]]) -> Set[str]:
+    """Vereinigung der Pauschalen-Codes aller ``lkns`` aus dem Reverse-Index."""
+    result: Set[str] = set()
+    for lkn in lkns:
+        if lkn:
+            result.update(lkn_pauschalen_index.get(str(lkn).upper(), ()))
+    return result